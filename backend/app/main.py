@@ -1,36 +1,151 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
-
-from backend.database.database import engine, Base
-from backend.routers import auth, users, trading
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(
-    title="Zerodha Clone API",
-    description="A FastAPI backend for a Zerodha-like trading platform",
-    version="0.1.0"
-)
-
-# CORS middleware to allow frontend to communicate with backend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include routers
-app.include_router(auth.router)
-app.include_router(users.router)
-app.include_router(trading.router)
-
-@app.get("/")
-async def root():
-    return {"message": "Welcome to Zerodha Clone API. Visit /docs for API documentation."}
+
+# Importing this module has no side effects: the database, routers and
+# background tasks are set up by create_app() and its lifespan. Migrations
+# run from `python -m backend.database.migrations` once per deploy; set
+# AUTO_MIGRATE=1 to have each worker apply them at startup instead.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "0") == "1"
+
+async def _stop(task):
+    # Cancelled background loops flush or persist whatever they still hold
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from backend.database.database import get_async_engine, get_async_session_factory
+    from backend.services.group_commit import GROUP_COMMIT, order_writer
+    from backend.services.ledger import ledger_snapshotter
+    from backend.services.orderbook import matching_engine
+    from backend.services.portfolio_history import portfolio_history
+    from backend.services.prices import price_cache
+    from backend.services.search import stock_search
+    from backend.utils.auth import principal_cache
+
+    if AUTO_MIGRATE:
+        from backend.database.migrations import upgrade_database
+        await asyncio.to_thread(upgrade_database)
+
+    session_factory = get_async_session_factory()
+
+    # Warm the price cache and search index, and start writing ticks back
+    # to the stocks table
+    async with session_factory() as db:
+        await price_cache.load(db)
+    stock_search.rebuild(price_cache.all())
+    price_flusher = asyncio.create_task(price_cache.run_flusher(session_factory))
+
+    def fills_persisted(fills):
+        # Cached principals carry the balance the fills just changed, and both
+        # sides' portfolio value points are due for a refresh
+        for fill in fills:
+            principal_cache.invalidate_user(fill.buyer_id)
+            principal_cache.invalidate_user(fill.seller_id)
+            portfolio_history.mark(fill.buyer_id, fill.seller_id)
+
+    # One worker holds the matching engine; matched limit order fills are
+    # written to the database in batches
+    async with session_factory() as db:
+        await matching_engine.lease.acquire(db)
+    matching_lease = asyncio.create_task(matching_engine.lease.run(session_factory))
+    order_persister = asyncio.create_task(
+        matching_engine.run_persister(session_factory, on_persisted=fills_persisted)
+    )
+    # Today's portfolio value points follow trades; each day is closed as it ends
+    history_updater = asyncio.create_task(portfolio_history.run_updater(session_factory))
+    # Accounts whose event log has grown get a fresh snapshot
+    snapshotter = asyncio.create_task(ledger_snapshotter.run(session_factory))
+    # Opt-in group commit for buys and sells
+    order_writer_task = asyncio.create_task(order_writer.run(session_factory)) if GROUP_COMMIT else None
+
+    try:
+        yield
+    finally:
+        # Stopped in dependency order: queued orders are committed before
+        # fills are persisted, fills are persisted before the matching engine
+        # is handed over and mark users before the history updater records
+        # them, and dirty quotes are written out last
+        if order_writer_task is not None:
+            await _stop(order_writer_task)
+        await _stop(order_persister)
+        await _stop(matching_lease)
+        await _stop(history_updater)
+        await _stop(snapshotter)
+        await _stop(price_flusher)
+        await get_async_engine().dispose()
+
+def create_app() -> FastAPI:
+    """Build the API application; nothing touches the database until startup."""
+    from backend.database.database import get_async_engine
+    from backend.routers import auth, users, trading
+    from backend.services.admission import ADMISSION_CONTROL, AdmissionMiddleware
+    from backend.services.metrics import MetricsMiddleware, instrument_engine, metrics
+
+    app = FastAPI(
+        title="Zerodha Clone API",
+        description="A FastAPI backend for a Zerodha-like trading platform",
+        version="0.1.0",
+        lifespan=lifespan,
+    )
+
+    # Per-IP, per-user and per-route rate limits, then a cap on requests in
+    # flight. Added first so it sits inside CORS and rejections still carry
+    # CORS headers.
+    if ADMISSION_CONTROL:
+        app.add_middleware(AdmissionMiddleware)
+
+    # CORS middleware to allow frontend to communicate with backend
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, replace with specific origins
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
+    )
+
+    # Per-route latency and SQL metrics, served at /metrics. Added last so it
+    # is the outermost middleware and times everything else.
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(get_async_engine().sync_engine)
+
+    # Include routers
+    app.include_router(auth.router)
+    app.include_router(users.router)
+    app.include_router(trading.router)
+
+    @app.get("/")
+    async def root():
+        return {"message": "Welcome to Zerodha Clone API. Visit /docs for API documentation."}
+
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    return app
+
+def __getattr__(name):
+    # `backend.app.main:app` keeps working for uvicorn and existing imports;
+    # the app is built on first access and reused afterwards
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    uvicorn.run("backend.app.main:app", host="localhost", port=8000, reload=True) 
\ No newline at end of file
+    import uvicorn
+
+    from backend.database.migrations import upgrade_database
+
+    # The development server migrates explicitly before starting
+    upgrade_database()
+    uvicorn.run("backend.app.main:app", host="localhost", port=8000, reload=True)
@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+from datetime import datetime
+
+import httpx
+
+from backend.benchmarks.harness import QueryCounter, run_scenario
+from backend.benchmarks.scenarios import SCENARIOS, seed
+
+
+async def run_client(args, transport, base_url, counter=None):
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60) as client:
+        context = await seed(client, args.users, args.stocks)
+        for name in args.scenarios:
+            requests = args.login_requests if name == "login" else args.requests
+            result = await run_scenario(name, SCENARIOS[name](context), requests, args.concurrency, counter)
+            results.append(result.to_dict())
+            print_result(results[-1])
+    return results
+
+
+async def run(args):
+    if args.url:
+        return await run_client(args, None, args.url)
+
+    # Imported here so DATABASE_URL is set before the engine is created
+    from backend.app.main import create_app
+    from backend.database.database import get_async_engine
+    from backend.database.migrations import upgrade_database
+
+    upgrade_database()
+    app = create_app()
+    counter = QueryCounter().attach(get_async_engine().sync_engine)
+    try:
+        async with app.router.lifespan_context(app):
+            return await run_client(args, httpx.ASGITransport(app=app), "http://bench", counter)
+    finally:
+        counter.detach()
+
+
+def print_result(result):
+    latency = result["latency_ms"]
+    queries = result["queries_per_request"]
+    print(
+        f"{result['name']:>10}: {result['throughput_rps']:9.1f} req/s  "
+        f"p50 {latency['p50']:8.2f} ms  p95 {latency['p95']:8.2f} ms  p99 {latency['p99']:8.2f} ms  "
+        f"errors {result['errors']:>4}  queries/req {queries if queries is not None else '-'}"
+    )
+
+
+def main():
+    """Run the API benchmark scenarios and report latency percentiles"""
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks", description="Benchmark the trading API")
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=["login", "stocks", "trading", "portfolio"],
+        help="Scenarios to run, in order"
+    )
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50, help="Requests for the bcrypt-bound login storm")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--users", type=int, default=16, help="Users to register")
+    parser.add_argument("--stocks", type=int, default=20, help="Minimum number of stocks to trade")
+    parser.add_argument("--url", help="Benchmark a live server at this URL instead of the app in-process")
+    parser.add_argument("--database-url", help="In-process only: database to use (default: a temporary SQLite file)")
+    parser.add_argument("--json", dest="json_path", help="Write results to this file as JSON")
+    parser.add_argument(
+        "--admission", action="store_true",
+        help="In-process only: keep rate limits and load shedding on; by default they are off so every request is served"
+    )
+    args = parser.parse_args()
+
+    tmpdir = None
+    if not args.url:
+        if not args.admission:
+            os.environ["ADMISSION_CONTROL"] = "0"
+        if args.database_url:
+            os.environ["DATABASE_URL"] = args.database_url
+        else:
+            tmpdir = tempfile.TemporaryDirectory()
+            os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+
+    started_at = datetime.utcnow().isoformat()
+    results = asyncio.run(run(args))
+
+    if args.json_path:
+        report = {
+            "started_at": started_at,
+            "target": args.url or "in-process",
+            "python": platform.python_version(),
+            "settings": {
+                "requests": args.requests,
+                "login_requests": args.login_requests,
+                "concurrency": args.concurrency,
+                "users": args.users,
+                "stocks": args.stocks,
+                "admission": args.admission,
+            },
+            "scenarios": results,
+        }
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.json_path}")
+
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """Counts SQL statements executed by an engine while attached."""
+
+    def __init__(self):
+        self.count = 0
+        self._engine = None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def attach(self, engine):
+        self._engine = engine
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def detach(self):
+        if self._engine is not None:
+            event.remove(self._engine, "before_cursor_execute", self._before_cursor_execute)
+            self._engine = None
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    concurrency: int
+    elapsed: float
+    errors: int
+    latencies: List[float] = field(repr=False, default_factory=list)
+    queries: Optional[int] = None
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "concurrency": self.concurrency,
+            "errors": self.errors,
+            "elapsed_s": round(self.elapsed, 4),
+            "throughput_rps": round(self.throughput, 2),
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+                "p50": round(percentile(latencies, 0.50) * 1000, 3),
+                "p95": round(percentile(latencies, 0.95) * 1000, 3),
+                "p99": round(percentile(latencies, 0.99) * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+            },
+            # Only known in-process; None against a live server
+            "queries_per_request": round(self.queries / self.requests, 2) if self.queries is not None else None,
+        }
+
+
+async def run_scenario(
+    name: str,
+    operation: Callable[[int], Awaitable[bool]],
+    requests: int,
+    concurrency: int,
+    counter: Optional[QueryCounter] = None,
+) -> ScenarioResult:
+    """Call `operation(i)` for i in range(requests), `concurrency` at a time.
+
+    Each call is one timed request and returns whether it succeeded.
+    """
+    latencies = []
+    errors = 0
+    next_index = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            start = time.perf_counter()
+            ok = await operation(i)
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    queries_before = counter.count if counter else 0
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return ScenarioResult(
+        name=name,
+        requests=requests,
+        concurrency=concurrency,
+        elapsed=elapsed,
+        errors=errors,
+        latencies=latencies,
+        queries=counter.count - queries_before if counter else None,
+    )
@@ -0,0 +1,119 @@
+import random
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import httpx
+
+PASSWORD = "benchpass123"
+
+
+@dataclass
+class BenchContext:
+    """Users and stocks a benchmark run works with."""
+    client: httpx.AsyncClient
+    emails: List[str] = field(default_factory=list)
+    headers: List[dict] = field(default_factory=list)
+    stocks: List[dict] = field(default_factory=list)
+    # Shares bought per (user index, stock id) during the mixed trading scenario
+    owned: Dict[tuple, int] = field(default_factory=dict)
+
+
+async def seed(client: httpx.AsyncClient, num_users: int, num_stocks: int, funds: float = 1e9) -> BenchContext:
+    """Register funded users through the API and make sure enough stocks exist"""
+    context = BenchContext(client=client)
+    run = uuid.uuid4().hex[:8]
+    for i in range(num_users):
+        email = f"bench-{run}-{i}@example.com"
+        response = await client.post("/register", json={"email": email, "name": f"Bench {i}", "password": PASSWORD})
+        response.raise_for_status()
+        response = await client.post("/token", data={"username": email, "password": PASSWORD})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        (await client.post("/users/funds", json={"amount": funds}, headers=headers)).raise_for_status()
+        context.emails.append(email)
+        context.headers.append(headers)
+
+    context.stocks = (await client.get("/trading/stocks")).json()
+    for i in range(len(context.stocks), num_stocks):
+        price = round(random.uniform(10, 5000), 2)
+        response = await client.post(
+            "/trading/stocks",
+            json={
+                "symbol": f"BENCH{run.upper()}{i}", "name": f"Bench Stock {i}", "exchange": "NSE",
+                "current_price": price, "day_high": price, "day_low": price,
+            },
+            headers=context.headers[0],
+        )
+        response.raise_for_status()
+        context.stocks.append(response.json())
+    return context
+
+
+def login_storm(context: BenchContext):
+    async def operation(i):
+        email = context.emails[i % len(context.emails)]
+        response = await context.client.post("/token", data={"username": email, "password": PASSWORD})
+        return response.status_code == 200
+    return operation
+
+
+def stock_polling(context: BenchContext):
+    async def operation(i):
+        response = await context.client.get("/trading/stocks")
+        return response.status_code == 200
+    return operation
+
+
+def conditional_polling(context: BenchContext):
+    """Poll the stock list the way a client with a cached copy would"""
+    etag = None
+
+    async def operation(i):
+        nonlocal etag
+        headers = {"If-None-Match": etag} if etag else {}
+        response = await context.client.get("/trading/stocks", headers=headers)
+        etag = response.headers.get("etag", etag)
+        return response.status_code in (200, 304)
+    return operation
+
+
+def portfolio_refresh(context: BenchContext):
+    async def operation(i):
+        headers = context.headers[i % len(context.headers)]
+        response = await context.client.get("/trading/portfolio", headers=headers)
+        return response.status_code == 200
+    return operation
+
+
+def mixed_trading(context: BenchContext):
+    """Buy or sell one share; sells only touch stocks the user has bought"""
+    async def operation(i):
+        user = i % len(context.headers)
+        stock = random.choice(context.stocks)
+        key = (user, stock["id"])
+        side = "SELL" if context.owned.get(key, 0) > 0 and random.random() < 0.5 else "BUY"
+        # Reserve the share before the await so concurrent sells don't oversell
+        if side == "SELL":
+            context.owned[key] -= 1
+        response = await context.client.post(
+            f"/trading/{side.lower()}",
+            json={"stock_id": stock["id"], "transaction_type": side, "quantity": 1, "price": stock["current_price"]},
+            headers=context.headers[user],
+        )
+        ok = response.status_code == 200
+        if side == "BUY" and ok:
+            context.owned[key] = context.owned.get(key, 0) + 1
+        elif side == "SELL" and not ok:
+            context.owned[key] += 1
+        return ok
+    return operation
+
+
+SCENARIOS = {
+    "login": login_storm,
+    "stocks": stock_polling,
+    "stocks_etag": conditional_polling,
+    "portfolio": portfolio_refresh,
+    "trading": mixed_trading,
+}
@@ -0,0 +1,450 @@
+from bisect import bisect_right
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import groupby, islice
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, case, delete, func, insert, select, update
+
+from backend.models.models import AccountEvent, AccountSnapshot, Holding, PortfolioValue, PriceTick, RealizedPnl, Stock, TaxLot, Transaction, User
+from backend.services.ledger import AccountState, account_mismatches
+
+# Pragmas for a one-off bulk load into SQLite: no fsync, a large page cache
+# and in-memory temp B-trees for index builds. A crash mid-load can corrupt
+# the database, so they are only for throwaway or freshly generated data.
+SQLITE_LOADING_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": "-262144",
+    "temp_store": "MEMORY",
+}
+
+
+@contextmanager
+def loading_pragmas(connection):
+    """Apply SQLITE_LOADING_PRAGMAS for the duration of a bulk load."""
+    if connection.dialect.name != "sqlite":
+        yield
+        return
+    previous = {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in SQLITE_LOADING_PRAGMAS}
+    for name, value in SQLITE_LOADING_PRAGMAS.items():
+        connection.exec_driver_sql(f"PRAGMA {name}={value}")
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            connection.exec_driver_sql(f"PRAGMA {name}={value}")
+
+
+@contextmanager
+def deferred_indexes(connection, table):
+    """Drop a table's secondary indexes and rebuild them after the block.
+
+    Building an index once over sorted data is much cheaper than keeping it
+    up to date row by row during a large load.
+    """
+    indexes = [index for index in table.indexes if not index.unique]
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+    connection.commit()
+    try:
+        yield
+    finally:
+        for index in indexes:
+            index.create(connection, checkfirst=True)
+        connection.commit()
+
+
+def insert_chunks(connection, table, rows: Iterable[dict], chunk_size: int = 50000) -> int:
+    """executemany `rows` into `table`, committing after each chunk."""
+    rows = iter(rows)
+    total = 0
+    statement = insert(table)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return total
+        connection.execute(statement, chunk)
+        connection.commit()
+        total += len(chunk)
+
+
+def rebuild_holdings(connection, users: Optional[range] = None) -> int:
+    """Recompute holdings from transactions with one aggregate INSERT ... SELECT.
+
+    Quantity is net shares bought, and the average price is the net amount
+    paid divided by it; stocks with no shares left get no holding. With
+    `users`, only that range of user ids is rebuilt.
+    """
+    signed_quantity = case(
+        (Transaction.transaction_type == "BUY", Transaction.quantity), else_=-Transaction.quantity
+    )
+    signed_amount = case(
+        (Transaction.transaction_type == "BUY", Transaction.total_amount), else_=-Transaction.total_amount
+    )
+    quantity = func.sum(signed_quantity)
+    positions = (
+        select(
+            Transaction.user_id,
+            Transaction.stock_id,
+            quantity,
+            func.sum(signed_amount) / quantity,
+        )
+        .group_by(Transaction.user_id, Transaction.stock_id)
+        .having(quantity > 0)
+    )
+    clear = delete(Holding)
+    if users is not None:
+        positions = positions.where(Transaction.user_id >= users.start, Transaction.user_id < users.stop)
+        clear = clear.where(Holding.user_id >= users.start, Holding.user_id < users.stop)
+
+    connection.execute(clear)
+    result = connection.execute(
+        insert(Holding).from_select(["user_id", "stock_id", "quantity", "average_price"], positions)
+    )
+    return result.rowcount
+
+
+def _last_price_per_day(connection, table):
+    """(stock_id, day, price) for the last row of each stock and day in a
+    price_ticks/transactions style table."""
+    day = func.date(table.timestamp)
+    ranked = select(
+        table.stock_id,
+        day.label("day"),
+        table.price,
+        func.row_number().over(
+            partition_by=(table.stock_id, day), order_by=(table.timestamp.desc(), table.id.desc())
+        ).label("rank"),
+    ).subquery()
+    return connection.execute(
+        select(ranked.c.stock_id, ranked.c.day, ranked.c.price).where(ranked.c.rank == 1)
+    )
+
+
+def daily_closes(connection) -> dict:
+    """stock_id -> (sorted days, closing prices) for every day with a price.
+
+    A day closes at its last recorded tick, or failing that at the last
+    price the stock traded at that day.
+    """
+    closes = defaultdict(dict)
+    for stock_id, day, price in _last_price_per_day(connection, Transaction):
+        closes[stock_id][date.fromisoformat(str(day))] = price
+    # Ticks win over trades on days that have both
+    for stock_id, day, price in _last_price_per_day(connection, PriceTick):
+        closes[stock_id][date.fromisoformat(str(day))] = price
+    series = {}
+    for stock_id, prices in closes.items():
+        days = sorted(prices)
+        series[stock_id] = (days, [prices[day] for day in days])
+    return series
+
+
+def _portfolio_points(user_id, transactions, closes, current_prices, today):
+    """Daily points for one user from their first trade through `today`."""
+    by_day = {
+        day: list(trades)
+        for day, trades in groupby(transactions, key=lambda transaction: transaction.timestamp.date())
+    }
+    positions = {}
+    day = min(by_day)
+    while day <= today:
+        for transaction in by_day.get(day, ()):
+            quantity, average_price = positions.get(transaction.stock_id, (0, 0.0))
+            # Same position arithmetic as apply_buy/apply_sell
+            if transaction.transaction_type == "BUY":
+                total = quantity + transaction.quantity
+                average_price = (quantity * average_price + transaction.quantity * transaction.price) / total
+                quantity = total
+            else:
+                quantity = max(0, quantity - transaction.quantity)
+            if quantity:
+                positions[transaction.stock_id] = (quantity, average_price)
+            else:
+                positions.pop(transaction.stock_id, None)
+
+        invested_value = 0.0
+        current_value = 0.0
+        for stock_id, (quantity, average_price) in positions.items():
+            invested_value += quantity * average_price
+            if day == today and stock_id in current_prices:
+                price = current_prices[stock_id]
+            else:
+                # Latest close on or before this day
+                days, prices = closes.get(stock_id, ((), ()))
+                index = bisect_right(days, day)
+                price = prices[index - 1] if index else average_price
+            current_value += quantity * price
+        yield {
+            "user_id": user_id,
+            "day": day,
+            "invested_value": invested_value,
+            "current_value": current_value,
+        }
+        day += timedelta(days=1)
+
+
+def _user_batches(connection, users: Optional[range], batch_size: int):
+    """Ids of users with transactions, `batch_size` at a time, as (first, last)."""
+    traders = select(Transaction.user_id).distinct().order_by(Transaction.user_id)
+    if users is not None:
+        traders = traders.where(Transaction.user_id >= users.start, Transaction.user_id < users.stop)
+    user_ids = connection.execute(traders).scalars().all()
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        yield batch[0], batch[-1]
+
+
+def backfill_portfolio_values(connection, users: Optional[range] = None, batch_size: int = 1000) -> int:
+    """Rebuild the daily portfolio_values series by replaying transactions.
+
+    Each user gets a point for every day from their first trade through
+    today. Past days are valued at daily closes, carried forward over days
+    without a price; today is valued at the stocks' current prices. Users
+    are replayed `batch_size` at a time, committing after each batch. With
+    `users`, only that range of user ids is rebuilt.
+    """
+    closes = daily_closes(connection)
+    current_prices = dict(connection.execute(select(Stock.id, Stock.current_price)).all())
+    today = datetime.utcnow().date()
+
+    clear = delete(PortfolioValue)
+    if users is not None:
+        clear = clear.where(PortfolioValue.user_id >= users.start, PortfolioValue.user_id < users.stop)
+    connection.execute(clear)
+
+    total = 0
+    for first, last in _user_batches(connection, users, batch_size):
+        transactions = connection.execute(
+            select(
+                Transaction.user_id, Transaction.stock_id, Transaction.transaction_type,
+                Transaction.quantity, Transaction.price, Transaction.timestamp,
+            )
+            .where(Transaction.user_id >= first, Transaction.user_id <= last)
+            .order_by(Transaction.user_id, Transaction.timestamp, Transaction.id)
+        )
+        points = [
+            point
+            for user_id, user_transactions in groupby(transactions, key=lambda transaction: transaction.user_id)
+            for point in _portfolio_points(user_id, user_transactions, closes, current_prices, today)
+        ]
+        if points:
+            connection.execute(insert(PortfolioValue), points)
+        connection.commit()
+        total += len(points)
+    return total
+
+
+def backfill_tax_lots(connection, users: Optional[range] = None, batch_size: int = 1000) -> Tuple[int, int]:
+    """Rebuild tax lots and realized P&L by replaying transactions once.
+
+    Each buy opens a lot and each sell consumes the oldest open lots of
+    that stock, as apply_buy/apply_sell do. Users are replayed
+    `batch_size` at a time, committing after each batch. With `users`,
+    only that range of user ids is rebuilt. Returns (lots, realized rows).
+    """
+    for table in (TaxLot, RealizedPnl):
+        clear = delete(table)
+        if users is not None:
+            clear = clear.where(table.user_id >= users.start, table.user_id < users.stop)
+        connection.execute(clear)
+
+    lot_count = 0
+    realized_count = 0
+    for first, last in _user_batches(connection, users, batch_size):
+        transactions = connection.execute(
+            select(
+                Transaction.user_id, Transaction.stock_id, Transaction.transaction_type,
+                Transaction.quantity, Transaction.price, Transaction.timestamp,
+            )
+            .where(Transaction.user_id >= first, Transaction.user_id <= last)
+            .order_by(Transaction.user_id, Transaction.stock_id, Transaction.timestamp, Transaction.id)
+        )
+        lots = []
+        realized_rows = []
+        for (user_id, stock_id), trades in groupby(transactions, key=lambda row: (row.user_id, row.stock_id)):
+            # Indexes into `lots` of this stock's open lots, oldest first
+            open_lots = deque()
+            quantity_sold = 0
+            realized = 0.0
+            for trade in trades:
+                if trade.transaction_type == "BUY":
+                    open_lots.append(len(lots))
+                    lots.append({
+                        "user_id": user_id, "stock_id": stock_id, "quantity": trade.quantity,
+                        "remaining": trade.quantity, "price": trade.price, "opened_at": trade.timestamp,
+                    })
+                    continue
+                quantity_sold += trade.quantity
+                left = trade.quantity
+                while left and open_lots:
+                    lot = lots[open_lots[0]]
+                    used = min(lot["remaining"], left)
+                    realized += used * (trade.price - lot["price"])
+                    lot["remaining"] -= used
+                    left -= used
+                    if not lot["remaining"]:
+                        open_lots.popleft()
+            if quantity_sold:
+                realized_rows.append({
+                    "user_id": user_id, "stock_id": stock_id, "quantity_sold": quantity_sold, "realized": realized,
+                })
+        if lots:
+            connection.execute(insert(TaxLot), lots)
+        if realized_rows:
+            connection.execute(insert(RealizedPnl), realized_rows)
+        connection.commit()
+        lot_count += len(lots)
+        realized_count += len(realized_rows)
+    return lot_count, realized_count
+
+
+def _in_users(column, users: range):
+    return and_(column >= users.start, column < users.stop)
+
+
+def _account_holdings(connection, users: range) -> dict:
+    holdings = defaultdict(dict)
+    rows = connection.execute(
+        select(Holding.user_id, Holding.stock_id, Holding.quantity, Holding.average_price)
+        .where(_in_users(Holding.user_id, users))
+    )
+    for user_id, stock_id, quantity, price in rows:
+        holdings[user_id][stock_id] = (quantity, price)
+    return holdings
+
+
+def backfill_ledger(connection, users: Optional[range] = None, batch_size: int = 1000) -> int:
+    """Record an opening snapshot of the current balance and holdings for
+    every account that has neither a snapshot nor any events yet.
+
+    Accounts that already have a ledger are left alone, so this can be
+    rerun safely; run it while the API is stopped. With `users`, only that
+    range of user ids is considered. Returns the snapshots written.
+    """
+    unrecorded = select(User.id).where(
+        ~select(AccountSnapshot.id).where(AccountSnapshot.user_id == User.id).exists(),
+        ~select(AccountEvent.id).where(AccountEvent.user_id == User.id).exists(),
+    )
+    if users is not None:
+        unrecorded = unrecorded.where(_in_users(User.id, users))
+    user_ids = connection.execute(unrecorded.order_by(User.id)).scalars().all()
+
+    total = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        chunk = range(batch[0], batch[-1] + 1)
+        balances = dict(connection.execute(select(User.id, User.balance).where(_in_users(User.id, chunk))).all())
+        holdings = _account_holdings(connection, chunk)
+        connection.execute(insert(AccountSnapshot), [
+            {
+                "user_id": user_id,
+                "event_id": 0,
+                "balance": balances[user_id] or 0.0,
+                "holdings": AccountState(holdings=holdings.get(user_id, {})).snapshot_holdings(),
+            }
+            for user_id in batch
+        ])
+        connection.commit()
+        total += len(batch)
+    return total
+
+
+def _last_event_ids(connection, users: range) -> Dict[int, int]:
+    return dict(connection.execute(
+        select(AccountEvent.user_id, func.max(AccountEvent.id))
+        .where(_in_users(AccountEvent.user_id, users))
+        .group_by(AccountEvent.user_id)
+    ).all())
+
+
+def reconcile_accounts(connection, users: range, snapshot_every: int = 0):
+    """Rebuild every account in `users` from its ledger and compare it with
+    the live balance and holdings.
+
+    Each account replays only the events after its latest snapshot. Live
+    rows are read between two looks at each user's last event id; accounts
+    that traded in between are skipped rather than reported. Returns
+    (checked, mismatched, changed, snapshots): mismatched holds
+    (user_id, details, rebuilt state) tuples, changed the skipped user
+    ids, and snapshots new snapshot rows for consistent accounts with at
+    least `snapshot_every` events since their last one (none when 0).
+    """
+    before = _last_event_ids(connection, users)
+    balances = dict(connection.execute(select(User.id, User.balance).where(_in_users(User.id, users))).all())
+    holdings = _account_holdings(connection, users)
+    after = _last_event_ids(connection, users)
+    changed = sorted(user_id for user_id in after if after[user_id] != before.get(user_id))
+
+    latest = (
+        select(AccountSnapshot.user_id, func.max(AccountSnapshot.event_id).label("event_id"))
+        .where(_in_users(AccountSnapshot.user_id, users))
+        .group_by(AccountSnapshot.user_id)
+        .subquery()
+    )
+    states = {}
+    snapshots = connection.execute(
+        select(AccountSnapshot.user_id, AccountSnapshot.event_id, AccountSnapshot.balance, AccountSnapshot.holdings)
+        .join(latest, and_(
+            AccountSnapshot.user_id == latest.c.user_id, AccountSnapshot.event_id == latest.c.event_id
+        ))
+    )
+    for user_id, event_id, balance, snapshot_holdings in snapshots:
+        states[user_id] = AccountState.from_snapshot(event_id, balance, snapshot_holdings)
+
+    replayed = defaultdict(int)
+    events = connection.execute(
+        select(
+            AccountEvent.user_id, AccountEvent.id, AccountEvent.kind, AccountEvent.stock_id,
+            AccountEvent.quantity, AccountEvent.price, AccountEvent.amount,
+        )
+        .outerjoin(latest, latest.c.user_id == AccountEvent.user_id)
+        .where(_in_users(AccountEvent.user_id, users), AccountEvent.id > func.coalesce(latest.c.event_id, 0))
+        .order_by(AccountEvent.user_id, AccountEvent.id)
+    )
+    for user_id, *event in events:
+        # Events committed after the live rows were read belong to later state
+        if event[0] <= before.get(user_id, 0):
+            states.setdefault(user_id, AccountState()).apply(*event)
+            replayed[user_id] += 1
+
+    skipped = set(changed)
+    mismatched = []
+    new_snapshots = []
+    for user_id in sorted(balances.keys() - skipped):
+        state = states.get(user_id, AccountState())
+        details = account_mismatches(state, balances[user_id], holdings.get(user_id, {}))
+        if details:
+            mismatched.append((user_id, details, state))
+        elif snapshot_every and replayed[user_id] >= snapshot_every:
+            new_snapshots.append({
+                "user_id": user_id,
+                "event_id": state.event_id,
+                "balance": state.balance,
+                "holdings": state.snapshot_holdings(),
+            })
+    return len(balances) - len(skipped & balances.keys()), mismatched, changed, new_snapshots
+
+
+def restore_accounts(connection, states: Dict[int, AccountState]) -> int:
+    """Overwrite live balances and holdings with states rebuilt from the ledger.
+
+    Meant for repairing drifted accounts while trading is stopped; nothing
+    guards against a concurrent trade. Nothing is committed.
+    """
+    if not states:
+        return 0
+    connection.execute(
+        update(User).where(User.id == bindparam("account_id")).values(balance=bindparam("ledger_balance")),
+        [{"account_id": user_id, "ledger_balance": state.balance} for user_id, state in states.items()],
+    )
+    connection.execute(delete(Holding).where(Holding.user_id.in_(list(states))))
+    rows = [
+        {"user_id": user_id, "stock_id": stock_id, "quantity": quantity, "average_price": price}
+        for user_id, state in states.items()
+        for stock_id, (quantity, price) in state.holdings.items()
+    ]
+    if rows:
+        connection.execute(insert(Holding), rows)
+    return len(states)
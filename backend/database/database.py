@@ -1,20 +1,221 @@
-from sqlalchemy import create_engine
+import asyncio
+import os
+import weakref
+from functools import lru_cache
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Storage profile. DATABASE_URL may point at SQLite or PostgreSQL; the async
+# URL is derived from it unless ASYNC_DATABASE_URL is set explicitly.
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./zerodha.db")
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# SQLite pragmas applied to every new connection. WAL lets readers run
+# alongside the writer, and synchronous=NORMAL only fsyncs at checkpoints.
+# A negative cache_size is in KiB.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """Swap a synchronous driver in a database URL for its asyncio counterpart."""
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(SQLALCHEMY_DATABASE_URL)
+
+def is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Engine keyword arguments for the storage backend behind `url`."""
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        if not is_sqlite_file(url):
+            # In-memory databases keep the dialect's default single-connection pool
+            return {} if is_async else {"connect_args": {"check_same_thread": False}}
+        options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+        if is_async:
+            # aiosqlite defaults to opening a new connection per session
+            options["poolclass"] = AsyncAdaptedQueuePool
+        else:
+            options["connect_args"] = {"check_same_thread": False}
+        return options
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+def begin_before_savepoint(conn, name):
+    # pysqlite only opens a transaction ahead of DML; a SAVEPOINT sent first
+    # would open one of its own, and releasing it would commit
+    if not conn.connection.driver_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+
+def configure_engine(engine):
+    """Register per-connection setup for the engine's backend."""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+        event.listen(engine, "savepoint", begin_before_savepoint)
+    return engine
+
+# SQLite allows one writer at a time and makes the others poll for up to
+# busy_timeout; with many requests writing at once, a waiter can lose that
+# race until it fails with "database is locked". Sessions on SQLite
+# therefore queue for a per-process lock (FIFO) from their first write
+# until the transaction ends, so within a worker writers take turns and
+# only other processes can keep them waiting.
+_write_locks = weakref.WeakKeyDictionary()
+
+def _write_lock() -> asyncio.Lock:
+    # One per event loop; asyncio locks can't be shared between loops
+    loop = asyncio.get_running_loop()
+    lock = _write_locks.get(loop)
+    if lock is None:
+        lock = _write_locks[loop] = asyncio.Lock()
+    return lock
+
+class SerializedWriteSession(AsyncSession):
+    """AsyncSession holding the process write lock for each write transaction."""
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./zerodha.db"
+    _held_lock = None
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async def _begin_write(self):
+        if self._held_lock is None:
+            # Check out the connection before queueing: a lock holder still
+            # waiting on the pool could be stuck behind waiters holding it all
+            await self.connection()
+            lock = _write_lock()
+            await lock.acquire()
+            self._held_lock = lock
+
+    def _end_write(self):
+        if self._held_lock is not None:
+            self._held_lock.release()
+            self._held_lock = None
+
+    async def execute(self, statement, *args, **kwargs):
+        if getattr(statement, "is_dml", False):
+            await self._begin_write()
+        return await super().execute(statement, *args, **kwargs)
+
+    async def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            await self._begin_write()
+        await super().flush(objects)
+
+    async def commit(self):
+        if self.new or self.dirty or self.deleted:
+            await self._begin_write()
+        try:
+            await super().commit()
+        finally:
+            self._end_write()
+
+    async def rollback(self):
+        try:
+            await super().rollback()
+        finally:
+            self._end_write()
+
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            self._end_write()
+
+# Engines and session factories are built on first use rather than at
+# import, so importing models, routers or the app never loads a driver or
+# opens the database. The module attributes `engine`, `SessionLocal`,
+# `async_engine` and `AsyncSessionLocal` resolve to them lazily.
+
+@lru_cache(maxsize=None)
+def get_engine():
+    """Synchronous engine for scripts and schema migrations."""
+    return configure_engine(
+        create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+    )
+
+@lru_cache(maxsize=None)
+def get_session_factory():
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+@lru_cache(maxsize=None)
+def get_async_engine():
+    """Async engine used by the API so database calls don't block the event loop."""
+    async_engine = create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL, **engine_options(ASYNC_SQLALCHEMY_DATABASE_URL, is_async=True)
+    )
+    configure_engine(async_engine.sync_engine)
+    return async_engine
+
+@lru_cache(maxsize=None)
+def get_async_session_factory():
+    # Objects stay loaded after commit: lazy loads are not possible under asyncio
+    async_engine = get_async_engine()
+    session_class = SerializedWriteSession if async_engine.dialect.name == "sqlite" else AsyncSession
+    return async_sessionmaker(async_engine, class_=session_class, autoflush=False, expire_on_commit=False)
+
+_LAZY_ATTRIBUTES = {
+    "engine": get_engine,
+    "SessionLocal": get_session_factory,
+    "async_engine": get_async_engine,
+    "AsyncSessionLocal": get_async_session_factory,
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 Base = declarative_base()
 
 # Dependency to get database session
 def get_db():
-    db = SessionLocal()
+    db = get_session_factory()()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with get_async_session_factory()() as db:
+        yield db
@@ -0,0 +1,46 @@
+import argparse
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+from backend.database.database import get_engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+# Revision matching the schema create_all built before migrations existed
+BASELINE_REVISION = "0001"
+
+def alembic_config(connection=None) -> Config:
+    config = Config(ALEMBIC_INI)
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+def upgrade_database(revision: str = "head"):
+    """Bring the database schema up to `revision`.
+
+    Databases created by the old create_all call have tables but no
+    alembic_version table; they are stamped at the baseline revision first
+    so only the later migrations run against them.
+    """
+    with get_engine().begin() as connection:
+        tables = set(inspect(connection).get_table_names())
+        config = alembic_config(connection)
+        if "users" in tables and "alembic_version" not in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, revision)
+
+def main():
+    """Apply pending schema migrations; run once per deploy, before starting workers"""
+    parser = argparse.ArgumentParser(prog="python -m backend.database.migrations", description=main.__doc__)
+    parser.add_argument("revision", nargs="?", default="head", help="Revision to upgrade to (default: head)")
+    args = parser.parse_args()
+    upgrade_database(args.revision)
+    print(f"Database is at revision {args.revision}")
+    get_engine().dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Index hot holdings/transactions lookups and make holdings unique per stock
+
+Duplicate (user_id, stock_id) holdings are merged into the oldest row,
+keeping total quantity and the quantity-weighted average price, before the
+unique index is built.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 00:00:01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        UPDATE holdings SET
+            average_price = (
+                SELECT SUM(h.quantity * h.average_price) / NULLIF(SUM(h.quantity), 0)
+                FROM holdings h
+                WHERE h.user_id = holdings.user_id AND h.stock_id = holdings.stock_id
+            ),
+            quantity = (
+                SELECT SUM(h.quantity)
+                FROM holdings h
+                WHERE h.user_id = holdings.user_id AND h.stock_id = holdings.stock_id
+            )
+        WHERE id IN (
+            SELECT MIN(id) FROM holdings GROUP BY user_id, stock_id HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM holdings
+        WHERE id NOT IN (SELECT MIN(id) FROM holdings GROUP BY user_id, stock_id)
+        """
+    )
+    # if_not_exists covers databases created by create_all from the current models
+    op.create_index(
+        "ix_holdings_user_id_stock_id", "holdings", ["user_id", "stock_id"], unique=True, if_not_exists=True
+    )
+    op.create_index(
+        "ix_transactions_user_id_timestamp_id", "transactions", ["user_id", "timestamp", "id"], if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_user_id_timestamp_id", table_name="transactions")
+    op.drop_index("ix_holdings_user_id_stock_id", table_name="holdings")
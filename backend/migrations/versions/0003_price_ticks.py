@@ -0,0 +1,35 @@
+"""Price tick history for candles
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 00:00:02
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "price_ticks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("stock_id", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("volume", sa.Integer(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["stock_id"], ["stocks.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_price_ticks_stock_id_timestamp", "price_ticks", ["stock_id", "timestamp"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_price_ticks_stock_id_timestamp", table_name="price_ticks")
+    op.drop_table("price_ticks")
@@ -0,0 +1,35 @@
+"""Daily portfolio value series
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 00:00:03
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "portfolio_values",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("invested_value", sa.Float(), nullable=False),
+        sa.Column("current_value", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_portfolio_values_user_id_day", "portfolio_values", ["user_id", "day"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_portfolio_values_user_id_day", table_name="portfolio_values")
+    op.drop_table("portfolio_values")
@@ -0,0 +1,59 @@
+"""FIFO tax lots and realized P&L per user and stock
+
+Existing transactions are not replayed here; run
+`backend/scripts/backfill.py tax-lots` once after upgrading.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16 00:00:04
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tax_lots",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("stock_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("remaining", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("opened_at", sa.DateTime(timezone=True), server_default=sa.text("(CURRENT_TIMESTAMP)"), nullable=True),
+        sa.ForeignKeyConstraint(["stock_id"], ["stocks.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_tax_lots_open", "tax_lots", ["user_id", "stock_id", "id"],
+        sqlite_where=sa.text("remaining > 0"), postgresql_where=sa.text("remaining > 0"),
+    )
+
+    op.create_table(
+        "realized_pnl",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("stock_id", sa.Integer(), nullable=False),
+        sa.Column("quantity_sold", sa.Integer(), nullable=False),
+        sa.Column("realized", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["stock_id"], ["stocks.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_realized_pnl_user_id_stock_id", "realized_pnl", ["user_id", "stock_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_realized_pnl_user_id_stock_id", table_name="realized_pnl")
+    op.drop_table("realized_pnl")
+    op.drop_index("ix_tax_lots_open", table_name="tax_lots")
+    op.drop_table("tax_lots")
@@ -0,0 +1,58 @@
+"""Append-only account event log and per-user snapshots
+
+Existing balances and holdings are not converted here; run
+`backend/scripts/backfill.py ledger` once after upgrading to record an
+opening snapshot for every account.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16 00:00:05
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "account_events",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("stock_id", sa.Integer(), nullable=True),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("(CURRENT_TIMESTAMP)"), nullable=True),
+        sa.ForeignKeyConstraint(["stock_id"], ["stocks.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_account_events_user_id_id", "account_events", ["user_id", "id"])
+
+    op.create_table(
+        "account_snapshots",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("event_id", sa.Integer(), nullable=False),
+        sa.Column("balance", sa.Float(), nullable=False),
+        sa.Column("holdings", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("(CURRENT_TIMESTAMP)"), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_account_snapshots_user_id_event_id", "account_snapshots", ["user_id", "event_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_account_snapshots_user_id_event_id", table_name="account_snapshots")
+    op.drop_table("account_snapshots")
+    op.drop_index("ix_account_events_user_id_id", table_name="account_events")
+    op.drop_table("account_events")
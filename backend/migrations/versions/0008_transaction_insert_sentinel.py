@@ -0,0 +1,25 @@
+"""Insert sentinel column on transactions for ordered multi-row RETURNING
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16 00:00:07
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("transactions", sa.Column("insert_sentinel", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("transactions") as batch_op:
+        batch_op.drop_column("insert_sentinel")
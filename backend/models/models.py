@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Table
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Date, DateTime, JSON, Table, Index, insert_sentinel, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -45,6 +45,10 @@ class Stock(Base):
 
 class Holding(Base):
     __tablename__ = "holdings"
+    __table_args__ = (
+        # One holding per user and stock; also serves lookups by user_id alone
+        Index("ix_holdings_user_id_stock_id", "user_id", "stock_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -57,6 +61,10 @@ class Holding(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # A user's history in time order, as paged by /trading/transactions
+        Index("ix_transactions_user_id_timestamp_id", "user_id", "timestamp", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -66,6 +74,107 @@ class Transaction(Base):
     price = Column(Float)
     total_amount = Column(Float)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # Filled in by SQLAlchemy on multi-row INSERT ... RETURNING so the rows
+    # come back in parameter order; NULL otherwise
+    _insert_sentinel = insert_sentinel("insert_sentinel")
     
     user = relationship("User", back_populates="transactions")
-    stock = relationship("Stock", back_populates="transactions") 
\ No newline at end of file
+    stock = relationship("Stock", back_populates="transactions") 
+
+class PriceTick(Base):
+    __tablename__ = "price_ticks"
+    __table_args__ = (
+        # Append-only history read in time order per stock for candles
+        Index("ix_price_ticks_stock_id_timestamp", "stock_id", "timestamp"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False)
+    price = Column(Float, nullable=False)
+    volume = Column(Integer, nullable=False, default=0)
+    timestamp = Column(DateTime, nullable=False)
+
+class PortfolioValue(Base):
+    __tablename__ = "portfolio_values"
+    __table_args__ = (
+        # One point per user and day, read as a date range per user
+        Index("ix_portfolio_values_user_id_day", "user_id", "day", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    invested_value = Column(Float, nullable=False)
+    current_value = Column(Float, nullable=False)
+
+class TaxLot(Base):
+    __tablename__ = "tax_lots"
+    __table_args__ = (
+        # Open lots per user and stock in FIFO order; closed lots stay in
+        # the table but out of the index
+        Index(
+            "ix_tax_lots_open", "user_id", "stock_id", "id",
+            sqlite_where=text("remaining > 0"), postgresql_where=text("remaining > 0"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    remaining = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False)
+    opened_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RealizedPnl(Base):
+    __tablename__ = "realized_pnl"
+    __table_args__ = (
+        Index("ix_realized_pnl_user_id_stock_id", "user_id", "stock_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False)
+    quantity_sold = Column(Integer, nullable=False, default=0)
+    realized = Column(Float, nullable=False, default=0.0)
+
+class AccountEvent(Base):
+    __tablename__ = "account_events"
+    __table_args__ = (
+        # One account's events in order, replayed from its last snapshot
+        Index("ix_account_events_user_id_id", "user_id", "id"),
+    )
+
+    # Append-only; ids give the order events are replayed in
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)  # "DEPOSIT", "BUY" or "SELL"
+    stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    price = Column(Float, nullable=False, default=0.0)
+    amount = Column(Float, nullable=False)  # Signed change to the balance
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AccountSnapshot(Base):
+    __tablename__ = "account_snapshots"
+    __table_args__ = (
+        # Latest snapshot per user
+        Index("ix_account_snapshots_user_id_event_id", "user_id", "event_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Last event folded into this state; 0 for an opening snapshot
+    event_id = Column(Integer, nullable=False)
+    balance = Column(Float, nullable=False)
+    # {"<stock_id>": [quantity, average_price]}
+    holdings = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Lease(Base):
+    __tablename__ = "leases"
+
+    # A role one process holds at a time, such as running the matching engine
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
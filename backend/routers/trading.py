@@ -1,200 +1,455 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from sqlalchemy import func
+import asyncio
+import json
 
-from backend.models.models import User, Stock, Holding, Transaction
-from backend.schemas.schemas import Stock as StockSchema, StockCreate, Transaction as TransactionSchema, TransactionCreate, Holding as HoldingSchema, PortfolioSummary
-from backend.utils.auth import get_current_active_user
-from backend.database.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, datetime
+from sqlalchemy import select
+
+from backend.models.models import User, Stock, Transaction
+from backend.schemas.schemas import Stock as StockSchema, StockCreate, Transaction as TransactionSchema, TransactionCreate, Holding as HoldingSchema, PortfolioSummary, PriceTick, PriceTickBatch, PriceIngestResult, OrderBatchCreate, OrderBatchResult, LimitOrderCreate, Order as OrderSchema, OrderResult, OrderBookDepth, Candle as CandleSchema, PortfolioValuePoint, PnlSummary
+from backend.utils.auth import get_current_active_user, principal_cache
+from backend.database.database import get_async_db, get_async_session_factory
+from backend.services.candles import CANDLE_MAX_LIMIT, candle_store
+from backend.services.group_commit import order_writer
+from backend.services.orderbook import matching_engine
+from backend.services.orders import ORDER_BATCH_MAX_SIZE, OrderError, apply_buy, apply_sell, execute_batch, load_holding, user_sequencer
+from backend.services.lots import load_pnl
+from backend.services.portfolio import load_holding_rows, value_portfolio
+from backend.services.portfolio_history import load_series, portfolio_history
+from backend.services.prices import price_cache
+from backend.services.search import stock_search
+from backend.services.serialization import STOCK_COLUMNS, serialize_quotes, serialize_stock_rows
+from backend.services.snapshots import snapshot_response, stock_snapshots
+from backend.services.streaming import (
+    STREAM_HEARTBEAT_INTERVAL,
+    STREAM_SEND_TIMEOUT,
+    Subscription,
+    quote_hub,
+    quote_payload,
+)
+from backend.services.transactions import page_transactions, stream_transactions
 
 router = APIRouter(
     prefix="/trading",
     tags=["trading"],
 )
 
+def _transaction_response(transaction: Transaction, stock):
+    # The stock is attached from the price cache; lazy loading is not
+    # available on async sessions
+    return {
+        "id": transaction.id,
+        "user_id": transaction.user_id,
+        "stock_id": transaction.stock_id,
+        "transaction_type": transaction.transaction_type,
+        "quantity": transaction.quantity,
+        "price": transaction.price,
+        "total_amount": transaction.total_amount,
+        "timestamp": transaction.timestamp,
+        "stock": stock,
+    }
+
+async def _execute_order(db: AsyncSession, operation, *args, **kwargs) -> Transaction:
+    # Run apply_buy/apply_sell and persist it: in the group-commit writer's
+    # next batch when it is running, otherwise with a commit of our own
+    try:
+        if order_writer.running:
+            # Hand this request's connection back to the pool first; the
+            # writer needs one to commit the batch we are waiting on
+            await db.close()
+            return await order_writer.submit(operation, *args, **kwargs)
+        db_transaction = await operation(db, *args, **kwargs)
+    except OrderError as e:
+        await db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    await db.commit()
+    await db.refresh(db_transaction)
+    return db_transaction
+
 @router.get("/stocks", response_model=List[StockSchema])
-async def get_stocks(db: Session = Depends(get_db)):
-    return db.query(Stock).all()
+async def get_stocks(request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Served from a pre-serialized snapshot with ETag/If-None-Match; the
+    # shape matches StockSchema
+    if price_cache.loaded:
+        return snapshot_response(request, stock_snapshots.stock_list())
+    result = await db.execute(select(*STOCK_COLUMNS))
+    return ORJSONResponse(serialize_stock_rows(result.all()))
+
+# Declared before /stocks/{stock_id} so "search" is not taken for an id
+@router.get("/stocks/search", response_model=List[StockSchema])
+async def search_stocks(
+    q: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(10, ge=1, le=50)
+):
+    # Answered from the in-memory index and price cache; no database access
+    return ORJSONResponse(serialize_quotes(stock_search.search_quotes(q, limit)))
 
 @router.get("/stocks/{stock_id}", response_model=StockSchema)
-async def get_stock(stock_id: int, db: Session = Depends(get_db)):
-    stock = db.query(Stock).filter(Stock.id == stock_id).first()
+async def get_stock(stock_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    stock = await price_cache.get_or_load(db, stock_id)
     if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
-    return stock
+    return snapshot_response(request, stock_snapshots.stock(stock))
+
+@router.get("/stocks/{stock_id}/candles", response_model=List[CandleSchema])
+async def get_candles(
+    stock_id: int,
+    interval: str = Query("1m", pattern="^(1m|5m|1h|1d)$"),
+    limit: int = Query(200, ge=1, le=CANDLE_MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # The most recent `limit` buckets that had ticks, oldest first
+    if not await price_cache.get_or_load(db, stock_id):
+        raise HTTPException(status_code=404, detail="Stock not found")
+    return ORJSONResponse(await candle_store.candles(db, stock_id, interval, limit))
 
 @router.post("/stocks", response_model=StockSchema, status_code=status.HTTP_201_CREATED)
 async def create_stock(
     stock: StockCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Check if stock already exists by symbol
-    existing_stock = db.query(Stock).filter(Stock.symbol == stock.symbol).first()
+    result = await db.execute(select(Stock).where(Stock.symbol == stock.symbol))
+    existing_stock = result.scalars().first()
     if existing_stock:
         raise HTTPException(status_code=400, detail="Stock already exists")
     
     db_stock = Stock(**stock.dict())
     db.add(db_stock)
-    db.commit()
-    db.refresh(db_stock)
+    await db.commit()
+    await db.refresh(db_stock)
+    quote_hub.publish([price_cache.upsert_stock(db_stock)])
+    stock_search.add(db_stock.id, db_stock.symbol, db_stock.name)
     return db_stock
 
+@router.post("/prices", response_model=PriceIngestResult)
+async def ingest_prices(
+    batch: PriceTickBatch,
+    current_user: User = Depends(get_current_active_user)
+):
+    # Ticks only touch the in-memory cache; the flusher writes them back in batches
+    updated, unknown_symbols = price_cache.apply_ticks(batch.ticks)
+    quote_hub.publish(updated)
+    return {
+        "accepted": len(updated),
+        "unknown_symbols": unknown_symbols,
+        "version": price_cache.version
+    }
+
+def _parse_symbols(symbols: str):
+    return [symbol.strip().upper() for symbol in symbols.split(",") if symbol.strip()]
+
+def _subscribe(subscription: Subscription, symbols):
+    # Subscribe and queue the current quote so clients start from a snapshot
+    quote_hub.subscribe(subscription, symbols)
+    for symbol in symbols:
+        quote = price_cache.get_by_symbol(symbol)
+        if quote:
+            subscription.push(quote)
+
+async def _receive_subscription_changes(websocket: WebSocket, subscription: Subscription):
+    while True:
+        message = await websocket.receive_json()
+        symbols = [str(symbol).upper() for symbol in message.get("symbols", [])]
+        if message.get("action") == "subscribe":
+            try:
+                _subscribe(subscription, symbols)
+            except ValueError as e:
+                await websocket.send_json({"error": str(e)})
+        elif message.get("action") == "unsubscribe":
+            quote_hub.unsubscribe(subscription, symbols)
+
+@router.websocket("/stream")
+async def stream_quotes(websocket: WebSocket, symbols: str = ""):
+    """Push changed quotes for the subscribed symbols.
+
+    Clients pass initial symbols as ``?symbols=TCS,INFY`` and can send
+    ``{"action": "subscribe" | "unsubscribe", "symbols": [...]}`` later.
+    A client that cannot take a message within STREAM_SEND_TIMEOUT is
+    disconnected; until then its pending updates are coalesced per symbol.
+    """
+    await websocket.accept()
+    subscription = Subscription()
+    receiver = None
+    try:
+        _subscribe(subscription, _parse_symbols(symbols))
+        receiver = asyncio.create_task(_receive_subscription_changes(websocket, subscription))
+        while True:
+            next_batch = asyncio.create_task(subscription.next_batch(STREAM_HEARTBEAT_INTERVAL))
+            await asyncio.wait({next_batch, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                next_batch.cancel()
+                break
+            quotes = [quote_payload(quote) for quote in next_batch.result()]
+            await asyncio.wait_for(websocket.send_json({"quotes": quotes}), STREAM_SEND_TIMEOUT)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+    except (WebSocketDisconnect, asyncio.TimeoutError):
+        pass
+    finally:
+        quote_hub.unsubscribe(subscription)
+        if receiver:
+            receiver.cancel()
+
+@router.get("/stream")
+async def stream_quotes_sse(request: Request, symbols: str):
+    """Server-sent events variant of the quote stream for a fixed symbol set."""
+    subscription = Subscription()
+    try:
+        _subscribe(subscription, _parse_symbols(symbols))
+    except ValueError as e:
+        quote_hub.unsubscribe(subscription)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                quotes = await subscription.next_batch(STREAM_HEARTBEAT_INTERVAL)
+                if quotes:
+                    yield f"data: {json.dumps([quote_payload(quote) for quote in quotes])}\n\n"
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            quote_hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @router.get("/portfolio", response_model=PortfolioSummary)
 async def get_portfolio(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    holdings = db.query(Holding).filter(Holding.user_id == current_user.id).all()
-    
-    # Calculate portfolio summary
-    invested_value = sum(holding.average_price * holding.quantity for holding in holdings)
-    
-    # Calculate current value based on current stock prices
-    current_value = 0
-    for holding in holdings:
-        stock = db.query(Stock).filter(Stock.id == holding.stock_id).first()
-        current_value += stock.current_price * holding.quantity
-    
-    return {
-        "invested_value": invested_value,
-        "current_value": current_value,
-        "pnl": current_value - invested_value,
-        "holdings": holdings
-    }
+    return await value_portfolio(db, current_user.id)
+
+@router.get("/portfolio/history", response_model=List[PortfolioValuePoint])
+async def get_portfolio_history(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # One point per day, read from the materialized series
+    return ORJSONResponse(await load_series(db, current_user.id, start=start, end=end))
+
+@router.get("/pnl", response_model=PnlSummary)
+async def get_pnl(
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # FIFO cost basis from open tax lots, plus running realized totals
+    return await load_pnl(db, current_user.id)
 
 @router.get("/holdings", response_model=List[HoldingSchema])
 async def get_holdings(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return db.query(Holding).filter(Holding.user_id == current_user.id).all()
+    # Serialized directly with orjson; shape matches HoldingSchema
+    return ORJSONResponse(await load_holding_rows(db, current_user.id))
 
 @router.post("/buy", response_model=TransactionSchema)
 async def buy_stock(
     transaction: TransactionCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Validate transaction type
     if transaction.transaction_type != "BUY":
         raise HTTPException(status_code=400, detail="Transaction type must be BUY")
     
     # Get stock and validate
-    stock = db.query(Stock).filter(Stock.id == transaction.stock_id).first()
+    stock = await price_cache.get_or_load(db, transaction.stock_id)
     if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
     
-    # Calculate total amount
-    total_amount = transaction.price * transaction.quantity
-    
-    # Check if user has enough balance
-    if current_user.balance < total_amount:
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-    
-    # Update user balance
-    current_user.balance -= total_amount
-    
-    # Create transaction
-    db_transaction = Transaction(
-        user_id=current_user.id,
-        stock_id=transaction.stock_id,
-        transaction_type="BUY",
-        quantity=transaction.quantity,
-        price=transaction.price,
-        total_amount=total_amount
-    )
-    db.add(db_transaction)
-    
-    # Update or create holding
-    holding = db.query(Holding).filter(
-        Holding.user_id == current_user.id,
-        Holding.stock_id == transaction.stock_id
-    ).first()
-    
-    if holding:
-        # Update existing holding with new average price
-        total_shares = holding.quantity + transaction.quantity
-        new_avg_price = ((holding.average_price * holding.quantity) + (transaction.price * transaction.quantity)) / total_shares
-        holding.quantity = total_shares
-        holding.average_price = new_avg_price
-    else:
-        # Create new holding
-        db_holding = Holding(
-            user_id=current_user.id,
-            stock_id=transaction.stock_id,
-            quantity=transaction.quantity,
-            average_price=transaction.price
+    # Orders from one user run one at a time; cash behind open limit
+    # orders is not available to spend
+    async with user_sequencer.hold(current_user.id):
+        db_transaction = await _execute_order(
+            db, apply_buy, current_user.id, transaction.stock_id, transaction.quantity, transaction.price,
+            reserved_cash=matching_engine.cash_hold(current_user.id)
         )
-        db.add(db_holding)
-    
-    db.commit()
-    db.refresh(db_transaction)
+    principal_cache.invalidate_user(current_user.id)
+    portfolio_history.mark(current_user.id)
     
     # Return transaction with stock details
-    return db_transaction
+    return _transaction_response(db_transaction, stock)
 
 @router.post("/sell", response_model=TransactionSchema)
 async def sell_stock(
     transaction: TransactionCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Validate transaction type
     if transaction.transaction_type != "SELL":
         raise HTTPException(status_code=400, detail="Transaction type must be SELL")
     
     # Get stock and validate
-    stock = db.query(Stock).filter(Stock.id == transaction.stock_id).first()
+    stock = await price_cache.get_or_load(db, transaction.stock_id)
     if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
     
-    # Check if user has the holding
-    holding = db.query(Holding).filter(
-        Holding.user_id == current_user.id,
-        Holding.stock_id == transaction.stock_id
-    ).first()
-    
-    if not holding:
-        raise HTTPException(status_code=400, detail="You don't own this stock")
-    
-    if holding.quantity < transaction.quantity:
-        raise HTTPException(status_code=400, detail="Insufficient shares to sell")
+    # Orders from one user run one at a time; shares behind open limit
+    # orders are not available to sell
+    async with user_sequencer.hold(current_user.id):
+        db_transaction = await _execute_order(
+            db, apply_sell, current_user.id, transaction.stock_id, transaction.quantity, transaction.price,
+            reserved_shares=matching_engine.share_hold(current_user.id, transaction.stock_id)
+        )
+    principal_cache.invalidate_user(current_user.id)
+    portfolio_history.mark(current_user.id)
     
-    # Calculate total amount
-    total_amount = transaction.price * transaction.quantity
+    # Return transaction with stock details
+    return _transaction_response(db_transaction, stock)
+
+@router.post("/orders/batch", response_model=OrderBatchResult)
+async def submit_order_batch(
+    batch: OrderBatchCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if batch.mode not in ("all_or_nothing", "best_effort"):
+        raise HTTPException(status_code=400, detail="Mode must be all_or_nothing or best_effort")
+    if not batch.orders:
+        raise HTTPException(status_code=400, detail="Batch has no orders")
+    if len(batch.orders) > ORDER_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {ORDER_BATCH_MAX_SIZE} orders per batch")
     
-    # Update user balance
-    current_user.balance += total_amount
+    # Stocks come from the price cache, with any misses read in one query
+    stocks = await price_cache.get_many_or_load(db, {order.stock_id for order in batch.orders})
+    async with user_sequencer.hold(current_user.id):
+        reserved_shares = {
+            stock_id: matching_engine.share_hold(current_user.id, stock_id) for stock_id in stocks
+        }
+        try:
+            executed, rejected = await execute_batch(
+                db, current_user.id, batch.orders, stocks.keys(),
+                all_or_nothing=batch.mode == "all_or_nothing",
+                reserved_cash=matching_engine.cash_hold(current_user.id),
+                reserved_shares=reserved_shares
+            )
+        except OrderError as e:
+            await db.rollback()
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        if executed:
+            await db.commit()
     
-    # Create transaction
-    db_transaction = Transaction(
-        user_id=current_user.id,
-        stock_id=transaction.stock_id,
-        transaction_type="SELL",
-        quantity=transaction.quantity,
-        price=transaction.price,
-        total_amount=total_amount
-    )
-    db.add(db_transaction)
+    if executed:
+        principal_cache.invalidate_user(current_user.id)
+        portfolio_history.mark(current_user.id)
     
-    # Update holding
-    holding.quantity -= transaction.quantity
+    return {
+        "executed": [
+            _transaction_response(transaction, stocks[transaction.stock_id]) for _, transaction in executed
+        ],
+        "rejected": [{"index": index, "detail": detail} for index, detail in rejected],
+    }
+
+def require_matching_engine():
+    # Books live in one process; the others turn limit orders away rather
+    # than keep books that never cross
+    if not matching_engine.lease.held:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Limit orders are handled by another worker"
+        )
+
+@router.post("/orders", response_model=OrderResult, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_matching_engine)])
+async def place_limit_order(
+    order: LimitOrderCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if order.side not in ("BUY", "SELL"):
+        raise HTTPException(status_code=400, detail="Order side must be BUY or SELL")
     
-    # Remove holding if quantity is zero
-    if holding.quantity == 0:
-        db.delete(holding)
+    stock = await price_cache.get_or_load(db, order.stock_id)
+    if not stock:
+        raise HTTPException(status_code=404, detail="Stock not found")
     
-    db.commit()
-    db.refresh(db_transaction)
+    # Holds are checked against the stored balance and holding, read while
+    # no other order from this user is running
+    async with user_sequencer.hold(current_user.id):
+        balance = (await db.execute(select(User.balance).where(User.id == current_user.id))).scalar()
+        holding = await load_holding(db, current_user.id, order.stock_id) if order.side == "SELL" else None
+        try:
+            placed, fills = matching_engine.submit(
+                current_user.id, order.stock_id, order.side, order.quantity, order.price,
+                balance=balance,
+                held_quantity=holding.quantity if holding else 0
+            )
+        except OrderError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
     
-    # Return transaction with stock details
-    return db_transaction
+    # Fills are written to the database by the engine's persister; the last
+    # trade becomes the stock's price straight away
+    if fills:
+        updated, _ = price_cache.apply_ticks([
+            PriceTick(symbol=stock.symbol, price=fills[-1].price, volume=sum(fill.quantity for fill in fills))
+        ])
+        quote_hub.publish(updated)
+    return {"order": placed, "fills": fills}
+
+@router.get("/orders", response_model=List[OrderSchema], dependencies=[Depends(require_matching_engine)])
+async def get_orders(current_user: User = Depends(get_current_active_user)):
+    return matching_engine.orders_for(current_user.id)
+
+@router.delete("/orders/{order_id}", response_model=OrderSchema, dependencies=[Depends(require_matching_engine)])
+async def cancel_order(order_id: int, current_user: User = Depends(get_current_active_user)):
+    try:
+        return matching_engine.cancel(current_user.id, order_id)
+    except OrderError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@router.get("/stocks/{stock_id}/book", response_model=OrderBookDepth, dependencies=[Depends(require_matching_engine)])
+async def get_order_book(
+    stock_id: int,
+    levels: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if not await price_cache.get_or_load(db, stock_id):
+        raise HTTPException(status_code=404, detail="Stock not found")
+    return {"stock_id": stock_id, **matching_engine.book(stock_id).depth(levels)}
 
 @router.get("/transactions", response_model=List[TransactionSchema])
 async def get_transactions(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    symbol: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return db.query(Transaction).filter(Transaction.user_id == current_user.id).all() 
\ No newline at end of file
+    # Newest first; pass the X-Next-Cursor header back as ?cursor= for the next page
+    try:
+        transactions, next_cursor = await page_transactions(
+            db, current_user.id, limit, cursor=cursor, start=start, end=end, symbol=symbol
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Serialized directly with orjson; shape matches TransactionSchema
+    response = ORJSONResponse(transactions)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+@router.get("/transactions/export")
+async def export_transactions(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    symbol: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_transactions(get_async_session_factory(), current_user.id, format, start=start, end=end, symbol=symbol),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'}
+    )
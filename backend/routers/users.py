@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.models.models import User
-from backend.schemas.schemas import User as UserSchema, UserUpdate, FundAdd
-from backend.utils.auth import get_current_active_user
-from backend.database.database import get_db
+from backend.schemas.schemas import User as UserSchema, UserUpdate, FundAdd, LedgerAudit
+from backend.utils.auth import get_current_active_user, get_fresh_active_user, principal_cache
+from backend.database.database import get_async_db
+from backend.services.ledger import DEPOSIT, audit_account, record_event
+from backend.services.orders import change_balance
 
 router = APIRouter(
     prefix="/users",
@@ -18,24 +20,37 @@ async def read_users_me(current_user: User = Depends(get_current_active_user)):
 @router.put("/me", response_model=UserSchema)
 async def update_user(
     user_update: UserUpdate, 
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_fresh_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Update user fields if they are provided
     for key, value in user_update.dict(exclude_unset=True).items():
         setattr(current_user, key, value)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    principal_cache.invalidate_user(current_user.id)
     return current_user
 
 @router.post("/funds", response_model=UserSchema)
 async def add_funds(
     funds: FundAdd,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Credit in one UPDATE so concurrent orders cannot overwrite it
+    if not await change_balance(db, current_user.id, funds.amount):
+        raise HTTPException(status_code=400, detail="Inactive user")
+    await record_event(db, current_user.id, DEPOSIT, funds.amount)
+    await db.commit()
+    await db.refresh(current_user)
+    principal_cache.invalidate_user(current_user.id)
+    return current_user 
+
+@router.get("/me/ledger", response_model=LedgerAudit)
+async def audit_ledger(
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    current_user.balance += funds.amount
-    db.commit()
-    db.refresh(current_user)
-    return current_user 
\ No newline at end of file
+    # Replays only the events since the account's last snapshot
+    return await audit_account(db, current_user.id)
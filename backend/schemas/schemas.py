@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 # User schemas
 class UserBase(BaseModel):
@@ -65,6 +65,22 @@ class Stock(StockBase):
     class Config:
         orm_mode = True
 
+# Price tick schemas
+class PriceTick(BaseModel):
+    symbol: str
+    price: float = Field(..., gt=0)
+    day_high: Optional[float] = None
+    day_low: Optional[float] = None
+    volume: int = Field(0, ge=0)
+
+class PriceTickBatch(BaseModel):
+    ticks: List[PriceTick]
+
+class PriceIngestResult(BaseModel):
+    accepted: int
+    unknown_symbols: List[str]
+    version: int
+
 # Holding schemas
 class HoldingBase(BaseModel):
     stock_id: int
@@ -102,12 +118,106 @@ class Transaction(TransactionBase):
     class Config:
         orm_mode = True
 
+# Batch order schemas
+class OrderBatchCreate(BaseModel):
+    orders: List[TransactionCreate]
+    # "all_or_nothing" or "best_effort"
+    mode: str = "all_or_nothing"
+
+class OrderBatchRejection(BaseModel):
+    index: int
+    detail: str
+
+class OrderBatchResult(BaseModel):
+    executed: List[Transaction]
+    rejected: List[OrderBatchRejection]
+
+# Limit order schemas
+class LimitOrderCreate(BaseModel):
+    stock_id: int
+    side: str
+    quantity: int = Field(..., gt=0)
+    price: float = Field(..., gt=0)
+
+class Order(BaseModel):
+    id: int
+    user_id: int
+    stock_id: int
+    side: str
+    price: float
+    quantity: int
+    filled_quantity: int
+    status: str
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class Fill(BaseModel):
+    stock_id: int
+    price: float
+    quantity: int
+
+    class Config:
+        orm_mode = True
+
+class OrderResult(BaseModel):
+    order: Order
+    fills: List[Fill]
+
+class BookLevel(BaseModel):
+    price: float
+    quantity: int
+    orders: int
+
+class OrderBookDepth(BaseModel):
+    stock_id: int
+    bids: List[BookLevel]
+    asks: List[BookLevel]
+
+# Candle schemas
+class Candle(BaseModel):
+    time: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+
 # Fund schemas
 class FundAdd(BaseModel):
     amount: float = Field(..., gt=0)
 
+class LedgerAudit(BaseModel):
+    event_id: int
+    events_replayed: int
+    balance: float
+    ledger_balance: float
+    mismatches: List[str]
+    consistent: bool
+
 class PortfolioSummary(BaseModel):
     invested_value: float
     current_value: float
     pnl: float
-    holdings: List[Holding] 
\ No newline at end of file
+    holdings: List[Holding] 
+
+class PortfolioValuePoint(BaseModel):
+    day: date
+    invested_value: float
+    current_value: float
+    pnl: float
+
+class PnlPosition(BaseModel):
+    stock_id: int
+    symbol: Optional[str] = None
+    quantity: int
+    cost_basis: float
+    market_value: float
+    unrealized: float
+    realized: float
+
+class PnlSummary(BaseModel):
+    realized: float
+    unrealized: float
+    positions: List[PnlPosition]
\ No newline at end of file
@@ -0,0 +1,68 @@
+import sys
+import os
+import argparse
+import time
+from contextlib import nullcontext
+
+# Add the parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.database.bulk import backfill_ledger, backfill_portfolio_values, backfill_tax_lots, loading_pragmas
+from backend.database.database import engine
+from backend.database.migrations import upgrade_database
+
+def report_portfolio_history(count):
+    return f"Wrote {count} daily points"
+
+def report_tax_lots(result):
+    lots, realized = result
+    return f"Wrote {lots} lots and {realized} realized P&L rows"
+
+def report_ledger(count):
+    return f"Wrote {count} opening snapshots"
+
+# Subcommand -> (help, backfill, whether it runs under loading_pragmas, report)
+BACKFILLS = {
+    "portfolio-history": (
+        "Rebuild the daily portfolio value series from transaction history",
+        backfill_portfolio_values, True, report_portfolio_history,
+    ),
+    "tax-lots": (
+        "Rebuild FIFO tax lots and realized P&L from transaction history",
+        backfill_tax_lots, True, report_tax_lots,
+    ),
+    "ledger": (
+        "Record opening ledger snapshots for accounts without one",
+        backfill_ledger, False, report_ledger,
+    ),
+}
+
+def user_range(first_user, last_user):
+    """Users from --first-user to --last-user inclusive, or None for all users"""
+    if first_user is None and last_user is None:
+        return None
+    return range(first_user or 0, (last_user + 1) if last_user is not None else sys.maxsize)
+
+def main():
+    """Backfill derived tables for existing users, optionally a range of them at a time"""
+    parser = argparse.ArgumentParser(description="Backfill derived tables for existing users")
+    subparsers = parser.add_subparsers(dest="backfill", required=True)
+    for name, (description, _, _, _) in BACKFILLS.items():
+        subparser = subparsers.add_parser(name, help=description, description=description)
+        subparser.add_argument("--first-user", type=int, default=None, help="First user id to backfill (default: all users)")
+        subparser.add_argument("--last-user", type=int, default=None, help="Last user id to backfill, inclusive")
+        subparser.add_argument("--batch-size", type=int, default=1000, help="Users handled per query and commit")
+    args = parser.parse_args()
+
+    _, backfill, bulk_load, report = BACKFILLS[args.backfill]
+    users = user_range(args.first_user, args.last_user)
+
+    upgrade_database()
+    started = time.perf_counter()
+    with engine.connect() as connection, (loading_pragmas(connection) if bulk_load else nullcontext()):
+        result = backfill(connection, users, args.batch_size)
+    print(f"{report(result)} in {time.perf_counter() - started:.1f}s")
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import sys
+import os
+import argparse
+import asyncio
+import tempfile
+import time
+
+# Add the parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Orders need a file-backed database for commits to cost what they do in
+# production; build one through the migrations in a throwaway directory
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir.name, 'orders.db')}"
+# Measure commits, not rate limits
+os.environ.setdefault("ADMISSION_CONTROL", "0")
+
+import httpx
+
+from backend.app.main import app
+from backend.database.database import AsyncSessionLocal, SessionLocal, async_engine, engine
+from backend.database.migrations import upgrade_database
+from backend.models.models import User, Stock
+from backend.services.group_commit import order_writer
+from backend.services.prices import price_cache
+from backend.utils.auth import create_access_token
+
+def seed(num_users):
+    """Create `num_users` funded users and one stock; return their tokens"""
+    upgrade_database()
+    db = SessionLocal()
+    db.add(Stock(symbol="BENCH", name="Bench", exchange="NSE", current_price=10.0, day_high=10.0, day_low=10.0))
+    users = [
+        User(name=f"User {i}", email=f"user{i}@example.com", hashed_password="x", balance=1e9)
+        for i in range(num_users)
+    ]
+    db.add_all(users)
+    db.commit()
+    tokens = [create_access_token({"sub": user.email}) for user in users]
+    db.close()
+    engine.dispose()
+    return tokens
+
+async def run(tokens, orders_per_user, group_commit):
+    writer = asyncio.create_task(order_writer.run(AsyncSessionLocal)) if group_commit else None
+    await asyncio.sleep(0)
+    batches_before = order_writer.batches
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def trade(token):
+            headers = {"Authorization": f"Bearer {token}"}
+            for _ in range(orders_per_user):
+                response = await client.post(
+                    "/trading/buy",
+                    json={"stock_id": 1, "transaction_type": "BUY", "quantity": 1, "price": 10.0},
+                    headers=headers
+                )
+                response.raise_for_status()
+
+        # Warm the principal cache so the timing covers orders only
+        for token in tokens:
+            await client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+        start = time.perf_counter()
+        await asyncio.gather(*(trade(token) for token in tokens))
+        elapsed = time.perf_counter() - start
+
+    commits = len(tokens) * orders_per_user
+    if writer is not None:
+        commits = order_writer.batches - batches_before
+        writer.cancel()
+        try:
+            await writer
+        except asyncio.CancelledError:
+            pass
+    return len(tokens) * orders_per_user / elapsed, commits
+
+async def compare(tokens, orders_per_user):
+    # As at app startup, so stock lookups come from memory
+    async with AsyncSessionLocal() as db:
+        await price_cache.load(db)
+    results = [await run(tokens, orders_per_user, group_commit) for group_commit in (False, True)]
+    await async_engine.dispose()
+    return results
+
+def main():
+    """Compare buy throughput with one commit per order against group commit"""
+    parser = argparse.ArgumentParser(description="Benchmark /trading/buy with and without group commit")
+    parser.add_argument("--users", type=int, default=32, help="Concurrent users placing orders")
+    parser.add_argument("--orders", type=int, default=20, help="Orders placed by each user")
+    parser.add_argument("--batch-size", type=int, default=order_writer.batch_size, help="Group commit batch size")
+    parser.add_argument("--max-wait", type=float, default=order_writer.max_wait, help="Group commit max wait in seconds")
+    args = parser.parse_args()
+
+    order_writer.batch_size = args.batch_size
+    order_writer.max_wait = args.max_wait
+    tokens = seed(args.users)
+
+    print(f"{args.users} users x {args.orders} buys, batch size {args.batch_size}, max wait {args.max_wait * 1000:.1f} ms")
+    results = asyncio.run(compare(tokens, args.orders))
+    for group_commit, (rate, commits) in zip((False, True), results):
+        label = "group commit" if group_commit else "per-order commit"
+        print(f"{label:>16}: {rate:8.1f} orders/s, {commits} commits")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import sys
+import os
+import argparse
+import asyncio
+import time
+
+# Add the parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# The login storm would otherwise be rate limited per client address
+os.environ.setdefault("ADMISSION_CONTROL", "0")
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from backend.app.main import app
+from backend.database.database import get_async_db
+from backend.models.models import Base, User
+from backend.utils.auth import get_password_hash, BCRYPT_ROUNDS, PASSWORD_HASH_CONCURRENCY
+
+PASSWORD = "password123"
+
+async def setup_database(num_users):
+    """Point the app at an in-memory database holding `num_users` users"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    TestingSession = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    hashed_password = get_password_hash(PASSWORD)
+    async with TestingSession() as db:
+        for i in range(num_users):
+            db.add(User(name=f"User {i}", email=f"user{i}@example.com", hashed_password=hashed_password, balance=0.0))
+        await db.commit()
+
+    async def override_get_db():
+        async with TestingSession() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_db
+
+async def login(client, user_index):
+    response = await client.post("/token", data={"username": f"user{user_index}@example.com", "password": PASSWORD})
+    response.raise_for_status()
+
+async def probe(client, latencies, stop):
+    """Hit a trivial endpoint while logins run to see if the loop stays responsive"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+async def run(num_logins, concurrency, num_users):
+    await setup_database(num_users)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        stop = asyncio.Event()
+
+        async def bounded_login(i):
+            async with semaphore:
+                await login(client, i % num_users)
+
+        prober = asyncio.create_task(probe(client, latencies, stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded_login(i) for i in range(num_logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+    return num_logins / elapsed, p95
+
+def main():
+    """Measure logins per second under concurrent load"""
+    parser = argparse.ArgumentParser(description="Benchmark /token throughput")
+    parser.add_argument("--logins", type=int, default=64, help="Total number of logins")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrent logins")
+    parser.add_argument("--users", type=int, default=16, help="Distinct users to log in as")
+    args = parser.parse_args()
+
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}, hash concurrency={PASSWORD_HASH_CONCURRENCY}")
+    for concurrency in args.concurrency:
+        rate, p95 = asyncio.run(run(args.logins, concurrency, args.users))
+        print(f"concurrency {concurrency:>3}: {rate:8.1f} logins/s, GET / p95 during storm {p95 * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import sys
+import os
+import asyncio
+import time
+
+# Add the parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from backend.models.models import Base, User, Stock, Holding
+from backend.schemas.schemas import PortfolioSummary
+from backend.services.portfolio import value_portfolio
+
+HOLDING_COUNTS = [1, 10, 100, 500]
+
+async def build_session(num_holdings):
+    """Create an in-memory database with one user holding `num_holdings` stocks"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    db = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)()
+
+    user = User(name="Bench User", email="bench@example.com", hashed_password="x", balance=0.0)
+    db.add(user)
+    await db.flush()
+
+    for i in range(num_holdings):
+        price = 100.0 + i
+        stock = Stock(
+            symbol=f"SYM{i}", name=f"Symbol {i}", exchange="NSE",
+            current_price=price, day_high=price, day_low=price
+        )
+        db.add(stock)
+        await db.flush()
+        db.add(Holding(user_id=user.id, stock_id=stock.id, quantity=10, average_price=price * 0.9))
+
+    user_id = user.id
+    await db.commit()
+    # Start from a cold identity map, as a fresh request would
+    db.expunge_all()
+    return engine, db, user_id
+
+async def measure(num_holdings):
+    """Return (queries, seconds) for valuing and serializing one portfolio"""
+    engine, db, user_id = await build_session(num_holdings)
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+    start = time.perf_counter()
+    summary = await value_portfolio(db, user_id)
+    PortfolioSummary.model_validate(summary, from_attributes=True)
+    elapsed = time.perf_counter() - start
+    event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+
+    await db.close()
+    await engine.dispose()
+    return len(statements), elapsed
+
+def main():
+    """Check that portfolio valuation costs a constant number of queries"""
+    results = []
+    for num_holdings in HOLDING_COUNTS:
+        queries, elapsed = asyncio.run(measure(num_holdings))
+        results.append(queries)
+        print(f"{num_holdings:>5} holdings: {queries} queries, {elapsed * 1000:.2f} ms")
+
+    if len(set(results)) != 1:
+        print("FAIL: query count grows with the number of holdings")
+        sys.exit(1)
+    print("OK: query count is constant in the number of holdings")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import sys
+import os
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+# Add the parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import contains_eager
+from sqlalchemy.pool import StaticPool
+
+from backend.models.models import Base, User, Stock, Holding, Transaction
+from backend.schemas.schemas import (
+    Stock as StockSchema,
+    Holding as HoldingSchema,
+    Transaction as TransactionSchema,
+)
+from backend.services.serialization import (
+    HOLDING_COLUMNS,
+    STOCK_COLUMNS,
+    TRANSACTION_COLUMNS,
+    serialize_holding_rows,
+    serialize_stock_rows,
+    serialize_transaction_rows,
+)
+
+ROWS = 10000
+ROUNDS = 5
+
+async def build_database():
+    """Create an in-memory database with ROWS stocks, holdings and transactions for one user"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        result = await conn.execute(
+            insert(User).values(name="Bench User", email="bench@example.com", hashed_password="x", balance=0.0)
+        )
+        user_id = result.inserted_primary_key[0]
+        await conn.execute(insert(Stock), [
+            {
+                "id": i + 1, "symbol": f"SYM{i}", "name": f"Symbol {i}", "exchange": "NSE",
+                "current_price": 100.0 + i, "day_high": 101.0 + i, "day_low": 99.0 + i,
+            }
+            for i in range(ROWS)
+        ])
+        await conn.execute(insert(Holding), [
+            {"user_id": user_id, "stock_id": i + 1, "quantity": 10, "average_price": 90.0 + i}
+            for i in range(ROWS)
+        ])
+        start = datetime(2024, 1, 1)
+        await conn.execute(insert(Transaction), [
+            {
+                "user_id": user_id, "stock_id": i + 1, "transaction_type": "BUY", "quantity": 10,
+                "price": 90.0 + i, "total_amount": 900.0 + i * 10, "timestamp": start + timedelta(seconds=i),
+            }
+            for i in range(ROWS)
+        ])
+    return engine, user_id
+
+def orm_path(schema, query):
+    """Load ORM objects, validate them through the orm_mode schema and dump with json"""
+    adapter = TypeAdapter(List[schema])
+
+    async def run(db):
+        objects = (await db.execute(query)).scalars().all()
+        items = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+        return json.dumps(items).encode()
+    return run
+
+def projected_path(serialize, query):
+    """Select only the response columns, zip rows into dicts and dump with orjson"""
+    async def run(db):
+        return orjson.dumps(serialize((await db.execute(query)).all()))
+    return run
+
+def cases(user_id):
+    return {
+        "stocks": (
+            orm_path(StockSchema, select(Stock).order_by(Stock.id)),
+            projected_path(serialize_stock_rows, select(*STOCK_COLUMNS).order_by(Stock.id)),
+        ),
+        "holdings": (
+            orm_path(
+                HoldingSchema,
+                select(Holding).join(Holding.stock).options(contains_eager(Holding.stock))
+                .where(Holding.user_id == user_id).order_by(Holding.stock_id),
+            ),
+            projected_path(
+                serialize_holding_rows,
+                select(*HOLDING_COLUMNS).join(Holding.stock)
+                .where(Holding.user_id == user_id).order_by(Holding.stock_id),
+            ),
+        ),
+        "transactions": (
+            orm_path(
+                TransactionSchema,
+                select(Transaction).join(Transaction.stock).options(contains_eager(Transaction.stock))
+                .where(Transaction.user_id == user_id).order_by(Transaction.id),
+            ),
+            projected_path(
+                serialize_transaction_rows,
+                select(*TRANSACTION_COLUMNS).join(Transaction.stock)
+                .where(Transaction.user_id == user_id).order_by(Transaction.id),
+            ),
+        ),
+    }
+
+async def best_time(session_factory, run):
+    """Best of ROUNDS, each with a fresh session as a request would have"""
+    best = None
+    body = None
+    for _ in range(ROUNDS):
+        async with session_factory() as db:
+            start = time.perf_counter()
+            body = await run(db)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+async def measure():
+    engine, user_id = await build_database()
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    ok = True
+    for name, (legacy, fast) in cases(user_id).items():
+        legacy_time, legacy_body = await best_time(session_factory, legacy)
+        fast_time, fast_body = await best_time(session_factory, fast)
+        same = json.loads(legacy_body) == json.loads(fast_body)
+        ok = ok and same
+        print(
+            f"{name:>12}: orm+pydantic {ROWS / legacy_time:>10.0f} rows/s  "
+            f"projected+orjson {ROWS / fast_time:>10.0f} rows/s  "
+            f"x{legacy_time / fast_time:.1f}  {'same output' if same else 'OUTPUT DIFFERS'}"
+        )
+    await engine.dispose()
+    return ok
+
+def main():
+    """Compare the ORM/pydantic and projected/orjson paths for large list responses"""
+    if not asyncio.run(measure()):
+        print("FAIL: the fast path produces different JSON")
+        sys.exit(1)
+    print("OK: the fast path produces the same JSON")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+import tempfile
+
+# Add the parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Runs in a fresh interpreter, as a newly started worker would
+WORKER = """
+import asyncio, json, os, sys, time
+start = time.perf_counter()
+import backend.app.main as main
+imported = time.perf_counter()
+untouched = not os.path.exists(sys.argv[1])
+app = main.create_app()
+created = time.perf_counter()
+
+async def serve():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+    return ready, time.perf_counter()
+
+ready, stopped = asyncio.run(serve())
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "lifespan_startup": ready - created,
+    "shutdown": stopped - ready,
+    "ready": ready - start,
+    "database_untouched_by_import": untouched,
+}))
+"""
+
+def run_worker(database_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database_path}", PYTHONPATH=ROOT)
+    env.pop("AUTO_MIGRATE", None)
+    output = subprocess.run(
+        [sys.executable, "-c", WORKER, database_path], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    """Measure how long a fresh worker takes to import, build and start the app"""
+    parser = argparse.ArgumentParser(description="Benchmark application startup in fresh interpreters")
+    parser.add_argument("--runs", type=int, default=5, help="Workers to start, one after another")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_path = os.path.join(tmpdir, "startup.db")
+        # Migrated once up front, as a deploy would before starting workers
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{database_path}", PYTHONPATH=ROOT)
+        subprocess.run([sys.executable, "-m", "backend.database.migrations"], env=env, check=True, capture_output=True)
+
+        # Import alone must not create or open the database
+        fresh_path = os.path.join(tmpdir, "never-created.db")
+        env["DATABASE_URL"] = f"sqlite:///{fresh_path}"
+        subprocess.run([sys.executable, "-c", "import backend.app.main"], env=env, check=True, capture_output=True)
+        import_is_clean = not os.path.exists(fresh_path)
+
+        runs = [run_worker(database_path) for _ in range(args.runs)]
+
+    for phase in ["import", "create_app", "lifespan_startup", "shutdown", "ready"]:
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:>17}: median {statistics.median(values):8.1f} ms  min {min(values):8.1f} ms  max {max(values):8.1f} ms")
+
+    if not import_is_clean:
+        print("FAIL: importing backend.app.main created the database")
+        sys.exit(1)
+    print("OK: importing the app has no database side effects")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import sys
+import os
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+# Add the parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import func, select
+
+from backend.database.bulk import backfill_ledger, backfill_portfolio_values, backfill_tax_lots, deferred_indexes, insert_chunks, loading_pragmas, rebuild_holdings
+from backend.database.database import engine
+from backend.database.migrations import upgrade_database
+from backend.models.models import User, Stock, Transaction
+from backend.utils.auth import get_password_hash
+
+EXCHANGES = ["NSE", "BSE"]
+
+def zipf_weights(n, exponent):
+    """Cumulative weights where item i is picked in proportion to 1 / (i + 1) ** exponent"""
+    return list(accumulate(1.0 / (i + 1) ** exponent for i in range(n)))
+
+def next_id(connection, column):
+    return (connection.execute(select(func.max(column))).scalar() or 0) + 1
+
+def user_rows(first_id, count, password_hash, prefix):
+    for user_id in range(first_id, first_id + count):
+        yield {
+            "id": user_id,
+            "name": f"Load User {user_id}",
+            "email": f"{prefix}{user_id}@example.com",
+            # One hash shared by every generated user; bcrypt per user
+            # would dominate the run time
+            "hashed_password": password_hash,
+            "is_active": True,
+            "balance": round(random.uniform(1e4, 1e7), 2),
+        }
+
+def stock_rows(first_id, count, prices):
+    for offset in range(count):
+        stock_id = first_id + offset
+        price = prices[offset]
+        yield {
+            "id": stock_id,
+            "symbol": f"SYN{stock_id}",
+            "name": f"Synthetic Stock {stock_id}",
+            "exchange": EXCHANGES[stock_id % len(EXCHANGES)],
+            "current_price": price,
+            "day_high": round(price * 1.02, 2),
+            "day_low": round(price * 0.98, 2),
+        }
+
+def transaction_rows(count, user_ids, stock_ids, prices, args):
+    """Random trades with zipf-skewed users and stocks"""
+    user_weights = zipf_weights(len(user_ids), args.user_skew)
+    stock_weights = zipf_weights(len(stock_ids), args.stock_skew)
+    now = datetime.utcnow()
+    span = args.days * 86400
+    batch = 10000
+    for start in range(0, count, batch):
+        size = min(batch, count - start)
+        users = random.choices(user_ids, cum_weights=user_weights, k=size)
+        stocks = random.choices(range(len(stock_ids)), cum_weights=stock_weights, k=size)
+        for user_id, stock_index in zip(users, stocks):
+            quantity = min(int(random.expovariate(1.0 / args.mean_quantity)) + 1, args.mean_quantity * 20)
+            price = round(prices[stock_index] * random.uniform(0.8, 1.2), 2)
+            yield {
+                "user_id": user_id,
+                "stock_id": stock_ids[stock_index],
+                "transaction_type": "BUY" if random.random() < args.buy_ratio else "SELL",
+                "quantity": quantity,
+                "price": price,
+                "total_amount": price * quantity,
+                "timestamp": now - timedelta(seconds=random.uniform(0, span)),
+            }
+
+def main():
+    """Generate a large synthetic dataset of users, stocks and transactions"""
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic data for load testing")
+    parser.add_argument("--users", type=int, default=1000, help="Users to create")
+    parser.add_argument("--stocks", type=int, default=500, help="Stocks to create")
+    parser.add_argument("--transactions", type=int, default=100000, help="Transactions to create")
+    parser.add_argument("--days", type=int, default=365, help="Spread transactions over this many past days")
+    parser.add_argument("--buy-ratio", type=float, default=0.7, help="Share of transactions that are buys")
+    parser.add_argument("--mean-quantity", type=int, default=20, help="Mean shares per transaction (exponential)")
+    parser.add_argument("--user-skew", type=float, default=1.0, help="Zipf exponent for user activity; 0 is uniform")
+    parser.add_argument("--stock-skew", type=float, default=1.0, help="Zipf exponent for stock popularity; 0 is uniform")
+    parser.add_argument("--min-price", type=float, default=10.0, help="Lowest stock price")
+    parser.add_argument("--max-price", type=float, default=5000.0, help="Highest stock price")
+    parser.add_argument("--password", default="password123", help="Password for every generated user")
+    parser.add_argument("--email-prefix", default="loaduser", help="Generated emails are <prefix><id>@example.com")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per executemany and commit")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible dataset")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    upgrade_database()
+    started = time.perf_counter()
+
+    def report(message):
+        print(f"[{time.perf_counter() - started:7.1f}s] {message}")
+
+    with engine.connect() as connection, loading_pragmas(connection):
+        first_user = next_id(connection, User.id)
+        first_stock = next_id(connection, Stock.id)
+        connection.commit()
+
+        password_hash = get_password_hash(args.password)
+        count = insert_chunks(
+            connection, User.__table__,
+            user_rows(first_user, args.users, password_hash, args.email_prefix), args.chunk_size
+        )
+        report(f"inserted {count} users")
+
+        # Log-uniform prices, so cheap stocks are as common as expensive ones per decade
+        prices = [
+            round(args.min_price * (args.max_price / args.min_price) ** random.random(), 2)
+            for _ in range(args.stocks)
+        ]
+        count = insert_chunks(connection, Stock.__table__, stock_rows(first_stock, args.stocks, prices), args.chunk_size)
+        report(f"inserted {count} stocks")
+
+        user_ids = list(range(first_user, first_user + args.users))
+        stock_ids = list(range(first_stock, first_stock + args.stocks))
+        with deferred_indexes(connection, Transaction.__table__):
+            count = insert_chunks(
+                connection, Transaction.__table__,
+                transaction_rows(args.transactions, user_ids, stock_ids, prices, args), args.chunk_size
+            )
+            report(f"inserted {count} transactions")
+        report("rebuilt transaction indexes")
+
+        count = rebuild_holdings(connection, range(first_user, first_user + args.users))
+        connection.commit()
+        report(f"derived {count} holdings")
+
+        count = backfill_portfolio_values(connection, range(first_user, first_user + args.users))
+        report(f"backfilled {count} daily portfolio values")
+
+        lots, realized = backfill_tax_lots(connection, range(first_user, first_user + args.users))
+        report(f"backfilled {lots} tax lots and {realized} realized P&L rows")
+
+        count = backfill_ledger(connection, range(first_user, first_user + args.users))
+        report(f"opened the ledger with {count} account snapshots")
+
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,21 @@ import sys
 import os
 import random
 from datetime import datetime, timedelta
-import sqlite3
 from passlib.context import CryptContext
 
 # Add the parent directory to path so we can import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from backend.database.bulk import backfill_ledger, rebuild_holdings
 from backend.database.database import SessionLocal, engine
-from backend.models.models import Base, User, Stock, Holding, Transaction
-from sqlalchemy.orm import Session
+from backend.database.migrations import upgrade_database
+from backend.models.models import User, Stock, Transaction
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Create the database tables
-Base.metadata.create_all(bind=engine)
+# Create or migrate the database tables
+upgrade_database()
 
 # Get a database session
 db = SessionLocal()
@@ -186,45 +186,12 @@ def create_transactions_and_holdings(user_id):
 
 def update_holdings(user_id):
     """Update holdings based on transactions"""
-    # Clear existing holdings for the user
-    db.query(Holding).filter(Holding.user_id == user_id).delete()
-    db.commit()
-    
-    # Get all user's transactions
-    transactions = db.query(Transaction).filter(Transaction.user_id == user_id).all()
-    
-    # Group transactions by stock
-    holdings_data = {}
-    for transaction in transactions:
-        stock_id = transaction.stock_id
-        
-        if stock_id not in holdings_data:
-            holdings_data[stock_id] = {
-                "quantity": 0,
-                "total_cost": 0
-            }
-        
-        if transaction.transaction_type == "BUY":
-            holdings_data[stock_id]["quantity"] += transaction.quantity
-            holdings_data[stock_id]["total_cost"] += transaction.total_amount
-        else:
-            holdings_data[stock_id]["quantity"] -= transaction.quantity
-            holdings_data[stock_id]["total_cost"] -= transaction.total_amount
-    
-    # Create holdings for stocks with positive quantities
-    for stock_id, data in holdings_data.items():
-        if data["quantity"] > 0:
-            average_price = data["total_cost"] / data["quantity"]
-            
-            holding = Holding(
-                user_id=user_id,
-                stock_id=stock_id,
-                quantity=data["quantity"],
-                average_price=average_price
-            )
-            db.add(holding)
-    
-    db.commit()
+    # One aggregate INSERT ... SELECT over the user's transactions
+    with engine.begin() as connection:
+        rebuild_holdings(connection, range(user_id, user_id + 1))
+    # The seeded balance and holdings open the user's account ledger
+    with engine.connect() as connection:
+        backfill_ledger(connection, range(user_id, user_id + 1))
 
 def main():
     """Main function to populate the database"""
@@ -0,0 +1,89 @@
+import sys
+import os
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Add the parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import func, insert, select
+
+from backend.database.bulk import reconcile_accounts, restore_accounts
+from backend.database.database import get_engine
+from backend.database.migrations import upgrade_database
+from backend.models.models import AccountSnapshot, User
+from backend.services.ledger import LEDGER_SNAPSHOT_EVERY
+
+def init_worker():
+    # Forked workers must not share the parent's pooled connections
+    get_engine().dispose(close=False)
+
+def check_chunk(first, stop, snapshot_every):
+    with get_engine().connect() as connection:
+        return first, reconcile_accounts(connection, range(first, stop), snapshot_every)
+
+def main():
+    """Reconcile every account's balance and holdings against its event log"""
+    parser = argparse.ArgumentParser(description="Verify live accounts against the account ledger in parallel")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes checking chunks at once")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="User ids per chunk")
+    parser.add_argument("--first-user", type=int, default=None, help="First user id to check (default: all users)")
+    parser.add_argument("--last-user", type=int, default=None, help="Last user id to check, inclusive")
+    parser.add_argument("--snapshot-every", type=int, default=LEDGER_SNAPSHOT_EVERY,
+                        help="Snapshot consistent accounts with at least this many new events; 0 to disable")
+    parser.add_argument("--repair", action="store_true",
+                        help="Overwrite mismatched balances and holdings with the ledger's; stop trading first")
+    parser.add_argument("--show", type=int, default=20, help="Mismatched accounts to print")
+    args = parser.parse_args()
+
+    upgrade_database()
+    engine = get_engine()
+    with engine.connect() as connection:
+        low, high = connection.execute(select(func.min(User.id), func.max(User.id))).one()
+    if low is None:
+        print("No accounts to verify")
+        return
+    first = max(low, args.first_user if args.first_user is not None else low)
+    last = min(high, args.last_user if args.last_user is not None else high)
+
+    started = time.perf_counter()
+    checked = 0
+    mismatched = []
+    changed = []
+    snapshots = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        futures = [
+            pool.submit(check_chunk, start, min(start + args.chunk_size, last + 1), args.snapshot_every)
+            for start in range(first, last + 1, args.chunk_size)
+        ]
+        for future in as_completed(futures):
+            _, (chunk_checked, chunk_mismatched, chunk_changed, chunk_snapshots) = future.result()
+            checked += chunk_checked
+            mismatched.extend(chunk_mismatched)
+            changed.extend(chunk_changed)
+            snapshots.extend(chunk_snapshots)
+    mismatched.sort(key=lambda mismatch: mismatch[0])
+
+    with engine.connect() as connection:
+        for start in range(0, len(snapshots), 1000):
+            connection.execute(insert(AccountSnapshot), snapshots[start:start + 1000])
+        if args.repair:
+            restore_accounts(connection, {user_id: state for user_id, _, state in mismatched})
+        connection.commit()
+    engine.dispose()
+
+    print(f"Checked {checked} accounts in {time.perf_counter() - started:.1f}s with {args.workers} workers")
+    print(f"Wrote {len(snapshots)} snapshots; skipped {len(changed)} accounts that traded during the check")
+    for user_id, details, _ in mismatched[:args.show]:
+        print(f"  user {user_id}: {'; '.join(details)}")
+    if mismatched:
+        action = "repaired" if args.repair else "found"
+        print(f"{len(mismatched)} accounts do not match their ledger ({action})")
+        if not args.repair:
+            sys.exit(1)
+    else:
+        print("All accounts match their ledger")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Services package initialization file
\ No newline at end of file
@@ -0,0 +1,306 @@
+import asyncio
+import math
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+
+from backend.utils.auth import ALGORITHM, SECRET_KEY
+
+# Admission control is on unless ADMISSION_CONTROL=0. Limits are written
+# "<count>/<s|m|h>[:<burst>]"; the burst defaults to the count.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1") == "1"
+# Every request from one client address
+RATE_LIMIT_IP = os.getenv("RATE_LIMIT_IP", "200/s:400")
+# Each user (or, unauthenticated, each address) on routes without a budget
+# of their own
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "50/s:100")
+# Per-route budgets, replacing the default for those routes. RATE_LIMITS
+# adds to or overrides them: "POST /token=5/m, GET /trading/pnl=2/s:5".
+ROUTE_RATE_LIMITS = {
+    # bcrypt-bound
+    "POST /token": "10/m",
+    "POST /register": "5/m",
+    # Whole-portfolio reads and exports
+    "GET /trading/portfolio": "10/s:20",
+    "GET /trading/portfolio/history": "5/s:10",
+    "GET /trading/pnl": "5/s:10",
+    "GET /trading/transactions/export": "6/m:3",
+    "GET /trading/stocks/{stock_id}/candles": "20/s:40",
+}
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+# Buckets (and bearer token subjects) remembered; the least recently used
+# are dropped first and start over full
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Requests served at once per process; 0 turns the limit off. Beyond it
+# up to ADMISSION_MAX_QUEUE requests wait, each at most
+# ADMISSION_QUEUE_TIMEOUT seconds, before being shed with a 503.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "0.5"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Never limited, so monitoring keeps working under load
+EXEMPT_PATHS = {"/metrics"}
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600}
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate: float  # Tokens added per second
+    burst: int  # Bucket size
+
+
+def parse_limit(spec: str) -> RateLimit:
+    """Parse "<count>/<s|m|h>[:<burst>]", e.g. "10/m" or "5/s:20"."""
+    count, _, rest = spec.strip().partition("/")
+    period, _, burst = rest.partition(":")
+    if period not in _PERIODS or float(count) <= 0:
+        raise ValueError(f"Invalid rate limit {spec!r}")
+    return RateLimit(rate=float(count) / _PERIODS[period], burst=int(burst) if burst else max(1, int(float(count))))
+
+
+def parse_route_limits(text: str) -> Dict[str, str]:
+    """Parse "METHOD /path=limit, ..." into {"METHOD /path": limit}."""
+    limits = {}
+    for entry in text.split(","):
+        if entry.strip():
+            route, _, spec = entry.partition("=")
+            limits[" ".join(route.split())] = spec.strip()
+    return limits
+
+
+class RouteLimits:
+    """Budgets by "METHOD /path" route, with {param} segments matching any value."""
+
+    def __init__(self, limits: Dict[str, str], default: RateLimit):
+        self.default = default
+        self._exact: Dict[Tuple[str, str], Tuple[str, RateLimit]] = {}
+        self._templates: List[Tuple[str, "re.Pattern", str, RateLimit]] = []
+        for route, spec in limits.items():
+            method, path = route.split(" ", 1)
+            limit = parse_limit(spec)
+            if "{" in path:
+                pattern = re.compile("^" + re.sub(r"\\{[^/]+\\}", "[^/]+", re.escape(path)) + "$")
+                self._templates.append((method, pattern, route, limit))
+            else:
+                self._exact[(method, path)] = (route, limit)
+
+    def match(self, method: str, path: str) -> Tuple[str, RateLimit]:
+        """(budget name, limit) for a request; unlisted routes share the default."""
+        found = self._exact.get((method, path))
+        if found is not None:
+            return found
+        for template_method, pattern, route, limit in self._templates:
+            if template_method == method and pattern.match(path):
+                return route, limit
+        return "default", self.default
+
+
+class RateLimiter:
+    """Token buckets keyed by anything hashable, in an LRU-bounded dict.
+
+    A bucket is its token count and when that was last updated; tokens
+    are topped up lazily from the elapsed time whenever the bucket is
+    looked at, so every check is O(1) and idle buckets cost nothing.
+    Everything runs on the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[object, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _level(self, key, limit: RateLimit, now: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return float(limit.burst)
+        tokens, updated = bucket
+        return min(float(limit.burst), tokens + (now - updated) * limit.rate)
+
+    def acquire(self, checks: List[Tuple[object, RateLimit]], now: Optional[float] = None) -> float:
+        """Take a token from every (key, limit) bucket, or from none.
+
+        Returns 0 when admitted, otherwise the seconds until every bucket
+        would have a token again.
+        """
+        now = time.monotonic() if now is None else now
+        levels = [self._level(key, limit, now) for key, limit in checks]
+        wait = max(
+            ((1 - level) / limit.rate for level, (_, limit) in zip(levels, checks) if level < 1), default=0.0
+        )
+        if wait:
+            return wait
+        for (key, _), level in zip(checks, levels):
+            self._buckets[key] = (level - 1, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0
+
+
+class ConcurrencyLimiter:
+    """Caps requests in flight, with a short bounded FIFO queue in front.
+
+    A request that finds every slot taken waits its turn, unless the queue
+    is already full or the wait runs past `timeout`; either way it is
+    turned away at once instead of adding to everyone's queueing delay.
+    A finishing request hands its slot straight to the oldest waiter.
+    """
+
+    def __init__(self, limit: int, max_queue: int = ADMISSION_MAX_QUEUE, timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        # Futures of queued requests; ones that gave up are skipped lazily
+        self._waiters = deque()
+
+    async def acquire(self) -> bool:
+        if self.in_flight < self.limit and not self.waiting:
+            self.in_flight += 1
+            return True
+        if self.waiting >= self.max_queue:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as we were cancelled
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that rate limits, then caps concurrency.
+
+    Every request takes a token from its client address's bucket and from
+    its route budget's bucket for the user, or for the address when the
+    request carries no valid bearer token. Requests over a limit get a 429
+    and those shed by the concurrency limiter a 503, both with
+    Retry-After. A concurrency slot is held until the response headers
+    are sent, not for the whole of a streamed body. State is per process. The client address is the
+    connection's peer; run uvicorn with --proxy-headers behind a proxy.
+    """
+
+    def __init__(
+        self,
+        app,
+        ip_limit: str = RATE_LIMIT_IP,
+        default_limit: str = RATE_LIMIT_DEFAULT,
+        route_limits: Optional[Dict[str, str]] = None,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+    ):
+        self.app = app
+        self.ip_limit = parse_limit(ip_limit)
+        if route_limits is None:
+            route_limits = {**ROUTE_RATE_LIMITS, **parse_route_limits(RATE_LIMITS)}
+        self.routes = RouteLimits(route_limits, parse_limit(default_limit))
+        self.limiter = RateLimiter()
+        self.concurrency = ConcurrencyLimiter(max_concurrency) if max_concurrency > 0 else None
+        # Bearer token -> (subject, expiry), so each token is decoded once
+        self._subjects: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def _subject(self, scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                break
+        else:
+            return None
+        if scheme.lower() != "bearer" or not token:
+            return None
+
+        cached = self._subjects.get(token)
+        if cached is None:
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except JWTError:
+                return None
+            if payload.get("sub") is None:
+                return None
+            cached = self._subjects[token] = (payload["sub"], float(payload.get("exp", math.inf)))
+            if len(self._subjects) > RATE_LIMIT_MAX_KEYS:
+                self._subjects.popitem(last=False)
+        else:
+            self._subjects.move_to_end(token)
+        subject, expires_at = cached
+        if expires_at <= time.time():
+            del self._subjects[token]
+            return None
+        return subject
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        address = client[0] if client else "unknown"
+        subject = self._subject(scope)
+        budget, limit = self.routes.match(scope["method"], scope["path"])
+        caller = ("user", subject) if subject is not None else ("ip", address)
+        wait = self.limiter.acquire([(("ip", address), self.ip_limit), ((budget,) + caller, limit)])
+        if wait:
+            response = JSONResponse(
+                {"detail": "Rate limit exceeded"}, status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        if self.concurrency is None:
+            await self.app(scope, receive, send)
+            return
+        if not await self.concurrency.acquire():
+            response = JSONResponse(
+                {"detail": "Server is busy, retry shortly"}, status_code=503,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+
+        # The slot bounds requests still working out their response. It is
+        # given back once the headers go out, so SSE streams and streamed
+        # exports don't hold it for as long as the client stays connected.
+        held = True
+
+        async def send_releasing(message):
+            nonlocal held
+            if held and message["type"] == "http.response.start":
+                held = False
+                self.concurrency.release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_releasing)
+        finally:
+            if held:
+                self.concurrency.release()
@@ -0,0 +1,175 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    import numpy
+except ImportError:  # optional; a pure Python loop produces the same candles
+    numpy = None
+
+from backend.models.models import PriceTick
+from backend.services.prices import PriceCache, price_cache
+
+# Bucket widths in seconds, by the name used in ?interval=
+CANDLE_INTERVALS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+CANDLE_MAX_LIMIT = int(os.getenv("CANDLE_MAX_LIMIT", "1000"))
+# Finished candles kept in memory per stock and interval
+CANDLE_CACHE_SIZE = int(os.getenv("CANDLE_CACHE_SIZE", "1000"))
+
+EPOCH = datetime(1970, 1, 1)
+
+# (bucket start, open, high, low, close, volume), bucket start in epoch seconds
+CandleRow = Tuple[float, float, float, float, float, int]
+
+
+def _seconds(timestamp: datetime) -> float:
+    # Timestamps are naive UTC throughout
+    return (timestamp - EPOCH).total_seconds()
+
+
+def _resample_numpy(times, prices, volumes, interval: int) -> List[CandleRow]:
+    times = numpy.asarray(times, dtype=numpy.float64)
+    prices = numpy.asarray(prices, dtype=numpy.float64)
+    volumes = numpy.asarray(volumes, dtype=numpy.int64)
+    buckets = numpy.floor_divide(times, interval) * interval
+    # Ticks are in time order, so each bucket is one contiguous run
+    starts = numpy.flatnonzero(numpy.r_[True, buckets[1:] != buckets[:-1]])
+    ends = numpy.r_[starts[1:], len(times)] - 1
+    return list(zip(
+        buckets[starts].tolist(),
+        prices[starts].tolist(),
+        numpy.maximum.reduceat(prices, starts).tolist(),
+        numpy.minimum.reduceat(prices, starts).tolist(),
+        prices[ends].tolist(),
+        numpy.add.reduceat(volumes, starts).tolist(),
+    ))
+
+
+def _resample_python(times, prices, volumes, interval: int) -> List[CandleRow]:
+    candles = []
+    current = None
+    for time, price, volume in zip(times, prices, volumes):
+        bucket = time // interval * interval
+        if current is None or bucket != current[0]:
+            if current is not None:
+                candles.append(tuple(current))
+            current = [bucket, price, price, price, price, volume]
+        else:
+            current[2] = max(current[2], price)
+            current[3] = min(current[3], price)
+            current[4] = price
+            current[5] += volume
+    if current is not None:
+        candles.append(tuple(current))
+    return candles
+
+
+def resample(times, prices, volumes, interval: int) -> List[CandleRow]:
+    """OHLCV candles for time-ordered ticks; empty buckets are skipped."""
+    if not times:
+        return []
+    if numpy is not None:
+        return _resample_numpy(times, prices, volumes, interval)
+    return _resample_python(times, prices, volumes, interval)
+
+
+def candle_dict(candle: CandleRow) -> dict:
+    start, open_, high, low, close, volume = candle
+    return {
+        "time": EPOCH + timedelta(seconds=start),
+        "open": open_,
+        "high": high,
+        "low": low,
+        "close": close,
+        "volume": int(volume),
+    }
+
+
+@dataclass(frozen=True)
+class _Series:
+    # Finished candles are complete for buckets in [covered_from, through)
+    covered_from: float
+    through: float
+    finished: Tuple[CandleRow, ...]
+
+
+class CandleStore:
+    """Candles resampled from price_ticks, with finished buckets cached.
+
+    A bucket is finished once it has ended and every tick in it has been
+    flushed to the database. Finished candles are kept per stock and
+    interval, so a request only reads and resamples the ticks since the
+    last finished bucket; the still-open bucket is recomputed each time,
+    including ticks the price cache hasn't flushed yet. Like the price
+    cache this is per process and assumes ticks arrive through it.
+    """
+
+    def __init__(self, cache: PriceCache):
+        self.cache = cache
+        self._series: Dict[Tuple[int, int], _Series] = {}
+
+    async def candles(self, db: AsyncSession, stock_id: int, interval_name: str, limit: int) -> List[dict]:
+        interval = CANDLE_INTERVALS[interval_name]
+        now = _seconds(datetime.utcnow())
+        open_bucket = now // interval * interval
+        start = open_bucket - interval * (limit - 1)
+
+        # Taken before querying, so ticks before the cutoff are all in the
+        # table and ticks after it are all pending, even if a flush runs
+        # while we wait on the query
+        cutoff = self.cache.flushed_through
+        pending = self.cache.pending_ticks(stock_id)
+        cutoff_seconds = _seconds(cutoff)
+        finished_through = min(open_bucket, cutoff_seconds // interval * interval)
+
+        key = (stock_id, interval)
+        series = self._series.get(key)
+        # Start over when the cache doesn't reach back far enough, or is so
+        # stale that catching up would read more than the requested range
+        if series is None or series.covered_from > start or series.through < start:
+            series = _Series(covered_from=start, through=start, finished=())
+
+        times, prices, volumes = [], [], []
+        rows = await db.execute(
+            select(PriceTick.timestamp, PriceTick.price, PriceTick.volume)
+            .where(
+                PriceTick.stock_id == stock_id,
+                PriceTick.timestamp >= EPOCH + timedelta(seconds=series.through),
+                PriceTick.timestamp < cutoff,
+            )
+            .order_by(PriceTick.timestamp, PriceTick.id)
+        )
+        for timestamp, price, volume in rows:
+            times.append(_seconds(timestamp))
+            prices.append(price)
+            volumes.append(volume)
+        for _, timestamp, price, volume in pending:
+            times.append(_seconds(timestamp))
+            prices.append(price)
+            volumes.append(volume)
+
+        fresh = resample(times, prices, volumes, interval)
+        newly_finished = tuple(candle for candle in fresh if candle[0] < finished_through)
+        open_candles = [candle for candle in fresh if candle[0] >= finished_through]
+
+        if finished_through > series.through:
+            finished = series.finished + newly_finished
+            covered_from = series.covered_from
+            if len(finished) > CANDLE_CACHE_SIZE:
+                finished = finished[-CANDLE_CACHE_SIZE:]
+                covered_from = finished[0][0]
+            series = _Series(covered_from=covered_from, through=finished_through, finished=finished)
+            current = self._series.get(key)
+            # Concurrent requests may race; keep whichever reached further
+            if current is None or current.through <= series.through:
+                self._series[key] = series
+
+        candles = [candle for candle in series.finished if candle[0] >= start] + open_candles
+        return [candle_dict(candle) for candle in candles[-limit:]]
+
+
+candle_store = CandleStore(price_cache)
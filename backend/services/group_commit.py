@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm.attributes import set_committed_value
+
+from backend.models.models import Transaction
+from backend.services.orders import OrderError
+
+# Opt-in: with GROUP_COMMIT=1, buys and sells are queued and written by one
+# task that commits up to GROUP_COMMIT_BATCH_SIZE orders at a time, waiting
+# at most GROUP_COMMIT_MAX_WAIT seconds for a batch to fill
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_BATCH_SIZE = int(os.getenv("GROUP_COMMIT_BATCH_SIZE", "64"))
+GROUP_COMMIT_MAX_WAIT = float(os.getenv("GROUP_COMMIT_MAX_WAIT", "0.005"))
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitWriter:
+    """Single writer that applies queued order mutations in shared commits.
+
+    Each queued item is an operation such as ``apply_buy`` with its
+    arguments. The writer runs a batch of them in one session, commits
+    once and resolves every caller's future with its persisted
+    Transaction. An OrderError only fails its own item, because the order
+    operations leave nothing behind when they reject; any other error
+    rolls back and fails the whole batch.
+    """
+
+    def __init__(self, batch_size: int = GROUP_COMMIT_BATCH_SIZE, max_wait: float = GROUP_COMMIT_MAX_WAIT):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.orders = 0
+        # Created by run so it belongs to the running event loop
+        self._queue: Optional[asyncio.Queue] = None
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    async def submit(self, operation, *args, **kwargs) -> Transaction:
+        """Queue `operation(db, *args, **kwargs)` and wait until it is committed."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((operation, args, kwargs, future))
+        return await future
+
+    async def _fill(self, batch):
+        # Items are appended in place so a cancelled wait loses none of them
+        batch.append(await self._queue.get())
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _write(self, session_factory, batch):
+        done = []
+        try:
+            async with session_factory() as db:
+                for operation, args, kwargs, future in batch:
+                    try:
+                        done.append((await operation(db, *args, **kwargs), future))
+                    except OrderError as e:
+                        if not future.done():
+                            future.set_exception(e)
+                await db.commit()
+
+                # Timestamps are set by the database; read them back in one query
+                if done:
+                    ids = [transaction.id for transaction, _ in done]
+                    result = await db.execute(select(Transaction.id, Transaction.timestamp).where(Transaction.id.in_(ids)))
+                    timestamps = dict(result.all())
+                    for transaction, _ in done:
+                        set_committed_value(transaction, "timestamp", timestamps[transaction.id])
+        except Exception as e:
+            logger.exception("Error writing a batch of %d orders", len(batch))
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.orders += len(done)
+        for transaction, future in done:
+            if not future.done():
+                future.set_result(transaction)
+
+    async def run(self, session_factory):
+        """Write queued orders until cancelled, then drain the queue."""
+        self._queue = asyncio.Queue()
+        batch = []
+        writing = None
+        try:
+            while True:
+                await self._fill(batch)
+                # Shielded so cancelling the writer never abandons a batch
+                # halfway through its commit
+                writing = asyncio.ensure_future(self._write(session_factory, batch))
+                batch = []
+                await asyncio.shield(writing)
+        finally:
+            if writing is not None:
+                await writing
+            queue, self._queue = self._queue, None
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            for start in range(0, len(batch), self.batch_size):
+                await self._write(session_factory, batch[start:start + self.batch_size])
+
+
+order_writer = GroupCommitWriter()
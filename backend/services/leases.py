@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.models import Lease
+
+# How long a lease lasts without renewal; holders renew three times as often
+LEASE_TTL = float(os.getenv("LEASE_TTL", "15"))
+
+logger = logging.getLogger(__name__)
+
+class LeaseHolder:
+    """Holds a named role in the leases table for this process.
+
+    At most one process holds a name at a time. The holder renews its row
+    before it expires; once it stops, any process may take the role over
+    after `ttl` seconds. `held` goes false when a renewal is late, before
+    the row itself expires, so two processes never both believe they hold
+    the lease.
+    """
+
+    def __init__(self, name: str, ttl: float = LEASE_TTL):
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Monotonic time the lease is good until
+        self._deadline: Optional[float] = None
+
+    @property
+    def held(self) -> bool:
+        return self._deadline is not None and time.monotonic() < self._deadline
+
+    async def acquire(self, db: AsyncSession) -> bool:
+        """Take or renew the lease and commit; returns whether it is held."""
+        started = time.monotonic()
+        now = datetime.utcnow()
+        values = {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}
+        was_held = self.held
+        try:
+            result = await db.execute(
+                update(Lease)
+                .where(Lease.name == self.name, or_(Lease.owner == self.owner, Lease.expires_at < now))
+                .values(**values)
+            )
+            if not result.rowcount:
+                await db.execute(insert(Lease).values(name=self.name, **values))
+            await db.commit()
+        except IntegrityError:
+            # Another process holds it
+            await db.rollback()
+            self._deadline = None
+        else:
+            self._deadline = started + self.ttl
+        if self.held != was_held:
+            logger.info("%s lease %s by %s", self.name, "acquired" if self.held else "lost", self.owner)
+        return self.held
+
+    async def release(self, db: AsyncSession):
+        await db.execute(delete(Lease).where(Lease.name == self.name, Lease.owner == self.owner))
+        await db.commit()
+        self._deadline = None
+
+    async def run(self, session_factory, interval: Optional[float] = None):
+        """Keep trying to take or renew the lease until cancelled, then give it up."""
+        interval = interval or self.ttl / 3
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    async with session_factory() as db:
+                        await self.acquire(db)
+                except Exception:
+                    logger.exception("Error renewing %s lease", self.name)
+        finally:
+            if self.held:
+                async with session_factory() as db:
+                    await self.release(db)
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import math
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.models import AccountEvent, AccountSnapshot, Holding, User
+
+# A user gets a new snapshot once this many events follow their last one;
+# the snapshotter looks for such users every LEDGER_SNAPSHOT_INTERVAL seconds
+LEDGER_SNAPSHOT_EVERY = int(os.getenv("LEDGER_SNAPSHOT_EVERY", "100"))
+LEDGER_SNAPSHOT_INTERVAL = float(os.getenv("LEDGER_SNAPSHOT_INTERVAL", "30"))
+# Times an audit re-reads an account that changed while it was being read
+LEDGER_AUDIT_ATTEMPTS = int(os.getenv("LEDGER_AUDIT_ATTEMPTS", "3"))
+
+DEPOSIT = "DEPOSIT"
+BUY = "BUY"
+SELL = "SELL"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AccountState:
+    """A balance and holdings rebuilt from the event log."""
+
+    balance: float = 0.0
+    # stock_id -> (quantity, average_price)
+    holdings: Dict[int, Tuple[int, float]] = field(default_factory=dict)
+    # Last event folded in
+    event_id: int = 0
+
+    @classmethod
+    def from_snapshot(cls, event_id: int, balance: float, holdings: dict) -> "AccountState":
+        return cls(
+            balance=balance,
+            holdings={int(stock_id): (quantity, price) for stock_id, (quantity, price) in holdings.items()},
+            event_id=event_id,
+        )
+
+    def snapshot_holdings(self) -> dict:
+        return {str(stock_id): [quantity, price] for stock_id, (quantity, price) in self.holdings.items()}
+
+    def apply(self, event_id: int, kind: str, stock_id: Optional[int], quantity: int, price: float, amount: float):
+        # Same arithmetic as apply_buy/apply_sell, so a replay lands on the
+        # exact floats the live tables hold
+        self.balance += amount
+        if kind == BUY:
+            held, average_price = self.holdings.get(stock_id, (0, 0.0))
+            if held:
+                average_price = (average_price * held - amount) / (held + quantity)
+            else:
+                average_price = price
+            self.holdings[stock_id] = (held + quantity, average_price)
+        elif kind == SELL:
+            held, average_price = self.holdings.get(stock_id, (0, 0.0))
+            if held - quantity:
+                self.holdings[stock_id] = (held - quantity, average_price)
+            else:
+                self.holdings.pop(stock_id, None)
+        self.event_id = event_id
+
+
+def account_mismatches(state: AccountState, balance: Optional[float], holdings: Dict[int, Tuple[int, float]]) -> List[str]:
+    """Differences between live balance and holdings and a rebuilt state."""
+    mismatches = []
+    balance = balance or 0.0
+    if not math.isclose(balance, state.balance, rel_tol=1e-9, abs_tol=1e-6):
+        mismatches.append(f"balance {balance} != ledger {state.balance}")
+    for stock_id in sorted(holdings.keys() | state.holdings.keys()):
+        quantity, price = holdings.get(stock_id, (0, 0.0))
+        ledger_quantity, ledger_price = state.holdings.get(stock_id, (0, 0.0))
+        if quantity != ledger_quantity or not math.isclose(price, ledger_price, rel_tol=1e-9, abs_tol=1e-6):
+            mismatches.append(
+                f"stock {stock_id}: holding {quantity} @ {price} != ledger {ledger_quantity} @ {ledger_price}"
+            )
+    return mismatches
+
+
+async def record_event(
+    db: AsyncSession,
+    user_id: int,
+    kind: str,
+    amount: float,
+    stock_id: Optional[int] = None,
+    quantity: int = 0,
+    price: float = 0.0,
+):
+    """Append an event to the user's log. Nothing is committed.
+
+    Callers change the balance or holding first, in the same transaction,
+    so the user's row lock orders their events.
+    """
+    await db.execute(insert(AccountEvent).values(
+        user_id=user_id, kind=kind, stock_id=stock_id, quantity=quantity, price=price, amount=amount
+    ))
+
+
+async def record_events(db: AsyncSession, events: List[dict]):
+    """Append many events, in order, in one executemany. Nothing is committed.
+
+    Each event has the keyword arguments of record_event.
+    """
+    await db.execute(insert(AccountEvent), events)
+
+
+async def last_event_id(db: AsyncSession, user_id: int) -> int:
+    return (await db.execute(
+        select(func.max(AccountEvent.id)).where(AccountEvent.user_id == user_id)
+    )).scalar() or 0
+
+
+async def load_account(db: AsyncSession, user_id: int, through: Optional[int] = None) -> Tuple[AccountState, int]:
+    """Rebuild a user's state from their latest snapshot and the events after it.
+
+    With `through`, events after that id are left out. Returns the state
+    and how many events were replayed.
+    """
+    snapshot = select(AccountSnapshot.event_id, AccountSnapshot.balance, AccountSnapshot.holdings).where(
+        AccountSnapshot.user_id == user_id
+    )
+    events = select(
+        AccountEvent.id, AccountEvent.kind, AccountEvent.stock_id,
+        AccountEvent.quantity, AccountEvent.price, AccountEvent.amount,
+    ).where(AccountEvent.user_id == user_id)
+    if through is not None:
+        snapshot = snapshot.where(AccountSnapshot.event_id <= through)
+        events = events.where(AccountEvent.id <= through)
+
+    row = (await db.execute(snapshot.order_by(AccountSnapshot.event_id.desc()).limit(1))).first()
+    state = AccountState.from_snapshot(*row) if row else AccountState()
+    replayed = 0
+    for event in await db.execute(events.where(AccountEvent.id > state.event_id).order_by(AccountEvent.id)):
+        state.apply(*event)
+        replayed += 1
+    return state, replayed
+
+
+async def load_live_account(db: AsyncSession, user_id: int) -> Tuple[Optional[float], Dict[int, Tuple[int, float]]]:
+    balance = (await db.execute(select(User.balance).where(User.id == user_id))).scalar()
+    rows = await db.execute(
+        select(Holding.stock_id, Holding.quantity, Holding.average_price).where(Holding.user_id == user_id)
+    )
+    return balance, {stock_id: (quantity, price) for stock_id, quantity, price in rows}
+
+
+async def audit_account(db: AsyncSession, user_id: int) -> dict:
+    """Compare a user's live balance and holdings with their rebuilt ledger.
+
+    The live tables are read between two looks at the user's last event;
+    if a trade lands in between, the account is read again.
+    """
+    for _ in range(LEDGER_AUDIT_ATTEMPTS):
+        through = await last_event_id(db, user_id)
+        balance, holdings = await load_live_account(db, user_id)
+        if await last_event_id(db, user_id) == through:
+            break
+
+    state, replayed = await load_account(db, user_id, through=through)
+    mismatches = account_mismatches(state, balance, holdings)
+    return {
+        "event_id": through,
+        "events_replayed": replayed,
+        "balance": balance or 0.0,
+        "ledger_balance": state.balance,
+        "mismatches": mismatches,
+        "consistent": not mismatches,
+    }
+
+
+async def take_snapshot(db: AsyncSession, user_id: int) -> AccountState:
+    """Store the user's rebuilt state if any events followed their last snapshot. Nothing is committed."""
+    state, replayed = await load_account(db, user_id)
+    if replayed:
+        await db.execute(insert(AccountSnapshot).values(
+            user_id=user_id, event_id=state.event_id, balance=state.balance, holdings=state.snapshot_holdings()
+        ))
+    return state
+
+
+class LedgerSnapshotter:
+    """Takes a new snapshot for users whose log has grown since their last.
+
+    New events are counted per user from a high-water mark on the event
+    ids, so each round reads only what was appended since the previous
+    one. Counts start from the newest snapshot at startup, which at worst
+    snapshots a user a little early. Every process runs its own; two
+    snapshots of the same state are harmless.
+    """
+
+    def __init__(self, every: int = LEDGER_SNAPSHOT_EVERY):
+        self.every = every
+        self._seen: Optional[int] = None
+        self._counts = Counter()
+
+    async def run_once(self, db: AsyncSession) -> int:
+        if self._seen is None:
+            self._seen = (await db.execute(select(func.max(AccountSnapshot.event_id)))).scalar() or 0
+        rows = await db.execute(
+            select(AccountEvent.user_id, func.count(), func.max(AccountEvent.id))
+            .where(AccountEvent.id > self._seen)
+            .group_by(AccountEvent.user_id)
+        )
+        for user_id, count, newest in rows:
+            self._counts[user_id] += count
+            self._seen = max(self._seen, newest)
+
+        due = sorted(user_id for user_id, count in self._counts.items() if count >= self.every)
+        for user_id in due:
+            await take_snapshot(db, user_id)
+        await db.commit()
+        for user_id in due:
+            del self._counts[user_id]
+        return len(due)
+
+    async def run(self, session_factory, interval: float = LEDGER_SNAPSHOT_INTERVAL):
+        """Snapshot busy accounts every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_factory() as db:
+                    await self.run_once(db)
+            except Exception:
+                logger.exception("Error taking account snapshots")
+
+
+ledger_snapshotter = LedgerSnapshotter()
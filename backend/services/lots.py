@@ -0,0 +1,186 @@
+from typing import Dict, List, Tuple
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.models import RealizedPnl, TaxLot
+from backend.services.prices import price_cache
+
+# Matches the partial index on open lots; SQLite only uses that index when
+# the query repeats its WHERE clause
+OPEN_LOT = TaxLot.remaining > 0
+
+
+async def open_lot(db: AsyncSession, user_id: int, stock_id: int, quantity: int, price: float):
+    """Record a buy as a new lot. Nothing is committed."""
+    await db.execute(insert(TaxLot).values(
+        user_id=user_id, stock_id=stock_id, quantity=quantity, remaining=quantity, price=price
+    ))
+
+
+async def close_lots(db: AsyncSession, user_id: int, stock_id: int, quantity: int, price: float) -> float:
+    """Consume `quantity` shares from the oldest open lots and book the gain.
+
+    Returns the realized P&L of this sale. Shares not covered by any lot
+    (bought before lots were recorded and never backfilled) realize
+    nothing. Nothing is committed.
+    """
+    lots = (await db.execute(
+        select(TaxLot.id, TaxLot.remaining, TaxLot.price)
+        .where(TaxLot.user_id == user_id, TaxLot.stock_id == stock_id, OPEN_LOT)
+        .order_by(TaxLot.id)
+    )).all()
+
+    realized = 0.0
+    left = quantity
+    changes = []
+    for lot_id, remaining, cost in lots:
+        if not left:
+            break
+        used = min(remaining, left)
+        realized += used * (price - cost)
+        left -= used
+        changes.append({"id": lot_id, "remaining": remaining - used})
+    if changes:
+        await db.execute(update(TaxLot), changes)
+
+    result = await db.execute(
+        update(RealizedPnl)
+        .where(RealizedPnl.user_id == user_id, RealizedPnl.stock_id == stock_id)
+        .values(quantity_sold=RealizedPnl.quantity_sold + quantity, realized=RealizedPnl.realized + realized)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.execute(insert(RealizedPnl).values(
+            user_id=user_id, stock_id=stock_id, quantity_sold=quantity, realized=realized
+        ))
+    return realized
+
+
+async def book_lots(db: AsyncSession, user_id: int, trades: List[Tuple[str, int, int, float]]):
+    """Open and close lots for a run of one user's trades, in order.
+
+    `trades` are (transaction_type, stock_id, quantity, price). Gives the
+    same lots and realized P&L as open_lot/close_lots trade by trade, but
+    the open lots and realized totals of the sold stocks are read in one
+    query each and every change goes out in one executemany per kind of
+    write. Nothing is committed.
+    """
+    sold = {stock_id for kind, stock_id, _, _ in trades if kind == "SELL"}
+    # stock_id -> [lot id (None for new lots), quantity, remaining, price] in FIFO order
+    lots: Dict[int, List[list]] = {stock_id: [] for _, stock_id, _, _ in trades}
+    loaded = {}
+    realized_ids = {}
+    if sold:
+        rows = await db.execute(
+            select(TaxLot.id, TaxLot.stock_id, TaxLot.quantity, TaxLot.remaining, TaxLot.price)
+            .where(TaxLot.user_id == user_id, TaxLot.stock_id.in_(sold), OPEN_LOT)
+            .order_by(TaxLot.id)
+        )
+        for lot_id, stock_id, quantity, remaining, price in rows:
+            lots[stock_id].append([lot_id, quantity, remaining, price])
+            loaded[lot_id] = remaining
+        realized_ids = dict((await db.execute(
+            select(RealizedPnl.stock_id, RealizedPnl.id)
+            .where(RealizedPnl.user_id == user_id, RealizedPnl.stock_id.in_(sold))
+        )).all())
+
+    realized: Dict[int, List[float]] = {}
+    for kind, stock_id, quantity, price in trades:
+        if kind == "BUY":
+            lots[stock_id].append([None, quantity, quantity, price])
+            continue
+        # Shares not covered by any lot realize nothing, as in close_lots
+        gain = 0.0
+        left = quantity
+        for lot in lots[stock_id]:
+            if not left:
+                break
+            used = min(lot[2], left)
+            gain += used * (price - lot[3])
+            left -= used
+            lot[2] -= used
+        totals = realized.setdefault(stock_id, [0, 0.0])
+        totals[0] += quantity
+        totals[1] += gain
+
+    new_lots = []
+    changes = []
+    for stock_id, stock_lots in lots.items():
+        for lot_id, quantity, remaining, price in stock_lots:
+            if lot_id is None:
+                new_lots.append({
+                    "user_id": user_id, "stock_id": stock_id, "quantity": quantity, "remaining": remaining, "price": price
+                })
+            elif remaining != loaded[lot_id]:
+                changes.append({"id": lot_id, "remaining": remaining})
+    if new_lots:
+        await db.execute(insert(TaxLot), new_lots)
+    if changes:
+        await db.execute(update(TaxLot), changes)
+
+    increments = [
+        {"b_id": realized_ids[stock_id], "b_quantity": quantity, "b_realized": gain}
+        for stock_id, (quantity, gain) in realized.items() if stock_id in realized_ids
+    ]
+    if increments:
+        table = RealizedPnl.__table__
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                quantity_sold=table.c.quantity_sold + bindparam("b_quantity"),
+                realized=table.c.realized + bindparam("b_realized"),
+            ),
+            increments
+        )
+    new_totals = [
+        {"user_id": user_id, "stock_id": stock_id, "quantity_sold": quantity, "realized": gain}
+        for stock_id, (quantity, gain) in realized.items() if stock_id not in realized_ids
+    ]
+    if new_totals:
+        await db.execute(insert(RealizedPnl), new_totals)
+
+
+async def load_pnl(db: AsyncSession, user_id: int):
+    """Realized and unrealized P&L per stock from open lots and running totals.
+
+    Costs one aggregate over the user's open lots and one read of their
+    realized totals, however long their trading history is.
+    """
+    open_positions = (await db.execute(
+        select(TaxLot.stock_id, func.sum(TaxLot.remaining), func.sum(TaxLot.remaining * TaxLot.price))
+        .where(TaxLot.user_id == user_id, OPEN_LOT)
+        .group_by(TaxLot.stock_id)
+    )).all()
+    realized_rows = (await db.execute(
+        select(RealizedPnl.stock_id, RealizedPnl.realized).where(RealizedPnl.user_id == user_id)
+    )).all()
+
+    stocks = {}
+    for stock_id, quantity, cost_basis in open_positions:
+        stocks[stock_id] = {"quantity": quantity, "cost_basis": cost_basis, "realized": 0.0}
+    for stock_id, realized in realized_rows:
+        stocks.setdefault(stock_id, {"quantity": 0, "cost_basis": 0.0, "realized": 0.0})["realized"] = realized
+
+    quotes = await price_cache.get_many_or_load(db, stocks.keys())
+    positions = []
+    for stock_id in sorted(stocks):
+        position = stocks[stock_id]
+        quote = quotes.get(stock_id)
+        market_value = position["quantity"] * quote.current_price if quote else position["cost_basis"]
+        positions.append({
+            "stock_id": stock_id,
+            "symbol": quote.symbol if quote else None,
+            "quantity": position["quantity"],
+            "cost_basis": position["cost_basis"],
+            "market_value": market_value,
+            "unrealized": market_value - position["cost_basis"],
+            "realized": position["realized"],
+        })
+
+    return {
+        "realized": sum(position["realized"] for position in positions),
+        "unrealized": sum(position["unrealized"] for position in positions),
+        "positions": positions,
+    }
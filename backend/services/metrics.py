@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+
+# Requests slower than this many seconds get their stacks sampled and
+# logged; 0 turns the sampler off
+SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", "0"))
+SLOW_REQUEST_SAMPLE_INTERVAL = float(os.getenv("SLOW_REQUEST_SAMPLE_INTERVAL", "0.01"))
+SLOW_REQUEST_TOP_STACKS = int(os.getenv("SLOW_REQUEST_TOP_STACKS", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Label for requests that matched no route, so 404 scans can't blow up the
+# number of series
+UNMATCHED_ROUTE = "<unmatched>"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestStats:
+    """Database work done on behalf of the current request."""
+    statements: int = 0
+    db_seconds: float = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def render(self, name: str, labels: str):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Per-process request and SQL metrics in Prometheus text format.
+
+    Everything is updated from the event loop thread, so no locking is
+    needed. With several workers each keeps its own numbers.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = Counter()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.statements = defaultdict(lambda: Histogram(STATEMENT_BUCKETS))
+        self.db_time = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.sql_statements_total = 0
+        self.sql_seconds_total = 0.0
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        self.requests[(method, route, str(status))] += 1
+        self.latency[(method, route)].observe(seconds)
+        self.statements[(method, route)].observe(stats.statements)
+        self.db_time[(method, route)].observe(stats.db_seconds)
+
+    def observe_statement(self, seconds: float):
+        self.sql_statements_total += 1
+        self.sql_seconds_total += seconds
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += seconds
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being served",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Requests served, by route and status",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(
+                f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}'
+            )
+
+        histograms = [
+            ("http_request_duration_seconds", "Request latency", self.latency),
+            ("http_request_sql_statements", "SQL statements executed per request", self.statements),
+            ("http_request_db_seconds", "Time spent in SQL per request", self.db_time),
+        ]
+        for name, help_text, series in histograms:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), histogram in sorted(series.items()):
+                lines.extend(histogram.render(name, f'method="{method}",route="{_escape(route)}"'))
+
+        lines += [
+            "# HELP sql_statements_total SQL statements executed",
+            "# TYPE sql_statements_total counter",
+            f"sql_statements_total {self.sql_statements_total}",
+            "# HELP sql_seconds_total Time spent executing SQL",
+            "# TYPE sql_seconds_total counter",
+            f"sql_seconds_total {self.sql_seconds_total}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics.observe_statement(time.perf_counter() - conn.info["query_start"].pop())
+
+
+def instrument_engine(engine):
+    """Count statements and SQL time on a (sync) engine.
+
+    For an AsyncEngine pass ``async_engine.sync_engine``. SQLAlchemy runs
+    the driver calls in the caller's context, so statements are attributed
+    to the request that issued them.
+    """
+    # Apps built more than once in a process share the engine; count once
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+@dataclass
+class _SampledRequest:
+    label: str
+    started: float
+    thread_id: int
+    task: Optional[asyncio.Task]
+    samples: Counter = field(default_factory=Counter)
+
+
+def _await_chain(task: asyncio.Task):
+    # Task.get_stack only returns the outermost frame of a suspended
+    # coroutine; follow cr_await down to where it is actually waiting
+    frames = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append((frame, frame.f_lineno))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return frames
+
+
+def _collapse(frames) -> str:
+    # Flame-graph style "outer;inner" stack, innermost last
+    return ";".join(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{lineno})"
+                    for frame, lineno in frames)
+
+
+class SlowRequestSampler:
+    """Samples the stacks of requests that run past a threshold.
+
+    A daemon thread wakes every `interval` seconds. For each request older
+    than `threshold` it records where the request's task is suspended and,
+    if the event loop thread is busy rather than waiting for I/O, what
+    that thread is running, which catches code that blocks the loop. When
+    a slow request finishes, its most frequent stacks are logged.
+    """
+
+    def __init__(self, threshold: float, interval: float = SLOW_REQUEST_SAMPLE_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self._active = {}
+        self._thread = None
+
+    def begin(self, label: str) -> _SampledRequest:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slow-request-sampler", daemon=True)
+            self._thread.start()
+        request = _SampledRequest(
+            label=label, started=time.perf_counter(), thread_id=threading.get_ident(), task=asyncio.current_task()
+        )
+        self._active[id(request)] = request
+        return request
+
+    def end(self, request: _SampledRequest):
+        self._active.pop(id(request), None)
+        elapsed = time.perf_counter() - request.started
+        if elapsed < self.threshold or not request.samples:
+            return
+        total = sum(request.samples.values())
+        lines = [f"Slow request {request.label}: {elapsed * 1000:.0f} ms, {total} stack samples"]
+        for stack, count in request.samples.most_common(SLOW_REQUEST_TOP_STACKS):
+            lines.append(f"  {count:>5}  {stack}")
+        logger.warning("\n".join(lines))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            slow = [request for request in list(self._active.values()) if now - request.started >= self.threshold]
+            if not slow:
+                continue
+            current_frames = sys._current_frames()
+            for request in slow:
+                frame = current_frames.get(request.thread_id)
+                if frame is not None:
+                    frames = list(traceback.walk_stack(frame))[::-1]
+                    # An idle loop sits in the selector waiting for I/O
+                    if not any(f.f_code.co_name == "select" for f, _ in frames[-3:]):
+                        request.samples[f"[loop] {_collapse(frames)}"] += 1
+                if request.task is not None and not request.task.done():
+                    task_frames = _await_chain(request.task)
+                    if task_frames:
+                        request.samples[f"[task] {_collapse(task_frames)}"] += 1
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight count and SQL per request."""
+
+    def __init__(self, app, sampler_threshold: float = SLOW_REQUEST_THRESHOLD):
+        self.app = app
+        self.sampler = SlowRequestSampler(sampler_threshold) if sampler_threshold > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        sampled = self.sampler.begin(f"{scope['method']} {scope['path']}") if self.sampler else None
+        metrics.in_flight += 1
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.in_flight -= 1
+            _request_stats.reset(token)
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            metrics.observe_request(
+                scope["method"], route.path if route is not None else UNMATCHED_ROUTE, status, elapsed, stats
+            )
+            if sampled:
+                self.sampler.end(sampled)
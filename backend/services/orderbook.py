@@ -0,0 +1,311 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from backend.services.leases import LeaseHolder
+from backend.services.orders import OrderError, apply_buy, apply_sell
+
+# How often matched fills are written to the database, and the most fills
+# written per commit
+ORDER_PERSIST_INTERVAL = float(os.getenv("ORDER_PERSIST_INTERVAL", "0.05"))
+ORDER_PERSIST_BATCH_SIZE = int(os.getenv("ORDER_PERSIST_BATCH_SIZE", "1000"))
+# Closed orders remembered per user for GET /trading/orders
+CLOSED_ORDER_HISTORY = int(os.getenv("CLOSED_ORDER_HISTORY", "100"))
+
+OPEN = "open"
+PARTIAL = "partial"
+FILLED = "filled"
+CANCELLED = "cancelled"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class Order:
+    id: int
+    user_id: int
+    stock_id: int
+    side: str
+    price: float
+    quantity: int
+    filled_quantity: int = 0
+    status: str = OPEN
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+    @property
+    def remaining(self) -> int:
+        return self.quantity - self.filled_quantity
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (OPEN, PARTIAL)
+
+
+@dataclass
+class Fill:
+    stock_id: int
+    price: float
+    quantity: int
+    buyer_id: int
+    seller_id: int
+    buy_order_id: int
+    sell_order_id: int
+    buy_limit: float
+
+
+class OrderBook:
+    """Price-time priority book for one stock.
+
+    Bids and asks are binary heaps keyed by (price, arrival sequence), with
+    bids negated so the best price is always at the top. Cancelled orders
+    are left in place and skipped when they surface.
+    """
+
+    def __init__(self, stock_id: int):
+        self.stock_id = stock_id
+        self._bids = []
+        self._asks = []
+        self._sequence = itertools.count()
+
+    def _best(self, heap) -> Optional[Order]:
+        while heap and not heap[0][2].is_active:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def best_bid(self) -> Optional[Order]:
+        return self._best(self._bids)
+
+    def best_ask(self) -> Optional[Order]:
+        return self._best(self._asks)
+
+    def match(self, order: Order) -> List[Fill]:
+        """Match an incoming order against the book, then rest any remainder.
+
+        Trades execute at the resting order's price. An order that reaches
+        one of its own user's resting orders stops there and the rest of
+        it is cancelled, so nobody trades with themselves.
+        """
+        fills = []
+        is_buy = order.side == "BUY"
+        while order.remaining:
+            resting = self.best_ask() if is_buy else self.best_bid()
+            if resting is None or (order.price < resting.price if is_buy else order.price > resting.price):
+                break
+            if resting.user_id == order.user_id:
+                order.status = CANCELLED
+                break
+            quantity = min(order.remaining, resting.remaining)
+            for matched in (order, resting):
+                matched.filled_quantity += quantity
+                matched.status = FILLED if not matched.remaining else PARTIAL
+            buy, sell = (order, resting) if is_buy else (resting, order)
+            fills.append(Fill(
+                stock_id=self.stock_id,
+                price=resting.price,
+                quantity=quantity,
+                buyer_id=buy.user_id,
+                seller_id=sell.user_id,
+                buy_order_id=buy.id,
+                sell_order_id=sell.id,
+                buy_limit=buy.price,
+            ))
+
+        if order.is_active and order.remaining:
+            if is_buy:
+                heapq.heappush(self._bids, (-order.price, next(self._sequence), order))
+            else:
+                heapq.heappush(self._asks, (order.price, next(self._sequence), order))
+        return fills
+
+    def depth(self, levels: int = 10):
+        """Aggregate open quantity per price level, best prices first."""
+        def aggregate(heap, reverse):
+            totals = defaultdict(lambda: [0, 0])
+            for _, _, order in heap:
+                if order.is_active:
+                    totals[order.price][0] += order.remaining
+                    totals[order.price][1] += 1
+            prices = sorted(totals, reverse=reverse)[:levels]
+            return [{"price": price, "quantity": totals[price][0], "orders": totals[price][1]} for price in prices]
+
+        return {"bids": aggregate(self._bids, True), "asks": aggregate(self._asks, False)}
+
+
+class MatchingEngine:
+    """In-memory limit order matching with batched fill persistence.
+
+    Matching runs synchronously on the event loop, so each submission is
+    atomic with respect to other requests. Funds and shares behind open
+    orders, and behind fills not yet written, are held here and must be
+    excluded by any other path that spends them. Open orders and unwritten
+    fills live only in this process: they are lost if it dies before the
+    persister has run. Only the process holding the matching-engine lease
+    takes orders, so books are never split across workers.
+    """
+
+    def __init__(self):
+        self._books: Dict[int, OrderBook] = {}
+        self._orders: Dict[int, Order] = {}
+        self._closed = defaultdict(lambda: deque(maxlen=CLOSED_ORDER_HISTORY))
+        self._ids = itertools.count(1)
+        self._cash_holds = defaultdict(float)
+        self._share_holds = defaultdict(int)
+        self._pending_fills: List[Fill] = []
+        # Created by run_persister so it belongs to the running event loop
+        self._fills_ready: Optional[asyncio.Event] = None
+        self.lease = LeaseHolder("matching-engine")
+
+    def book(self, stock_id: int) -> OrderBook:
+        if stock_id not in self._books:
+            self._books[stock_id] = OrderBook(stock_id)
+        return self._books[stock_id]
+
+    def cash_hold(self, user_id: int) -> float:
+        return self._cash_holds.get(user_id, 0.0)
+
+    def share_hold(self, user_id: int, stock_id: int) -> int:
+        return self._share_holds.get((user_id, stock_id), 0)
+
+    def submit(self, user_id: int, stock_id: int, side: str, quantity: int, price: float,
+               balance: float, held_quantity: int):
+        """Place a limit order and match it; returns (order, fills).
+
+        `balance` and `held_quantity` are the user's stored cash and shares
+        of this stock, against which the engine's own holds are checked.
+        An order that would first trade against the user's own open order
+        is rejected; one that gets there after some fills comes back
+        cancelled with those fills.
+        """
+        if side == "BUY":
+            if balance - self.cash_hold(user_id) < price * quantity:
+                raise OrderError("Insufficient funds")
+            self._cash_holds[user_id] += price * quantity
+        else:
+            if held_quantity - self.share_hold(user_id, stock_id) < quantity:
+                raise OrderError("Insufficient shares to sell")
+            self._share_holds[(user_id, stock_id)] += quantity
+
+        order = Order(id=next(self._ids), user_id=user_id, stock_id=stock_id, side=side, price=price, quantity=quantity)
+        self._orders[order.id] = order
+        fills = self.book(stock_id).match(order)
+
+        for fill in fills:
+            # The buyer's hold moves from the limit price to the traded cost
+            # until the fill is written; the seller's share hold stays put
+            self._cash_holds[fill.buyer_id] += (fill.price - fill.buy_limit) * fill.quantity
+            self._close_finished(self._orders.get(fill.buy_order_id))
+            self._close_finished(self._orders.get(fill.sell_order_id))
+        if order.status == CANCELLED:
+            self._release(order)
+            if not fills:
+                del self._orders[order.id]
+                raise OrderError("Order would trade against your own open order")
+        self._close_finished(order)
+
+        if fills:
+            self._pending_fills.extend(fills)
+            if self._fills_ready:
+                self._fills_ready.set()
+        return order, fills
+
+    def cancel(self, user_id: int, order_id: int) -> Order:
+        order = self._orders.get(order_id)
+        if order is None or order.user_id != user_id:
+            raise OrderError("Open order not found", status_code=404)
+        order.status = CANCELLED
+        self._release(order)
+        self._close_finished(order)
+        return order
+
+    def orders_for(self, user_id: int) -> List[Order]:
+        active = [order for order in self._orders.values() if order.user_id == user_id]
+        return sorted(active + list(self._closed[user_id]), key=lambda order: order.id, reverse=True)
+
+    def _release(self, order: Order):
+        if order.side == "BUY":
+            self._cash_holds[order.user_id] -= order.price * order.remaining
+        else:
+            self._share_holds[(order.user_id, order.stock_id)] -= order.remaining
+
+    def _close_finished(self, order: Optional[Order]):
+        if order is not None and not order.is_active and self._orders.pop(order.id, None) is not None:
+            self._closed[order.user_id].append(order)
+
+    def take_fills(self, limit: int = ORDER_PERSIST_BATCH_SIZE) -> List[Fill]:
+        fills, self._pending_fills = self._pending_fills[:limit], self._pending_fills[limit:]
+        if not self._pending_fills and self._fills_ready:
+            self._fills_ready.clear()
+        return fills
+
+    def settle(self, fills: List[Fill]):
+        """Drop the holds behind fills once they are in the database."""
+        for fill in fills:
+            self._cash_holds[fill.buyer_id] -= fill.price * fill.quantity
+            self._share_holds[(fill.seller_id, fill.stock_id)] -= fill.quantity
+
+    async def persist_fills(self, db, fills: List[Fill]):
+        """Write fills as BUY/SELL transactions and holding changes in one commit.
+
+        Each fill goes in its own savepoint. One that fails is rolled back
+        on its own and left out; returns (written, failed).
+        """
+        written, failed = [], []
+        for fill in fills:
+            try:
+                async with db.begin_nested():
+                    await apply_buy(db, fill.buyer_id, fill.stock_id, fill.quantity, fill.price)
+                    await apply_sell(db, fill.seller_id, fill.stock_id, fill.quantity, fill.price)
+            except Exception:
+                # Funds and shares were held at match time, so this takes
+                # something like a user deactivated since then
+                logger.exception("Dropping fill of order %d against order %d", fill.buy_order_id, fill.sell_order_id)
+                failed.append(fill)
+                continue
+            written.append(fill)
+        await db.commit()
+        return written, failed
+
+    async def run_persister(self, session_factory, on_persisted=None, interval: float = ORDER_PERSIST_INTERVAL):
+        """Write pending fills in batches until cancelled.
+
+        Waits for fills, then lingers `interval` seconds so fills arriving
+        close together share one commit. `on_persisted` is called with each
+        written batch.
+        """
+        self._fills_ready = asyncio.Event()
+        if self._pending_fills:
+            self._fills_ready.set()
+        try:
+            while True:
+                await self._fills_ready.wait()
+                await asyncio.sleep(interval)
+                await self._persist_pending(session_factory, on_persisted)
+        finally:
+            await self._persist_pending(session_factory, on_persisted)
+
+    async def _persist_pending(self, session_factory, on_persisted):
+        while self._pending_fills:
+            fills = self.take_fills()
+            try:
+                async with session_factory() as db:
+                    written, failed = await self.persist_fills(db, fills)
+            except Exception:
+                # The commit itself failed, not any one fill; put them back
+                # and retry on the next round
+                logger.exception("Error persisting %d fills", len(fills))
+                self._pending_fills[:0] = fills
+                self._fills_ready.set()
+                return
+            # Dropped fills never trade, so their holds go too
+            self.settle(fills)
+            if on_persisted and written:
+                on_persisted(written)
+
+
+matching_engine = MatchingEngine()
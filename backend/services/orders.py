@@ -0,0 +1,363 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.models import User, Holding, Transaction
+from backend.services.ledger import BUY, SELL, record_event, record_events
+from backend.services.lots import book_lots, close_lots, open_lot
+
+# Most orders accepted in one POST /trading/orders/batch
+ORDER_BATCH_MAX_SIZE = int(os.getenv("ORDER_BATCH_MAX_SIZE", "200"))
+
+
+class OrderError(Exception):
+    """An order that cannot be executed, with the HTTP status to report."""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class UserSequencer:
+    """Keyed locks that run one user's order paths one at a time.
+
+    asyncio.Lock wakes waiters in FIFO order, so a user's orders execute in
+    the order they arrived while other users never wait on each other. A
+    key's lock is dropped once nobody holds or waits on it. This only
+    orders requests within one process; the conditional UPDATEs below keep
+    balances and holdings correct across processes.
+    """
+
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._users: Dict[int, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, user_id: int):
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        self._users[user_id] = self._users.get(user_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[user_id] -= 1
+            if not self._users[user_id]:
+                del self._users[user_id]
+                del self._locks[user_id]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+user_sequencer = UserSequencer()
+
+
+async def load_holding(db: AsyncSession, user_id: int, stock_id: int) -> Optional[Holding]:
+    result = await db.execute(select(Holding).where(
+        Holding.user_id == user_id,
+        Holding.stock_id == stock_id
+    ))
+    return result.scalars().first()
+
+
+async def load_holdings_for(db: AsyncSession, user_id: int, stock_ids: Iterable[int]) -> Dict[int, Tuple[int, float]]:
+    """Quantity and average price of a user's holdings in `stock_ids`, in one query."""
+    result = await db.execute(
+        select(Holding.stock_id, Holding.quantity, Holding.average_price)
+        .where(Holding.user_id == user_id, Holding.stock_id.in_(set(stock_ids)))
+    )
+    return {stock_id: (quantity, average_price) for stock_id, quantity, average_price in result}
+
+
+async def _write_holdings(
+    db: AsyncSession, user_id: int, before: Dict[int, Tuple[int, float]], after: Dict[int, Tuple[int, float]]
+):
+    # Rows are only changed or removed if their quantity is still the one
+    # read, so a holding moved by another process fails the batch
+    table = Holding.__table__
+    updates = [
+        {"b_stock_id": stock_id, "b_quantity": before[stock_id][0], "b_new_quantity": quantity, "b_average_price": price}
+        for stock_id, (quantity, price) in after.items()
+        if stock_id in before and before[stock_id] != (quantity, price)
+    ]
+    deletes = [
+        {"b_stock_id": stock_id, "b_quantity": quantity}
+        for stock_id, (quantity, _) in before.items() if stock_id not in after
+    ]
+    inserts = [
+        {"user_id": user_id, "stock_id": stock_id, "quantity": quantity, "average_price": price}
+        for stock_id, (quantity, price) in after.items() if stock_id not in before
+    ]
+    matches = (
+        table.c.user_id == user_id,
+        table.c.stock_id == bindparam("b_stock_id"),
+        table.c.quantity == bindparam("b_quantity"),
+    )
+    writes = (
+        (update(table).where(*matches).values(
+            quantity=bindparam("b_new_quantity"), average_price=bindparam("b_average_price")
+        ), updates),
+        (delete(table).where(*matches), deletes),
+    )
+    for statement, rows in writes:
+        if rows:
+            result = await db.execute(statement, rows)
+            if result.supports_sane_multi_rowcount() and result.rowcount != len(rows):
+                raise OrderError("Holdings changed while the batch was running", status_code=409)
+    if inserts:
+        await db.execute(insert(table), inserts)
+
+
+async def change_balance(db: AsyncSession, user_id: int, amount: float, minimum: Optional[float] = None) -> bool:
+    """Add `amount` to an active user's balance in one UPDATE.
+
+    With `minimum`, the update only happens if the balance is at least
+    that much beforehand. Returns whether a row was updated.
+    """
+    statement = update(User).where(User.id == user_id, User.is_active == True)
+    if minimum is not None:
+        statement = statement.where(User.balance >= minimum)
+    result = await db.execute(
+        statement.values(balance=User.balance + amount).execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def _change_holding(db: AsyncSession, user_id: int, stock_id: int, quantity: int, minimum: Optional[int] = None) -> bool:
+    statement = update(Holding).where(Holding.user_id == user_id, Holding.stock_id == stock_id)
+    if minimum is not None:
+        statement = statement.where(Holding.quantity >= minimum)
+    result = await db.execute(
+        statement.values(quantity=Holding.quantity + quantity).execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _record(db: AsyncSession, user_id: int, stock_id: int, transaction_type: str, quantity: int, price: float) -> Transaction:
+    db_transaction = Transaction(
+        user_id=user_id,
+        stock_id=stock_id,
+        transaction_type=transaction_type,
+        quantity=quantity,
+        price=price,
+        total_amount=price * quantity
+    )
+    db.add(db_transaction)
+    return db_transaction
+
+
+async def apply_buy(
+    db: AsyncSession,
+    user_id: int,
+    stock_id: int,
+    quantity: int,
+    price: float,
+    reserved_cash: float = 0.0,
+) -> Transaction:
+    """Debit the user, add to (or open) the holding, open a tax lot, append
+    an account event and record the transaction.
+
+    The balance is checked and debited in one conditional UPDATE, so
+    concurrent orders cannot both spend the same funds. `reserved_cash` is
+    balance already promised elsewhere (open limit orders) that this buy
+    may not spend. Nothing is committed.
+    """
+    total_amount = price * quantity
+
+    if not await change_balance(db, user_id, -total_amount, minimum=total_amount + reserved_cash):
+        is_active = (await db.execute(select(User.is_active).where(User.id == user_id))).scalar()
+        raise OrderError("Insufficient funds" if is_active else "Inactive user")
+
+    # Update existing holding with new average price; the SET expressions
+    # all see the row's values from before the update
+    result = await db.execute(
+        update(Holding)
+        .where(Holding.user_id == user_id, Holding.stock_id == stock_id)
+        .values(
+            quantity=Holding.quantity + quantity,
+            average_price=(Holding.average_price * Holding.quantity + total_amount) / (Holding.quantity + quantity),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.execute(insert(Holding).values(
+            user_id=user_id,
+            stock_id=stock_id,
+            quantity=quantity,
+            average_price=price
+        ))
+
+    await open_lot(db, user_id, stock_id, quantity, price)
+    await record_event(db, user_id, BUY, -total_amount, stock_id, quantity, price)
+    return _record(db, user_id, stock_id, "BUY", quantity, price)
+
+
+async def apply_sell(
+    db: AsyncSession,
+    user_id: int,
+    stock_id: int,
+    quantity: int,
+    price: float,
+    reserved_shares: int = 0,
+) -> Transaction:
+    """Reduce the holding, credit the user, close tax lots FIFO, append an
+    account event and record the transaction.
+
+    The holding is checked and reduced in one conditional UPDATE.
+    `reserved_shares` are shares of this holding promised to open limit
+    orders. Nothing is committed.
+    """
+    if not await _change_holding(db, user_id, stock_id, -quantity, minimum=quantity + reserved_shares):
+        if await load_holding(db, user_id, stock_id) is None:
+            raise OrderError("You don't own this stock")
+        raise OrderError("Insufficient shares to sell")
+
+    if not await change_balance(db, user_id, price * quantity):
+        # Put the shares back so a skipped order leaves nothing behind
+        await _change_holding(db, user_id, stock_id, quantity)
+        raise OrderError("Inactive user")
+
+    # Remove holding if quantity is zero
+    await db.execute(
+        delete(Holding)
+        .where(Holding.user_id == user_id, Holding.stock_id == stock_id, Holding.quantity == 0)
+        .execution_options(synchronize_session=False)
+    )
+
+    await close_lots(db, user_id, stock_id, quantity, price)
+    await record_event(db, user_id, SELL, price * quantity, stock_id, quantity, price)
+    return _record(db, user_id, stock_id, "SELL", quantity, price)
+
+
+def _plan_batch(orders, stock_ids, balance: float, holdings, all_or_nothing: bool, reserved_cash: float, reserved_shares):
+    # Check each order against the running in-memory balance and holdings.
+    # Returns the holdings afterwards, the net balance change, the balance
+    # needed beforehand for every buy to clear, the accepted trades and
+    # the rejected orders.
+    positions = dict(holdings)
+    change = 0.0
+    minimum = None
+    trades = []
+    rejected: List[Tuple[int, str]] = []
+
+    for index, order in enumerate(orders):
+        try:
+            if order.stock_id not in stock_ids:
+                raise OrderError("Stock not found", status_code=404)
+            held, average_price = positions.get(order.stock_id, (0, 0.0))
+            total_amount = order.price * order.quantity
+            if order.transaction_type == "BUY":
+                needed = total_amount + reserved_cash - change
+                if balance < needed:
+                    raise OrderError("Insufficient funds")
+                minimum = needed if minimum is None else max(minimum, needed)
+                change -= total_amount
+                # Same arithmetic as apply_buy's UPDATE
+                if held:
+                    average_price = (average_price * held + total_amount) / (held + order.quantity)
+                else:
+                    average_price = order.price
+                positions[order.stock_id] = (held + order.quantity, average_price)
+                amount = -total_amount
+            elif order.transaction_type == "SELL":
+                if not held:
+                    raise OrderError("You don't own this stock")
+                if held < order.quantity + reserved_shares.get(order.stock_id, 0):
+                    raise OrderError("Insufficient shares to sell")
+                change += total_amount
+                if held - order.quantity:
+                    positions[order.stock_id] = (held - order.quantity, average_price)
+                else:
+                    del positions[order.stock_id]
+                amount = total_amount
+            else:
+                raise OrderError("Transaction type must be BUY or SELL")
+        except OrderError as e:
+            if all_or_nothing:
+                raise OrderError(f"Order {index}: {e.detail}", status_code=e.status_code)
+            rejected.append((index, e.detail))
+            continue
+        trades.append((index, order.transaction_type, order.stock_id, order.quantity, order.price, amount))
+
+    return positions, change, minimum, trades, rejected
+
+
+async def _read_account(db: AsyncSession, user_id: int, for_update: bool = False) -> float:
+    statement = select(User.balance, User.is_active).where(User.id == user_id)
+    row = (await db.execute(statement.with_for_update() if for_update else statement)).first()
+    if row is None or not row.is_active:
+        raise OrderError("Inactive user")
+    return row.balance
+
+
+async def execute_batch(
+    db: AsyncSession,
+    user_id: int,
+    orders,
+    stock_ids,
+    all_or_nothing: bool = True,
+    reserved_cash: float = 0.0,
+    reserved_shares: Optional[Dict[int, int]] = None,
+):
+    """Apply a list of buys and sells for one user, in order, without committing.
+
+    The balance and the holdings of every stock in the batch are read in
+    one query each, and orders are checked against the running in-memory
+    state, so a sell can fund a later buy. The net balance change is then
+    made with one conditional UPDATE that only succeeds if the balance
+    still covers every buy, and holdings, lots, events and transactions
+    are written with one executemany per kind of write. `stock_ids` are
+    the stocks known to exist. In all-or-nothing mode the first rejected
+    order raises OrderError; otherwise rejected orders are skipped, and if
+    another process spent funds after the balance was read, the orders
+    are checked again against the balance that is left. On OrderError the
+    caller must roll back. Returns (executed, rejected) as lists of
+    (index, transaction) and (index, detail).
+    """
+    reserved_shares = reserved_shares or {}
+    balance = await _read_account(db, user_id)
+    holdings = await load_holdings_for(db, user_id, stock_ids)
+    positions, change, minimum, trades, rejected = _plan_batch(
+        orders, stock_ids, balance, holdings, all_or_nothing, reserved_cash, reserved_shares
+    )
+    if not trades:
+        return [], rejected
+
+    # Another process may have spent or moved funds since the read above
+    if not await change_balance(db, user_id, change, minimum=minimum):
+        if all_or_nothing:
+            raise OrderError("Insufficient funds")
+        # Read the balance again, locking the row where the database can,
+        # and drop whichever orders it no longer covers
+        balance = await _read_account(db, user_id, for_update=True)
+        positions, change, minimum, trades, rejected = _plan_batch(
+            orders, stock_ids, balance, holdings, all_or_nothing, reserved_cash, reserved_shares
+        )
+        if not trades:
+            return [], rejected
+        if not await change_balance(db, user_id, change, minimum=minimum):
+            raise OrderError("Insufficient funds")
+    await _write_holdings(db, user_id, holdings, positions)
+    await book_lots(db, user_id, [(kind, stock_id, quantity, price) for _, kind, stock_id, quantity, price, _ in trades])
+    await record_events(db, [
+        {"user_id": user_id, "kind": kind, "stock_id": stock_id, "quantity": quantity, "price": price, "amount": amount}
+        for _, kind, stock_id, quantity, price, amount in trades
+    ])
+    # One multi-row INSERT, returning the rows with their ids and timestamps
+    # in the order of the trades
+    transactions = await db.scalars(insert(Transaction).returning(Transaction, sort_by_parameter_order=True), [
+        {
+            "user_id": user_id, "stock_id": stock_id, "transaction_type": kind,
+            "quantity": quantity, "price": price, "total_amount": price * quantity,
+        }
+        for _, kind, stock_id, quantity, price, _ in trades
+    ])
+    executed = [(index, transaction) for (index, *_), transaction in zip(trades, transactions)]
+    return executed, rejected
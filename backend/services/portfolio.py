@@ -0,0 +1,70 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+
+from backend.models.models import Holding
+from backend.services.prices import price_cache
+from backend.services.serialization import HOLDING_COLUMNS, serialize_holding_rows
+
+
+async def load_holdings(db: AsyncSession, user_id: int):
+    """Load a user's holdings with their stocks in a single joined query.
+
+    The stock is attached through ``contains_eager`` so serializing
+    ``Holding.stock`` afterwards does not lazy-load one row per holding.
+    """
+    result = await db.execute(
+        select(Holding)
+        .join(Holding.stock)
+        .options(contains_eager(Holding.stock))
+        .where(Holding.user_id == user_id)
+        .order_by(Holding.stock_id)
+    )
+    return result.scalars().all()
+
+
+async def load_holding_rows(db: AsyncSession, user_id: int):
+    """A user's holdings as response dicts, from a column-projected query."""
+    result = await db.execute(
+        select(*HOLDING_COLUMNS)
+        .join(Holding.stock)
+        .where(Holding.user_id == user_id)
+        .order_by(Holding.stock_id)
+    )
+    return serialize_holding_rows(result.all())
+
+
+def value_holdings(holdings):
+    """Compute invested value, current value and P&L for loaded holdings.
+
+    Current prices come from the price cache, falling back to the joined
+    stock row for stocks the cache does not know yet. Each returned holding
+    carries the same stock snapshot its value was computed from.
+    """
+    invested_value = 0.0
+    current_value = 0.0
+    positions = []
+    for holding in holdings:
+        stock = price_cache.get(holding.stock_id) or holding.stock
+        invested_value += holding.average_price * holding.quantity
+        current_value += stock.current_price * holding.quantity
+        positions.append({
+            "id": holding.id,
+            "user_id": holding.user_id,
+            "stock_id": holding.stock_id,
+            "quantity": holding.quantity,
+            "average_price": holding.average_price,
+            "stock": stock,
+        })
+
+    return {
+        "invested_value": invested_value,
+        "current_value": current_value,
+        "pnl": current_value - invested_value,
+        "holdings": positions,
+    }
+
+
+async def value_portfolio(db: AsyncSession, user_id: int):
+    """Value a user's portfolio with a constant number of queries."""
+    return value_holdings(await load_holdings(db, user_id))
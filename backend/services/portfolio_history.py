@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, distinct, insert, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.models import Holding, PortfolioValue
+from backend.services.prices import PriceCache, price_cache
+
+# How often users who traded get today's point recomputed, and how many
+# users are valued per query at the end-of-day close
+PORTFOLIO_HISTORY_INTERVAL = float(os.getenv("PORTFOLIO_HISTORY_INTERVAL", "1.0"))
+PORTFOLIO_HISTORY_BATCH_SIZE = int(os.getenv("PORTFOLIO_HISTORY_BATCH_SIZE", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioHistory:
+    """Maintains the daily portfolio_values series.
+
+    Trades mark their user dirty once committed; the updater recomputes
+    today's point for dirty users in batches, valuing current holdings at
+    cached prices. When the date rolls over, every user holding stock gets
+    a final point for the day that ended, at the prices of that moment.
+    Earlier history comes from the backfill in backend.database.bulk.
+    """
+
+    def __init__(self, cache: PriceCache):
+        self.cache = cache
+        self._dirty = set()
+
+    def mark(self, *user_ids: int):
+        self._dirty.update(user_ids)
+
+    async def record(self, db: AsyncSession, user_ids: Iterable[int], day: date) -> int:
+        """Replace the `day` points of `user_ids` with their current holdings' value."""
+        user_ids = list(user_ids)
+        holdings = (await db.execute(
+            select(Holding.user_id, Holding.stock_id, Holding.quantity, Holding.average_price)
+            .where(Holding.user_id.in_(user_ids))
+        )).all()
+        quotes = await self.cache.get_many_or_load(db, {holding.stock_id for holding in holdings})
+
+        # Users who sold everything still get a point, at zero
+        values = {user_id: [0.0, 0.0] for user_id in user_ids}
+        for holding in holdings:
+            value = values[holding.user_id]
+            value[0] += holding.quantity * holding.average_price
+            quote = quotes.get(holding.stock_id)
+            value[1] += holding.quantity * (quote.current_price if quote else holding.average_price)
+
+        await db.execute(
+            delete(PortfolioValue).where(PortfolioValue.user_id.in_(user_ids), PortfolioValue.day == day)
+        )
+        await db.execute(insert(PortfolioValue), [
+            {"user_id": user_id, "day": day, "invested_value": invested, "current_value": current}
+            for user_id, (invested, current) in values.items()
+        ])
+        return len(values)
+
+    async def refresh(self, db: AsyncSession, day: Optional[date] = None) -> int:
+        """Record today's point for every dirty user."""
+        dirty = self._dirty
+        self._dirty = set()
+        if not dirty:
+            return 0
+        day = day or datetime.utcnow().date()
+        users = sorted(dirty)
+        try:
+            for start in range(0, len(users), PORTFOLIO_HISTORY_BATCH_SIZE):
+                await self.record(db, users[start:start + PORTFOLIO_HISTORY_BATCH_SIZE], day)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            # Retry these users on the next refresh
+            self._dirty.update(dirty)
+            raise
+        return len(users)
+
+    async def close_day(self, db: AsyncSession, day: date) -> int:
+        """Record the closing point of `day` for every user holding stock.
+
+        Users who already have a point for the day are included too, so one
+        who sold out during the day closes at zero.
+        """
+        users = (await db.execute(
+            union(
+                select(distinct(Holding.user_id)),
+                select(PortfolioValue.user_id).where(PortfolioValue.day == day),
+            )
+        )).scalars().all()
+        users = sorted(users)
+        for start in range(0, len(users), PORTFOLIO_HISTORY_BATCH_SIZE):
+            await self.record(db, users[start:start + PORTFOLIO_HISTORY_BATCH_SIZE], day)
+            await db.commit()
+        return len(users)
+
+    async def run_updater(self, session_factory, interval: float = PORTFOLIO_HISTORY_INTERVAL):
+        """Refresh dirty users and close each day as it ends, until cancelled."""
+        day = datetime.utcnow().date()
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    async with session_factory() as db:
+                        today = datetime.utcnow().date()
+                        if today != day:
+                            # Points for trades just before midnight land on
+                            # the old day, then it closes
+                            await self.refresh(db, day)
+                            await self.close_day(db, day)
+                            day = today
+                        await self.refresh(db, day)
+                except Exception:
+                    logger.exception("Error updating portfolio history")
+        finally:
+            async with session_factory() as db:
+                await self.refresh(db, day)
+
+
+async def load_series(db: AsyncSession, user_id: int, start: Optional[date] = None, end: Optional[date] = None):
+    """A user's daily points between `start` and `end` (inclusive), oldest first."""
+    query = select(
+        PortfolioValue.day, PortfolioValue.invested_value, PortfolioValue.current_value
+    ).where(PortfolioValue.user_id == user_id)
+    if start is not None:
+        query = query.where(PortfolioValue.day >= start)
+    if end is not None:
+        query = query.where(PortfolioValue.day <= end)
+    rows = await db.execute(query.order_by(PortfolioValue.day))
+    return [
+        {"day": day, "invested_value": invested, "current_value": current, "pnl": current - invested}
+        for day, invested, current in rows
+    ]
+
+
+portfolio_history = PortfolioHistory(price_cache)
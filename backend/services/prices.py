@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.models import PriceTick, Stock
+
+# How often dirty quotes are written back to the stocks table, and how many
+# rows go into each executemany batch
+PRICE_FLUSH_INTERVAL = float(os.getenv("PRICE_FLUSH_INTERVAL", "1.0"))
+PRICE_FLUSH_BATCH_SIZE = int(os.getenv("PRICE_FLUSH_BATCH_SIZE", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Quote:
+    """Immutable snapshot of a stock row as held by the price cache.
+
+    Carries the same fields as the ``Stock`` schema so it can be returned
+    from endpoints directly.
+    """
+    id: int
+    symbol: str
+    name: str
+    exchange: str
+    current_price: float
+    day_high: float
+    day_low: float
+    last_updated: Optional[datetime] = None
+    version: int = 0
+
+    @classmethod
+    def from_stock(cls, stock: Stock, version: int = 0):
+        return cls(
+            id=stock.id,
+            symbol=stock.symbol,
+            name=stock.name,
+            exchange=stock.exchange,
+            current_price=stock.current_price,
+            day_high=stock.day_high,
+            day_low=stock.day_low,
+            last_updated=stock.last_updated,
+            version=version,
+        )
+
+
+class PriceCache:
+    """In-memory id/symbol -> quote table in front of the stocks table.
+
+    Ticks are applied in memory and bump a global version; the affected
+    stocks are marked dirty and written back in batches by ``flush``, which
+    also appends the ticks themselves to the price_ticks history. Quotes
+    are replaced rather than mutated, so readers never see a half-applied
+    tick. The cache is per process: each worker loads its own copy.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._quotes: Dict[int, Quote] = {}
+        self._ids_by_symbol: Dict[str, int] = {}
+        self._dirty = set()
+        # Ticks applied since the last flush, as (stock_id, timestamp, price, volume)
+        self._ticks = []
+        self.version = 0
+        self.loaded = False
+        # Every tick stamped before this time has been written to price_ticks
+        self.flushed_through = datetime.utcnow()
+
+    async def load(self, db: AsyncSession):
+        """Replace the cache contents with the current stocks table."""
+        stocks = (await db.execute(select(Stock))).scalars().all()
+        with self._lock:
+            self.version += 1
+            self._quotes = {stock.id: Quote.from_stock(stock, self.version) for stock in stocks}
+            self._ids_by_symbol = {quote.symbol: quote.id for quote in self._quotes.values()}
+            self._dirty.clear()
+            self._ticks.clear()
+            self.loaded = True
+            self.flushed_through = datetime.utcnow()
+
+    def get(self, stock_id: int) -> Optional[Quote]:
+        return self._quotes.get(stock_id)
+
+    def get_by_symbol(self, symbol: str) -> Optional[Quote]:
+        stock_id = self._ids_by_symbol.get(symbol)
+        return self._quotes.get(stock_id) if stock_id is not None else None
+
+    async def get_or_load(self, db: AsyncSession, stock_id: int) -> Optional[Quote]:
+        """Return a quote, reading and caching the stock row on a miss.
+
+        Misses happen for stocks created by another worker after this
+        cache was loaded.
+        """
+        quote = self._quotes.get(stock_id)
+        if quote is None:
+            stock = await db.get(Stock, stock_id)
+            if stock is not None:
+                quote = self.upsert_stock(stock)
+        return quote
+
+    async def get_many_or_load(self, db: AsyncSession, stock_ids) -> Dict[int, Quote]:
+        """Return the quotes for `stock_ids`, reading all misses in one query."""
+        quotes = {stock_id: self._quotes[stock_id] for stock_id in stock_ids if stock_id in self._quotes}
+        missing = set(stock_ids) - quotes.keys()
+        if missing:
+            stocks = (await db.execute(select(Stock).where(Stock.id.in_(missing)))).scalars()
+            for stock in stocks:
+                quotes[stock.id] = self.upsert_stock(stock)
+        return quotes
+
+    def all(self) -> List[Quote]:
+        return sorted(self._quotes.values(), key=lambda quote: quote.id)
+
+    def upsert_stock(self, stock: Stock) -> Quote:
+        """Add or replace a quote from a stock row read from the database."""
+        with self._lock:
+            self.version += 1
+            quote = Quote.from_stock(stock, self.version)
+            self._quotes[quote.id] = quote
+            self._ids_by_symbol[quote.symbol] = quote.id
+            return quote
+
+    def apply_ticks(self, ticks):
+        """Apply price ticks and return (updated quotes, unknown symbols).
+
+        Each tick needs ``symbol`` and ``price``; ``day_high``/``day_low`` are
+        optional and otherwise widened to include the new price, and
+        ``volume`` defaults to 0.
+        """
+        updated = []
+        unknown = []
+        with self._lock:
+            # Stamped under the lock so flush's cutoff orders after it
+            now = datetime.utcnow()
+            for tick in ticks:
+                stock_id = self._ids_by_symbol.get(tick.symbol)
+                if stock_id is None:
+                    unknown.append(tick.symbol)
+                    continue
+                quote = self._quotes[stock_id]
+                day_high = tick.day_high if tick.day_high is not None else max(quote.day_high, tick.price)
+                day_low = tick.day_low if tick.day_low is not None else min(quote.day_low, tick.price)
+                self.version += 1
+                quote = replace(
+                    quote,
+                    current_price=tick.price,
+                    day_high=day_high,
+                    day_low=day_low,
+                    last_updated=now,
+                    version=self.version,
+                )
+                self._quotes[stock_id] = quote
+                self._dirty.add(stock_id)
+                self._ticks.append((stock_id, now, tick.price, getattr(tick, "volume", 0)))
+                updated.append(quote)
+        return updated, unknown
+
+    def pending_ticks(self, stock_id: int):
+        """Ticks for a stock not yet written to price_ticks, oldest first."""
+        with self._lock:
+            return [tick for tick in self._ticks if tick[0] == stock_id]
+
+    async def flush(self, db: AsyncSession) -> int:
+        """Write dirty quotes back to the stocks table and ticks to price_ticks."""
+        with self._lock:
+            cutoff = datetime.utcnow()
+            dirty = self._dirty
+            self._dirty = set()
+            ticks = self._ticks
+            self._ticks = []
+            rows = [
+                {
+                    "id": quote.id,
+                    "current_price": quote.current_price,
+                    "day_high": quote.day_high,
+                    "day_low": quote.day_low,
+                    "last_updated": quote.last_updated,
+                }
+                for quote in (self._quotes[stock_id] for stock_id in dirty)
+            ]
+        if not rows:
+            self.flushed_through = cutoff
+            return 0
+
+        tick_rows = [
+            {"stock_id": stock_id, "timestamp": timestamp, "price": price, "volume": volume}
+            for stock_id, timestamp, price, volume in ticks
+        ]
+        try:
+            for start in range(0, len(rows), PRICE_FLUSH_BATCH_SIZE):
+                await db.execute(update(Stock), rows[start:start + PRICE_FLUSH_BATCH_SIZE])
+            for start in range(0, len(tick_rows), PRICE_FLUSH_BATCH_SIZE):
+                await db.execute(insert(PriceTick), tick_rows[start:start + PRICE_FLUSH_BATCH_SIZE])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            # Retry these stocks and ticks on the next flush
+            with self._lock:
+                self._dirty.update(dirty)
+                self._ticks[:0] = ticks
+            raise
+        self.flushed_through = cutoff
+        return len(rows)
+
+    async def flush_with(self, session_factory) -> int:
+        async with session_factory() as db:
+            return await self.flush(db)
+
+    async def run_flusher(self, session_factory, interval: float = PRICE_FLUSH_INTERVAL):
+        """Periodically flush dirty quotes until cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.flush_with(session_factory)
+                except Exception:
+                    logger.exception("Error flushing prices")
+        finally:
+            await self.flush_with(session_factory)
+
+
+price_cache = PriceCache()
@@ -0,0 +1,208 @@
+import heapq
+import os
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+from backend.services.prices import price_cache
+
+# Similarity (0 to 1) a stock must reach to count as a fuzzy match; lower
+# is more forgiving of typos
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.5"))
+# Query words this short or shorter share too few trigrams with a one-typo
+# neighbour to reach the threshold ("tcz" and "tcs" share one of three), so
+# they are also compared by edit distance with tokens at most one edit away
+SEARCH_SHORT_WORD = int(os.getenv("SEARCH_SHORT_WORD", "4"))
+# Most prefix matches looked at per query, so one-letter queries stay cheap
+SEARCH_PREFIX_SCAN = int(os.getenv("SEARCH_PREFIX_SCAN", "1000"))
+
+# Ranking tiers, best first
+EXACT_SYMBOL, SYMBOL_PREFIX, NAME_PREFIX, FUZZY = range(4)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _trigrams(token: str) -> Set[str]:
+    # Padding lets short tokens and word edges produce trigrams too
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _deletions(token: str) -> Set[str]:
+    # Two strings within one edit of each other share one of these keys
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, a_char in enumerate(a, 1):
+        current = [i]
+        for j, b_char in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a_char != b_char)))
+        previous = current
+    return previous[-1]
+
+
+def _prefix_matches(keys: List[Tuple[str, int]], prefix: str):
+    index = bisect_left(keys, (prefix,))
+    for key, stock_id in keys[index:index + SEARCH_PREFIX_SCAN]:
+        if not key.startswith(prefix):
+            break
+        yield key, stock_id
+
+
+class StockSearchIndex:
+    """In-memory symbol and company name index for search-as-you-type.
+
+    Symbols and the words of each name are kept in sorted lists for prefix
+    lookups by bisection. Results are ranked: exact symbol, symbol prefix
+    (shorter first), then names containing the query from a word start.
+    When those give fewer results than asked for, typo-tolerant matches
+    fill the rest: each query word is compared with the distinct symbols
+    and name words through trigram postings, and a stock scores the mean
+    of its best per-word similarities. Short query words are also scored
+    by edit distance against tokens one edit away, found through an index
+    of each short token's single-character deletions. The index is per
+    process, built from the price cache at startup and updated as stocks
+    are created.
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, Tuple[str, str]] = {}
+        self._symbols: List[Tuple[str, int]] = []
+        self._words: List[Tuple[str, int]] = []
+        # Distinct tokens (symbols and name words) -> stocks using them
+        self._tokens: Dict[str, Set[int]] = {}
+        # Trigram -> tokens containing it, and each token's distinct trigrams
+        self._postings: Dict[str, Set[str]] = {}
+        self._trigram_counts: Dict[str, int] = {}
+        # Deletion key -> short tokens producing it
+        self._deletion_keys: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def rebuild(self, quotes):
+        self.__init__()
+        for quote in quotes:
+            self.add(quote.id, quote.symbol, quote.name)
+
+    def add(self, stock_id: int, symbol: str, name: str):
+        """Index a stock, replacing what was indexed for it before."""
+        symbol, name = _normalize(symbol or ""), _normalize(name or "")
+        if self._entries.get(stock_id) == (symbol, name):
+            return
+        self.remove(stock_id)
+        self._entries[stock_id] = (symbol, name)
+        insort(self._symbols, (symbol, stock_id))
+        for word in set(name.split()):
+            insort(self._words, (word, stock_id))
+        for token in set(name.split()) | {symbol}:
+            stocks = self._tokens.get(token)
+            if stocks is None:
+                stocks = self._tokens[token] = set()
+                trigrams = _trigrams(token)
+                self._trigram_counts[token] = len(trigrams)
+                for trigram in trigrams:
+                    self._postings.setdefault(trigram, set()).add(token)
+                if len(token) <= SEARCH_SHORT_WORD + 1:
+                    for key in _deletions(token):
+                        self._deletion_keys.setdefault(key, set()).add(token)
+            stocks.add(stock_id)
+
+    def remove(self, stock_id: int):
+        entry = self._entries.pop(stock_id, None)
+        if entry is None:
+            return
+        symbol, name = entry
+        keys = [(self._symbols, (symbol, stock_id))] + [(self._words, (word, stock_id)) for word in set(name.split())]
+        for sorted_keys, key in keys:
+            index = bisect_left(sorted_keys, key)
+            if index < len(sorted_keys) and sorted_keys[index] == key:
+                del sorted_keys[index]
+        for token in set(name.split()) | {symbol}:
+            stocks = self._tokens.get(token)
+            if stocks is None:
+                continue
+            stocks.discard(stock_id)
+            if not stocks:
+                del self._tokens[token]
+                del self._trigram_counts[token]
+                for index, keys in ((self._postings, _trigrams(token)), (self._deletion_keys, _deletions(token))):
+                    for key in keys:
+                        tokens = index.get(key)
+                        if tokens is None:
+                            continue
+                        tokens.discard(token)
+                        if not tokens:
+                            del index[key]
+
+    def _similar(self, word: str) -> Dict[int, float]:
+        """stock_id -> best similarity of one query word to its tokens.
+
+        Similarity is the Dice coefficient of the two trigram sets and, for
+        short words, also one minus the edit distance over the longer
+        length, whichever is higher.
+        """
+        word_trigrams = _trigrams(word)
+        shared = Counter()
+        for trigram in word_trigrams:
+            shared.update(self._postings.get(trigram, ()))
+        similarities = {
+            token: 2 * count / (len(word_trigrams) + self._trigram_counts[token]) for token, count in shared.items()
+        }
+        if len(word) <= SEARCH_SHORT_WORD:
+            nearby = set()
+            for key in _deletions(word):
+                nearby.update(self._deletion_keys.get(key, ()))
+            for token in nearby:
+                similarity = 1 - _edit_distance(word, token) / max(len(word), len(token))
+                if similarity > similarities.get(token, 0.0):
+                    similarities[token] = similarity
+
+        best: Dict[int, float] = {}
+        for token, similarity in similarities.items():
+            for stock_id in self._tokens[token]:
+                if similarity > best.get(stock_id, 0.0):
+                    best[stock_id] = similarity
+        return best
+
+    def search(self, query: str, limit: int = 10) -> List[int]:
+        """Ids of the best matching stocks, best first."""
+        query = _normalize(query)
+        if not query:
+            return []
+
+        # stock_id -> sort key; lower is better, and each stock keeps its best
+        ranked: Dict[int, tuple] = {}
+
+        for symbol, stock_id in _prefix_matches(self._symbols, query):
+            ranked[stock_id] = (EXACT_SYMBOL if symbol == query else SYMBOL_PREFIX, len(symbol), symbol)
+        # Names match on their words' prefixes; multi-word queries are then
+        # checked against the whole name
+        words = query.split()
+        for _, stock_id in _prefix_matches(self._words, words[0]):
+            symbol, name = self._entries[stock_id]
+            if stock_id not in ranked and (len(words) == 1 or query in name):
+                ranked[stock_id] = (NAME_PREFIX, len(name), symbol)
+
+        if len(ranked) < limit:
+            scores = Counter()
+            for word in words:
+                scores.update(self._similar(word))
+            for stock_id, total in scores.items():
+                similarity = total / len(words)
+                if stock_id not in ranked and similarity >= SEARCH_MIN_SIMILARITY:
+                    ranked[stock_id] = (FUZZY, -similarity, self._entries[stock_id][0])
+
+        return [stock_id for stock_id, _ in heapq.nsmallest(limit, ranked.items(), key=lambda item: item[1])]
+
+    def search_quotes(self, query: str, limit: int = 10):
+        """Price cache quotes of the best matches, best first."""
+        quotes = (price_cache.get(stock_id) for stock_id in self.search(query, limit))
+        return [quote for quote in quotes if quote is not None]
+
+
+stock_search = StockSearchIndex()
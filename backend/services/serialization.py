@@ -0,0 +1,66 @@
+from operator import attrgetter
+from typing import Iterable, Sequence
+
+from backend.models.models import Stock, Holding, Transaction
+from backend.schemas.schemas import (
+    Stock as StockSchema,
+    Holding as HoldingSchema,
+    Transaction as TransactionSchema,
+)
+from backend.services.prices import price_cache
+
+# Fast path for large list responses. Queries select exactly the columns the
+# response schema exposes, in the schema's field order, and rows are zipped
+# straight into dicts for ORJSONResponse instead of building ORM objects and
+# validating them through the orm_mode schemas. Field names come from the
+# schemas, so the JSON shape stays the same as the validated path.
+
+STOCK_FIELDS = tuple(StockSchema.model_fields)
+HOLDING_FIELDS = tuple(name for name in HoldingSchema.model_fields if name != "stock")
+TRANSACTION_FIELDS = tuple(name for name in TransactionSchema.model_fields if name != "stock")
+
+STOCK_COLUMNS = tuple(getattr(Stock, name) for name in STOCK_FIELDS)
+HOLDING_COLUMNS = tuple(getattr(Holding, name) for name in HOLDING_FIELDS) + STOCK_COLUMNS
+TRANSACTION_COLUMNS = tuple(getattr(Transaction, name) for name in TRANSACTION_FIELDS) + STOCK_COLUMNS
+
+_quote_values = attrgetter(*STOCK_FIELDS)
+
+
+def serialize_quotes(quotes: Iterable) -> list:
+    """Stock dicts from price cache quotes (or any objects with the stock fields)."""
+    return [dict(zip(STOCK_FIELDS, _quote_values(quote))) for quote in quotes]
+
+
+def serialize_stock_rows(rows: Iterable[Sequence]) -> list:
+    return [dict(zip(STOCK_FIELDS, row)) for row in rows]
+
+
+def _nested_serializer(fields: tuple):
+    split = len(fields)
+    end = split + len(STOCK_FIELDS)
+
+    def serialize(rows: Iterable[Sequence]) -> list:
+        # The nested stock comes from the price cache where it has the stock,
+        # as in value_holdings: the joined columns only catch up with live
+        # prices when the flusher next writes them back
+        stocks = {}
+        items = []
+        for row in rows:
+            item = dict(zip(fields, row[:split]))
+            stock_id = item["stock_id"]
+            stock = stocks.get(stock_id)
+            if stock is None:
+                quote = price_cache.get(stock_id)
+                values = _quote_values(quote) if quote is not None else row[split:end]
+                stock = stocks[stock_id] = dict(zip(STOCK_FIELDS, values))
+            item["stock"] = stock
+            items.append(item)
+        return items
+
+    return serialize
+
+
+# Rows selected as HOLDING_COLUMNS / TRANSACTION_COLUMNS (plus any trailing
+# extra columns, which are ignored)
+serialize_holding_rows = _nested_serializer(HOLDING_FIELDS)
+serialize_transaction_rows = _nested_serializer(TRANSACTION_FIELDS)
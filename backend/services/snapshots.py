@@ -0,0 +1,136 @@
+import gzip
+import os
+import uuid
+from typing import Dict, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+from backend.services.prices import PriceCache, Quote, price_cache
+from backend.services.serialization import serialize_quotes
+
+# Bodies smaller than this are sent uncompressed
+SNAPSHOT_MIN_COMPRESS_SIZE = int(os.getenv("SNAPSHOT_MIN_COMPRESS_SIZE", "1024"))
+SNAPSHOT_GZIP_LEVEL = int(os.getenv("SNAPSHOT_GZIP_LEVEL", "6"))
+SNAPSHOT_BROTLI_QUALITY = int(os.getenv("SNAPSHOT_BROTLI_QUALITY", "5"))
+
+# Encodings we can produce, in order of preference
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# Price cache versions restart at 0 in every process, so tags carry a
+# per-process epoch to keep a restarted worker from matching stale tags
+_EPOCH = uuid.uuid4().hex[:8]
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=SNAPSHOT_BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=SNAPSHOT_GZIP_LEVEL, mtime=0)
+
+
+class Snapshot:
+    """A pre-serialized JSON body for one version, plus compressed copies.
+
+    Each encoding is compressed at most once per snapshot, on first use.
+    """
+
+    def __init__(self, version: int, etag: str, body: bytes):
+        self.version = version
+        self.etag = etag
+        self.body = body
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = _compress(self.body, encoding)
+        return data
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the preferred encoding the client accepts, or None for identity."""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    for encoding in ENCODINGS:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our tag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def snapshot_response(request: Request, snapshot: Snapshot) -> Response:
+    """200 with the (possibly compressed) body, or 304 if the client's copy is current."""
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = None
+    if len(snapshot.body) >= SNAPSHOT_MIN_COMPRESS_SIZE:
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(snapshot.encoded(encoding), media_type="application/json", headers=headers)
+
+
+class StockSnapshots:
+    """Pre-serialized stock list and per-stock bodies, keyed on cache versions.
+
+    Every change to a quote bumps the price cache version, so a snapshot is
+    rebuilt only on the first request after a stock was created or
+    repriced. The tags are weak since compressed and identity bodies share
+    them.
+    """
+
+    def __init__(self, cache: PriceCache):
+        self.cache = cache
+        self._list: Optional[Snapshot] = None
+        self._stocks: Dict[int, Snapshot] = {}
+
+    def stock_list(self) -> Snapshot:
+        # Read the version first: a tick landing mid-build leaves a snapshot
+        # tagged older than its contents, which the next request replaces
+        version = self.cache.version
+        snapshot = self._list
+        if snapshot is None or snapshot.version != version:
+            body = orjson.dumps(serialize_quotes(self.cache.all()))
+            snapshot = self._list = Snapshot(version, f'W/"stocks-{_EPOCH}-{version}"', body)
+        return snapshot
+
+    def stock(self, quote: Quote) -> Snapshot:
+        snapshot = self._stocks.get(quote.id)
+        if snapshot is None or snapshot.version != quote.version:
+            body = orjson.dumps(serialize_quotes([quote])[0])
+            snapshot = Snapshot(quote.version, f'W/"stock-{quote.id}-{_EPOCH}-{quote.version}"', body)
+            self._stocks[quote.id] = snapshot
+        return snapshot
+
+
+stock_snapshots = StockSnapshots(price_cache)
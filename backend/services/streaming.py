@@ -0,0 +1,103 @@
+import asyncio
+import os
+from typing import Dict, Iterable, List, Set
+
+# Per-connection limits: how many symbols one client may follow, how long a
+# single send may take before the client is treated as stuck, and how often
+# an idle stream sends a keep-alive
+STREAM_MAX_SYMBOLS = int(os.getenv("STREAM_MAX_SYMBOLS", "200"))
+STREAM_SEND_TIMEOUT = float(os.getenv("STREAM_SEND_TIMEOUT", "5.0"))
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15.0"))
+
+
+def quote_payload(quote):
+    """Serialize a quote with the same fields as the ``Stock`` schema."""
+    return {
+        "id": quote.id,
+        "symbol": quote.symbol,
+        "name": quote.name,
+        "exchange": quote.exchange,
+        "current_price": quote.current_price,
+        "day_high": quote.day_high,
+        "day_low": quote.day_low,
+        "last_updated": quote.last_updated.isoformat() if quote.last_updated else None,
+        "version": quote.version,
+    }
+
+
+class Subscription:
+    """One client's view of the quote stream.
+
+    Pending updates are keyed by symbol, so a consumer that falls behind
+    only ever holds the latest quote per symbol: older updates are
+    coalesced away instead of queueing up.
+    """
+
+    def __init__(self):
+        self.symbols: Set[str] = set()
+        self.coalesced = 0
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    def push(self, quote):
+        if quote.symbol in self._pending:
+            self.coalesced += 1
+        self._pending[quote.symbol] = quote
+        self._ready.set()
+
+    async def next_batch(self, timeout: float = None) -> List:
+        """Wait for pending quotes and take all of them.
+
+        Returns an empty list if nothing arrived within ``timeout``.
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        batch = list(self._pending.values())
+        self._pending = {}
+        return batch
+
+
+class QuoteHub:
+    """Fans quote updates out to subscribers through per-symbol sets.
+
+    Publishing touches only the subscribers of the symbols that changed, so
+    its cost does not depend on how many clients follow other symbols. All
+    methods must be called from the event loop thread.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, subscription: Subscription, symbols: Iterable[str]):
+        for symbol in symbols:
+            if symbol in subscription.symbols:
+                continue
+            if len(subscription.symbols) >= STREAM_MAX_SYMBOLS:
+                raise ValueError(f"Cannot subscribe to more than {STREAM_MAX_SYMBOLS} symbols")
+            subscription.symbols.add(symbol)
+            self._subscribers.setdefault(symbol, set()).add(subscription)
+
+    def unsubscribe(self, subscription: Subscription, symbols: Iterable[str] = None):
+        symbols = list(subscription.symbols if symbols is None else symbols)
+        for symbol in symbols:
+            subscription.symbols.discard(symbol)
+            subscribers = self._subscribers.get(symbol)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[symbol]
+
+    def publish(self, quotes: Iterable):
+        for quote in quotes:
+            for subscription in self._subscribers.get(quote.symbol, ()):
+                subscription.push(quote)
+
+    def subscriber_count(self, symbol: str) -> int:
+        return len(self._subscribers.get(symbol, ()))
+
+
+quote_hub = QuoteHub()
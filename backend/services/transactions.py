@@ -0,0 +1,162 @@
+import base64
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, select, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.models import Stock, Transaction
+from backend.services.serialization import TRANSACTION_COLUMNS, TRANSACTION_FIELDS, serialize_transaction_rows
+
+# Rows fetched from the database cursor per chunk when exporting
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+# Position of Transaction.id in TRANSACTION_COLUMNS; the stock's id is also
+# selected, so the row can't be read by name
+_ID_INDEX = TRANSACTION_FIELDS.index("id")
+
+EXPORT_COLUMNS = ["id", "timestamp", "stock_id", "symbol", "transaction_type", "quantity", "price", "total_amount"]
+
+def _timestamp_key(db: AsyncSession):
+    """Column expression the keyset compares on.
+
+    SQLite stores DATETIME as text, and rows written by CURRENT_TIMESTAMP
+    have no microseconds while ORM-written rows do. There the raw text is
+    compared so the keyset agrees exactly with the ORDER BY on the column.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return type_coerce(Transaction.timestamp, String)
+    return Transaction.timestamp
+
+
+def encode_cursor(timestamp_key, transaction_id: int) -> str:
+    if isinstance(timestamp_key, datetime):
+        timestamp_key = timestamp_key.isoformat()
+    raw = json.dumps([timestamp_key, transaction_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, raw_text: bool = True):
+    """Return (timestamp key, id) from a cursor, raising ValueError if malformed."""
+    try:
+        timestamp_key, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not raw_text:
+            timestamp_key = datetime.fromisoformat(timestamp_key)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(transaction_id, int):
+        raise ValueError("Invalid cursor")
+    return timestamp_key, transaction_id
+
+
+def _apply_filters(query, user_id: int, start: Optional[datetime], end: Optional[datetime], symbol: Optional[str]):
+    query = query.where(Transaction.user_id == user_id)
+    if start is not None:
+        query = query.where(Transaction.timestamp >= start)
+    if end is not None:
+        query = query.where(Transaction.timestamp < end)
+    if symbol is not None:
+        query = query.where(Stock.symbol == symbol.upper())
+    return query
+
+
+async def page_transactions(
+    db: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    symbol: Optional[str] = None,
+):
+    """Return one page of a user's transactions, newest first, and the next cursor.
+
+    Pages are addressed by the (timestamp, id) of the last row seen, so each
+    page is an index range scan no matter how deep into the history it is.
+    The next cursor is None on the last page. Transactions are returned as
+    response dicts built from a column-projected query.
+    """
+    timestamp_key = _timestamp_key(db)
+    query = (
+        select(*TRANSACTION_COLUMNS, timestamp_key.label("timestamp_key"))
+        .join(Transaction.stock)
+    )
+    query = _apply_filters(query, user_id, start, end, symbol)
+    if cursor is not None:
+        key = decode_cursor(cursor, raw_text=timestamp_key is not Transaction.timestamp)
+        query = query.where(tuple_(timestamp_key, Transaction.id) < tuple_(*key))
+    query = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp_key, rows[-1][_ID_INDEX])
+    return serialize_transaction_rows(rows), next_cursor
+
+
+async def _export_rows(db: AsyncSession, user_id: int, start, end, symbol):
+    """Yield lists of export rows, oldest first, one database chunk at a time."""
+    query = (
+        select(
+            Transaction.id,
+            Transaction.timestamp,
+            Transaction.stock_id,
+            Stock.symbol,
+            Transaction.transaction_type,
+            Transaction.quantity,
+            Transaction.price,
+            Transaction.total_amount,
+        )
+        .join(Transaction.stock)
+        .order_by(Transaction.timestamp, Transaction.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    query = _apply_filters(query, user_id, start, end, symbol)
+    result = await db.stream(query)
+    async for partition in result.partitions():
+        yield partition
+
+
+async def stream_transactions(session_factory, user_id: int, fmt: str, start=None, end=None, symbol=None):
+    """Stream a user's transactions as CSV or NDJSON text chunks.
+
+    Rows are read through a server-side cursor in chunks of
+    EXPORT_CHUNK_SIZE, so memory use does not grow with the history. The
+    generator owns its session because it outlives the request handler.
+    """
+    async with session_factory() as db:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            async for partition in _export_rows(db, user_id, start, end, symbol):
+                writer.writerows(
+                    (row.id, row.timestamp.isoformat(), row.stock_id, row.symbol, row.transaction_type,
+                     row.quantity, row.price, row.total_amount)
+                    for row in partition
+                )
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            async for partition in _export_rows(db, user_id, start, end, symbol):
+                yield "".join(
+                    json.dumps({
+                        "id": row.id,
+                        "timestamp": row.timestamp.isoformat(),
+                        "stock_id": row.stock_id,
+                        "symbol": row.symbol,
+                        "transaction_type": row.transaction_type,
+                        "quantity": row.quantity,
+                        "price": row.price,
+                        "total_amount": row.total_amount,
+                    }) + "\n"
+                    for row in partition
+                )
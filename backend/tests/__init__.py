@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Tests run against a throwaway SQLite file built through the migrations.
+# Set before any backend module reads the environment.
+_database_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_database_dir.name, 'test.db')}"
+os.environ["ADMISSION_CONTROL"] = "0"
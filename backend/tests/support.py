@@ -0,0 +1,51 @@
+import itertools
+
+from backend.database.database import get_session_factory
+from backend.database.migrations import upgrade_database
+from backend.models.models import AccountEvent, Holding, Stock, User
+from backend.services.ledger import DEPOSIT
+from backend.utils.auth import create_access_token
+
+_migrated = False
+_names = itertools.count(1)
+_emails = {}
+
+def migrate():
+    """Build the test database through the migrations, once per run"""
+    global _migrated
+    if not _migrated:
+        upgrade_database()
+        _migrated = True
+
+def create_user(balance: float = 10000.0) -> int:
+    """A new active user; the opening balance is recorded as a deposit"""
+    migrate()
+    email = f"user{next(_names)}@example.com"
+    with get_session_factory()() as db:
+        user = User(name="Test User", email=email, hashed_password="x", balance=balance)
+        db.add(user)
+        db.flush()
+        if balance:
+            db.add(AccountEvent(user_id=user.id, kind=DEPOSIT, amount=balance))
+        db.commit()
+        _emails[user.id] = email
+        return user.id
+
+def create_stock(price: float = 100.0):
+    """A new stock; returns (id, symbol)"""
+    migrate()
+    symbol = f"TEST{next(_names)}"
+    with get_session_factory()() as db:
+        stock = Stock(symbol=symbol, name=f"{symbol} Ltd.", exchange="NSE", current_price=price, day_high=price, day_low=price)
+        db.add(stock)
+        db.commit()
+        return stock.id, symbol
+
+def create_holding(user_id: int, stock_id: int, quantity: int, average_price: float):
+    """A holding written straight to the table, without a trade or ledger events"""
+    with get_session_factory()() as db:
+        db.add(Holding(user_id=user_id, stock_id=stock_id, quantity=quantity, average_price=average_price))
+        db.commit()
+
+def auth_headers(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': _emails[user_id]})}"}
@@ -0,0 +1,133 @@
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from backend.database.database import get_async_engine, get_async_session_factory
+from backend.models.models import Lease, Transaction, User
+from backend.services.leases import LeaseHolder
+from backend.services.orderbook import CANCELLED, FILLED, OPEN, MatchingEngine, Order, OrderBook
+from backend.services.orders import OrderError, apply_buy
+from backend.tests.support import create_stock, create_user, migrate
+
+
+class OrderBookTest(unittest.TestCase):
+    def order(self, order_id, user_id, side, price, quantity):
+        return Order(id=order_id, user_id=user_id, stock_id=1, side=side, price=price, quantity=quantity)
+
+    def test_best_price_then_earliest_order_fills_first(self):
+        book = OrderBook(1)
+        book.match(self.order(1, 2, "SELL", 101.0, 1))
+        book.match(self.order(2, 3, "SELL", 101.0, 1))
+        book.match(self.order(3, 4, "SELL", 100.0, 1))
+
+        fills = book.match(self.order(4, 1, "BUY", 101.0, 2))
+
+        self.assertEqual([(fill.sell_order_id, fill.price) for fill in fills], [(3, 100.0), (1, 101.0)])
+        self.assertEqual(book.best_ask().id, 2)
+
+    def test_trades_at_the_resting_price(self):
+        book = OrderBook(1)
+        book.match(self.order(1, 2, "BUY", 99.0, 5))
+
+        fills = book.match(self.order(2, 1, "SELL", 95.0, 2))
+
+        self.assertEqual((fills[0].price, fills[0].quantity, fills[0].buy_limit), (99.0, 2, 99.0))
+        self.assertEqual(book.best_bid().remaining, 3)
+
+
+class SelfTradeTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = MatchingEngine()
+
+    def test_order_against_own_resting_order_is_rejected(self):
+        self.engine.submit(1, 1, "SELL", 5, 100.0, balance=0.0, held_quantity=5)
+
+        with self.assertRaises(OrderError):
+            self.engine.submit(1, 1, "BUY", 5, 100.0, balance=1000.0, held_quantity=5)
+
+        self.assertEqual(self.engine.cash_hold(1), 0.0)
+        self.assertEqual(self.engine.book(1).best_ask().remaining, 5)
+        self.assertEqual([order.status for order in self.engine.orders_for(1)], [OPEN])
+
+    def test_order_stops_at_own_resting_order_after_filling(self):
+        self.engine.submit(2, 1, "SELL", 1, 100.0, balance=0.0, held_quantity=1)
+        self.engine.submit(1, 1, "SELL", 1, 101.0, balance=0.0, held_quantity=1)
+
+        order, fills = self.engine.submit(1, 1, "BUY", 2, 101.0, balance=1000.0, held_quantity=1)
+
+        self.assertEqual(order.status, CANCELLED)
+        self.assertEqual([(fill.seller_id, fill.quantity) for fill in fills], [(2, 1)])
+        # Only the fill still waiting to be written is held
+        self.assertEqual(self.engine.cash_hold(1), 100.0)
+        self.assertIsNone(self.engine.book(1).best_bid())
+
+
+class FillPersistenceTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        migrate()
+        self.session_factory = get_async_session_factory()
+
+    async def asyncTearDown(self):
+        await get_async_engine().dispose()
+
+    async def test_failing_fill_is_dropped_not_retried(self):
+        stock_id, _ = create_stock(100.0)
+        seller, buyer, gone = create_user(), create_user(), create_user()
+        async with self.session_factory() as db:
+            await apply_buy(db, seller, stock_id, 2, 100.0)
+            await db.commit()
+
+        engine = MatchingEngine()
+        engine.submit(seller, stock_id, "SELL", 2, 100.0, balance=0.0, held_quantity=2)
+        engine.submit(gone, stock_id, "BUY", 1, 100.0, balance=10000.0, held_quantity=0)
+        engine.submit(buyer, stock_id, "BUY", 1, 100.0, balance=10000.0, held_quantity=0)
+        async with self.session_factory() as db:
+            # Deactivated after matching, so its fill can no longer be written
+            await db.execute(update(User).where(User.id == gone).values(is_active=False))
+            await db.commit()
+
+        persisted = []
+        await engine._persist_pending(self.session_factory, persisted.extend)
+
+        self.assertEqual([fill.buyer_id for fill in persisted], [buyer])
+        self.assertEqual(engine.take_fills(), [])
+        self.assertEqual(engine.cash_hold(gone), 0.0)
+        self.assertEqual(engine.share_hold(seller, stock_id), 0)
+        self.assertEqual([order.status for order in engine.orders_for(seller)], [FILLED])
+        async with self.session_factory() as db:
+            buys = await db.execute(
+                select(Transaction.user_id, func.count())
+                .where(Transaction.stock_id == stock_id, Transaction.transaction_type == "BUY")
+                .group_by(Transaction.user_id)
+            )
+            self.assertEqual(dict(buys.all()), {seller: 1, buyer: 1})
+
+
+class LeaseTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        migrate()
+        self.session_factory = get_async_session_factory()
+
+    async def asyncTearDown(self):
+        await get_async_engine().dispose()
+
+    async def test_one_holder_at_a_time(self):
+        first, second = LeaseHolder("test-lease"), LeaseHolder("test-lease")
+        async with self.session_factory() as db:
+            self.assertTrue(await first.acquire(db))
+            self.assertFalse(await second.acquire(db))
+            # Renewing keeps it
+            self.assertTrue(await first.acquire(db))
+
+            await db.execute(
+                update(Lease).where(Lease.name == "test-lease")
+                .values(expires_at=datetime.utcnow() - timedelta(seconds=1))
+            )
+            await db.commit()
+            self.assertTrue(await second.acquire(db))
+            self.assertFalse(await first.acquire(db))
+
+            await second.release(db)
+            self.assertTrue(await first.acquire(db))
+            await first.release(db)
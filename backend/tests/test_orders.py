@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from sqlalchemy import event, select
+
+from backend.database.database import get_async_engine, get_async_session_factory
+from backend.models.models import User
+from backend.services import orders as orders_service
+from backend.services.orders import OrderError, apply_buy, change_balance, execute_batch
+from backend.tests.support import create_stock, create_user, migrate
+
+
+def order(transaction_type, stock_id, quantity, price):
+    return SimpleNamespace(transaction_type=transaction_type, stock_id=stock_id, quantity=quantity, price=price)
+
+
+class OrderTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        migrate()
+        self.session_factory = get_async_session_factory()
+
+    async def asyncTearDown(self):
+        await get_async_engine().dispose()
+
+    async def balance(self, user_id):
+        async with self.session_factory() as db:
+            return (await db.execute(select(User.balance).where(User.id == user_id))).scalar()
+
+
+class ConcurrentOrderTest(OrderTestCase):
+    async def test_only_one_of_two_overdrawing_buys_wins(self):
+        stock_id, _ = create_stock(100.0)
+        user_id = create_user(1000.0)
+
+        async def buy():
+            # Separate sessions and no sequencer, as from two processes
+            async with self.session_factory() as db:
+                try:
+                    await apply_buy(db, user_id, stock_id, 6, 100.0)
+                except OrderError as e:
+                    await db.rollback()
+                    return e.detail
+                await db.commit()
+                return "filled"
+
+        results = await asyncio.gather(buy(), buy())
+
+        self.assertEqual(sorted(results), ["Insufficient funds", "filled"])
+        self.assertEqual(await self.balance(user_id), 400.0)
+
+
+class ExecuteBatchTest(OrderTestCase):
+    async def test_transactions_come_back_in_order(self):
+        stocks = [create_stock(100.0)[0] for _ in range(3)]
+        user_id = create_user(100000.0)
+        batch = [order("BUY", stock_id, quantity, 100.0) for quantity in range(1, 4) for stock_id in stocks]
+        batch.append(order("SELL", stocks[0], 2, 110.0))
+
+        async with self.session_factory() as db:
+            executed, rejected = await execute_batch(db, user_id, batch, set(stocks), all_or_nothing=True)
+            await db.commit()
+
+        self.assertEqual(rejected, [])
+        self.assertEqual([index for index, _ in executed], list(range(len(batch))))
+        for (index, transaction), placed in zip(executed, batch):
+            self.assertEqual(
+                (transaction.transaction_type, transaction.stock_id, transaction.quantity, transaction.price),
+                (placed.transaction_type, placed.stock_id, placed.quantity, placed.price),
+            )
+        ids = [transaction.id for _, transaction in executed]
+        self.assertEqual(ids, sorted(ids))
+
+    async def test_best_effort_checks_again_when_funds_are_spent_meanwhile(self):
+        stock_id, _ = create_stock(100.0)
+        user_id = create_user(1000.0)
+        load_holdings_for = orders_service.load_holdings_for
+
+        async def spend_then_load(db, *args):
+            # Another process spends 300 after the batch read the balance
+            async with self.session_factory() as other:
+                await change_balance(other, user_id, -300.0)
+                await other.commit()
+            return await load_holdings_for(db, *args)
+
+        batch = [order("BUY", stock_id, 5, 100.0), order("BUY", stock_id, 4, 100.0)]
+        with mock.patch.object(orders_service, "load_holdings_for", spend_then_load):
+            async with self.session_factory() as db:
+                executed, rejected = await execute_batch(db, user_id, batch, {stock_id}, all_or_nothing=False)
+                await db.commit()
+
+        self.assertEqual([index for index, _ in executed], [0])
+        self.assertEqual(rejected, [(1, "Insufficient funds")])
+        self.assertEqual(await self.balance(user_id), 200.0)
+
+    async def test_one_insert_per_kind_of_write(self):
+        stocks = [create_stock(100.0)[0] for _ in range(50)]
+        user_id = create_user(100000.0)
+        batch = [order("BUY", stock_id, 1, 100.0) for stock_id in stocks]
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        sync_engine = get_async_engine().sync_engine
+        event.listen(sync_engine, "before_cursor_execute", count)
+        try:
+            async with self.session_factory() as db:
+                executed, _ = await execute_batch(db, user_id, batch, set(stocks))
+                await db.commit()
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", count)
+
+        self.assertEqual(len(executed), 50)
+        self.assertEqual(len([statement for statement in statements if statement.startswith("INSERT INTO transactions")]), 1)
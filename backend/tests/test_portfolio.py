@@ -0,0 +1,66 @@
+import unittest
+
+from fastapi.testclient import TestClient
+
+from backend.app.main import app
+from backend.database.database import get_async_engine, get_async_session_factory
+from backend.services.metrics import instrument_engine, metrics
+from backend.services.portfolio import value_portfolio
+from backend.tests.support import auth_headers, create_holding, create_stock, create_user
+
+
+class LivePriceTest(unittest.TestCase):
+    def test_holdings_and_portfolio_agree_after_a_tick(self):
+        stock_id, symbol = create_stock(100.0)
+        user_id = create_user()
+        headers = auth_headers(user_id)
+        with TestClient(app) as client:
+            response = client.post(
+                "/trading/buy",
+                json={"stock_id": stock_id, "transaction_type": "BUY", "quantity": 2, "price": 100.0},
+                headers=headers,
+            )
+            self.assertEqual(response.status_code, 200, response.text)
+            response = client.post("/trading/prices", json={"ticks": [{"symbol": symbol, "price": 125.0}]}, headers=headers)
+            self.assertEqual(response.json()["accepted"], 1)
+
+            holdings = client.get("/trading/holdings", headers=headers).json()
+            portfolio = client.get("/trading/portfolio", headers=headers).json()
+            transactions = client.get("/trading/transactions", headers=headers).json()
+
+        self.assertEqual(holdings[0]["stock"], portfolio["holdings"][0]["stock"])
+        self.assertEqual(holdings[0]["stock"]["current_price"], 125.0)
+        self.assertEqual(holdings[0]["stock"]["day_high"], 125.0)
+        self.assertEqual(transactions[0]["stock"]["current_price"], 125.0)
+        self.assertEqual(portfolio["current_value"], 250.0)
+
+
+class ValuePortfolioQueriesTest(unittest.IsolatedAsyncioTestCase):
+    """value_portfolio issues one query however many holdings there are"""
+
+    async def asyncSetUp(self):
+        instrument_engine(get_async_engine().sync_engine)
+
+    async def asyncTearDown(self):
+        await get_async_engine().dispose()
+
+    async def count_statements(self, user_id):
+        async with get_async_session_factory()() as db:
+            before = metrics.sql_statements_total
+            portfolio = await value_portfolio(db, user_id)
+            return metrics.sql_statements_total - before, portfolio
+
+    async def test_one_query_for_one_or_fifty_holdings(self):
+        for count in (1, 50):
+            with self.subTest(holdings=count):
+                user_id = create_user()
+                for _ in range(count):
+                    stock_id, _ = create_stock(100.0)
+                    create_holding(user_id, stock_id, 1, 90.0)
+                statements, portfolio = await self.count_statements(user_id)
+                self.assertEqual(len(portfolio["holdings"]), count)
+                self.assertEqual(statements, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import re
+import unittest
+
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.orm import contains_eager
+
+from backend.database.database import get_engine
+from backend.models.models import AccountEvent, AccountSnapshot, Holding, PortfolioValue, PriceTick, TaxLot, Transaction
+from backend.services.lots import OPEN_LOT
+from backend.tests.support import migrate
+
+# Hot queries from the trading router, as (name, statement)
+HOT_QUERIES = [
+    (
+        "holding by user and stock (buy/sell)",
+        select(Holding).where(Holding.user_id == 1, Holding.stock_id == 1),
+    ),
+    (
+        "holdings by user with stock (portfolio/holdings)",
+        select(Holding).join(Holding.stock).options(contains_eager(Holding.stock))
+        .where(Holding.user_id == 1).order_by(Holding.stock_id),
+    ),
+    (
+        "transactions by user, newest first (first page)",
+        select(Transaction).where(Transaction.user_id == 1)
+        .order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(101),
+    ),
+    (
+        "transactions by user, newest first (cursor page)",
+        select(Transaction).where(
+            Transaction.user_id == 1,
+            tuple_(Transaction.timestamp, Transaction.id) < tuple_("2025-01-01 00:00:00", 1000),
+        ).order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(101),
+    ),
+    (
+        "price ticks by stock since the last finished candle",
+        select(PriceTick.timestamp, PriceTick.price, PriceTick.volume).where(
+            PriceTick.stock_id == 1,
+            PriceTick.timestamp >= "2025-01-01 00:00:00",
+            PriceTick.timestamp < "2025-01-01 01:00:00",
+        ).order_by(PriceTick.timestamp, PriceTick.id),
+    ),
+    (
+        "portfolio value series by user",
+        select(PortfolioValue.day, PortfolioValue.invested_value, PortfolioValue.current_value)
+        .where(PortfolioValue.user_id == 1, PortfolioValue.day >= "2025-01-01").order_by(PortfolioValue.day),
+    ),
+    (
+        "open tax lots by user and stock, oldest first (sell)",
+        select(TaxLot.id, TaxLot.remaining, TaxLot.price)
+        .where(TaxLot.user_id == 1, TaxLot.stock_id == 1, OPEN_LOT).order_by(TaxLot.id),
+    ),
+    (
+        "open tax lots by user (P&L)",
+        select(TaxLot.stock_id, func.sum(TaxLot.remaining), func.sum(TaxLot.remaining * TaxLot.price))
+        .where(TaxLot.user_id == 1, OPEN_LOT).group_by(TaxLot.stock_id),
+    ),
+    (
+        "latest account snapshot by user (ledger rebuild)",
+        select(AccountSnapshot.event_id, AccountSnapshot.balance, AccountSnapshot.holdings)
+        .where(AccountSnapshot.user_id == 1).order_by(AccountSnapshot.event_id.desc()).limit(1),
+    ),
+    (
+        "account events by user since a snapshot (ledger rebuild)",
+        select(AccountEvent.id, AccountEvent.kind, AccountEvent.amount)
+        .where(AccountEvent.user_id == 1, AccountEvent.id > 1000).order_by(AccountEvent.id),
+    ),
+    (
+        "last account event by user (ledger audit)",
+        select(func.max(AccountEvent.id)).where(AccountEvent.user_id == 1),
+    ),
+]
+
+# Plan lines that mean a hot table is read without an index
+BAD_PLAN = re.compile(r"^SCAN (TABLE )?(holdings|transactions|price_ticks|portfolio_values|tax_lots|account_events|account_snapshots)\b|USE TEMP B-TREE FOR ORDER BY")
+
+
+class QueryPlanTest(unittest.TestCase):
+    """Hot queries on the trading tables use an index rather than a scan"""
+
+    @classmethod
+    def setUpClass(cls):
+        migrate()
+
+    def explain(self, connection, statement):
+        sql = str(statement.compile(get_engine(), compile_kwargs={"literal_binds": True}))
+        return [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+    def test_hot_queries_use_an_index(self):
+        with get_engine().connect() as connection:
+            for name, statement in HOT_QUERIES:
+                with self.subTest(name):
+                    plan = self.explain(connection, statement)
+                    self.assertEqual([line for line in plan if BAD_PLAN.search(line)], [], "\n".join(plan))
+
+    def test_holdings_join_searches_both_tables(self):
+        statement = HOT_QUERIES[1][1]
+        with get_engine().connect() as connection:
+            plan = self.explain(connection, statement)
+        self.assertTrue(any(line.startswith("SEARCH holdings") for line in plan), plan)
+        self.assertTrue(any(line.startswith("SEARCH stocks") for line in plan), plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
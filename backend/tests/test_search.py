@@ -0,0 +1,35 @@
+import unittest
+
+from backend.services.search import StockSearchIndex
+
+
+class StockSearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = StockSearchIndex()
+        self.index.add(1, "TCS", "Tata Consultancy Services Ltd.")
+        self.index.add(2, "INFY", "Infosys Ltd.")
+        self.index.add(3, "RELIANCE", "Reliance Industries Ltd.")
+        self.index.add(4, "HDFCBANK", "HDFC Bank Ltd.")
+
+    def test_exact_symbol_ranks_first(self):
+        self.assertEqual(self.index.search("tcs")[0], 1)
+
+    def test_short_symbol_with_a_typo(self):
+        self.assertEqual(self.index.search("tcz"), [1])
+        # A wrong middle letter shares no trigram with the symbol
+        self.assertEqual(self.index.search("txs"), [1])
+        self.assertEqual(self.index.search("ifny")[0], 2)
+
+    def test_long_word_with_a_typo(self):
+        self.assertEqual(self.index.search("relaince")[0], 3)
+
+    def test_unrelated_query_matches_nothing(self):
+        self.assertEqual(self.index.search("zzz"), [])
+
+    def test_removed_stock_is_not_found(self):
+        self.index.remove(1)
+        self.assertEqual(self.index.search("tcz"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -51,7 +51,21 @@ export const tradingAPI = {
   
   getPortfolio: () => api.get('/trading/portfolio'),
   getHoldings: () => api.get('/trading/holdings'),
-  getTransactions: () => api.get('/trading/transactions'),
+  // One page, newest first; the X-Next-Cursor response header is the
+  // cursor for the next page and is absent on the last one
+  getTransactions: (params?: { limit?: number; cursor?: string; start?: string; end?: string; symbol?: string }) =>
+    api.get('/trading/transactions', { params }),
+  // Every transaction, oldest first, fetched page by page
+  getAllTransactions: async (params?: { start?: string; end?: string; symbol?: string }) => {
+    const transactions: any[] = [];
+    let cursor: string | undefined;
+    do {
+      const response = await api.get('/trading/transactions', { params: { ...params, limit: 1000, cursor } });
+      transactions.push(...response.data);
+      cursor = response.headers['x-next-cursor'];
+    } while (cursor);
+    return transactions.reverse();
+  },
   
   buyStock: (stockId: number, quantity: number, price: number) => 
     api.post('/trading/buy', {
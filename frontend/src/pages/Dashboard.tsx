@@ -65,8 +65,7 @@ export default function Dashboard() {
           setPortfolioSummary(portfolioResponse.data);
           
           // Fetch transaction history for charts
-          const transactionsResponse = await tradingAPI.getTransactions();
-          setTransactions(transactionsResponse.data);
+          setTransactions(await tradingAPI.getAllTransactions());
         }
         
         setError(null);
@@ -67,8 +67,7 @@ export default function Portfolio() {
         setPortfolioSummary(response.data);
         
         // Fetch transactions for charts
-        const transactionsResponse = await tradingAPI.getTransactions();
-        setTransactions(transactionsResponse.data);
+        setTransactions(await tradingAPI.getAllTransactions());
         
         setError(null);
       } catch (err) {
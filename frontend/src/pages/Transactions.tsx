@@ -26,6 +26,9 @@ export default function Transactions() {
   const [transactions, setTransactions] = useState<Transaction[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  // Cursor for the next (older) page; null once the last page is loaded
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   
   useEffect(() => {
     const fetchTransactions = async () => {
@@ -34,8 +37,10 @@ export default function Transactions() {
       setLoading(true);
       
       try {
+        // Newest first, one page at a time
         const response = await tradingAPI.getTransactions();
         setTransactions(response.data);
+        setNextCursor(response.headers['x-next-cursor'] ?? null);
         setError(null);
       } catch (err) {
         console.error('Failed to fetch transactions:', err);
@@ -48,6 +53,24 @@ export default function Transactions() {
     fetchTransactions();
   }, [user]);
   
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    
+    setLoadingMore(true);
+    
+    try {
+      const response = await tradingAPI.getTransactions({ cursor: nextCursor });
+      setTransactions(prev => [...prev, ...response.data]);
+      setNextCursor(response.headers['x-next-cursor'] ?? null);
+      setError(null);
+    } catch (err) {
+      console.error('Failed to fetch more transactions:', err);
+      setError('Failed to load more transactions. Please try again later.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+  
   // Redirect to login if not authenticated
   if (!user) {
     return <Navigate to="/login" replace />;
@@ -146,6 +169,13 @@ export default function Transactions() {
                     ))}
                   </tbody>
                 </table>
+                {nextCursor && (
+                  <div className="text-center py-4 border-t border-gray-200">
+                    <button onClick={loadMore} className="btn" disabled={loadingMore}>
+                      {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                  </div>
+                )}
               </div>
             ) : (
               <div className="card text-center py-12">